@@ -1,42 +1,87 @@
 from texttable import Texttable
+from controllers.gameSrv import DIFFICULTIES
+from domain.shapes import getShape
 
 class Console:
     def __init__(self,planesService):
         self.__srv = planesService
-        self.__menu = "Enter: [s] to start a new game | [x] to exit"
+        self.__menu = "Enter: [s] to start a new game | [d] to choose the difficulty | [x] to exit"
         self.__hitRes = {'cabin':"{} DESTROYED a plane!",'hit':"{} HIT a plane!",'miss':"{} MISSED!"}
-        self.__bHeader = ['~', 'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
+        try:
+            self.__srv.setUndo(True)
+        except ValueError:
+            pass  # the huge boards have no undo
+
+    def __bHeader(self):
+        return ['~'] + [self.getColName(j) for j in range(self.__srv.getWidth())]
 
     def printTable(self,board):
         table = Texttable()
-        table.header(self.__bHeader)
-        for i in range(8):
-            table.add_row([str(i+1)] + [board[i][j] for j in range(8)])
+        table.header(self.__bHeader())
+        for i in range(self.__srv.getHeight()):
+            table.add_row([str(i+1)] + [board[i][j] for j in range(self.__srv.getWidth())])
         print(table.draw()+'\n')
 
+    def showPlane(self):
+        """
+        Function that draws the plane shape of the game heading up, next to its description.
+        """
+        shape = getShape(self.__srv.getShape())
+        cells = set(shape.getCells('up'))
+        rowMin, rowMax, colMin, colMax = shape.getExtent('up')
+        art = [' '.join('#' if (r, c) in cells else ' ' for c in range(colMin, colMax + 1))
+               for r in range(rowMin, rowMax + 1)]
+        labels = ['Example', 'of plane', 'heading', 'up']
+        lines = []
+        for i in range(max(len(art), len(labels))):
+            prefix = 'The cabin -> ' if i == -rowMin else ' ' * 13
+            drawing = art[i] if i < len(art) else ''
+            label = labels[i] if i < len(labels) else ''
+            lines.append((prefix + drawing.ljust(2 * (colMax - colMin) + 4) + label).rstrip())
+        print('\n'.join(lines) + '\n')
+
     @staticmethod
-    def showPlane():
-        print("""The cabin -> #          Example
-         # # # # #      of plane
-             #          heading 
-           # # #        up\n""")
+    def getColName(col):
+        """
+        Function that gets the letters of a column: A..Z, AA..AZ, BA.. and so on.
+        :param col: int - the column index
+        :return: str
+        """
+        name = ''
+        col += 1
+        while col:
+            col, rest = divmod(col - 1, 26)
+            name = chr(ord('A') + rest) + name
+        return name
 
     @staticmethod
     def getColNr(col):
-        return ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H'].index(col.upper())
+        nr = 0
+        for letter in col.upper():
+            if not 'A' <= letter <= 'Z':
+                raise ValueError(col)
+            nr = nr * 26 + ord(letter) - ord('A') + 1
+        return nr - 1
 
-    def readCell(self,msg):
+    def readCell(self,msg,commands=()):
         """
         Function that reads a cell coordinates from the user input.
         :param msg: str - the message to be shown when reading the cell
-        :return: tuple with the coordinates of the cell
+        :param commands: iterable of str - the other inputs accepted instead of a cell
+        :return: tuple with the coordinates of the cell, or the command
         """
         while True:
             try:
                 strCoord = input(msg).strip()
-                if len(strCoord) != 2 or not strCoord[1].isdigit() or not strCoord[0].isalpha():
+                if strCoord.lower() in commands:
+                    return strCoord.lower()
+                letters = strCoord.rstrip('0123456789')
+                digits = strCoord[len(letters):]
+                if not letters or not digits or not letters.isalpha():
+                    raise Exception
+                cell = (int(digits) - 1, self.getColNr(letters))
+                if not 0 <= cell[0] < self.__srv.getHeight() or not 0 <= cell[1] < self.__srv.getWidth():
                     raise Exception
-                cell = (int(strCoord[1]) - 1, self.getColNr(strCoord[0]))
                 return cell
             except Exception as ex:
                 print("Invalid coordinates! " + str(ex))
@@ -52,16 +97,18 @@ class Console:
         return cabPos, orientation
 
     def addPlayerPlanes(self):
-        print("You must add 2 planes in the following grid; max plane width is 5 (wing-wing), max plane length is 4 (cabin-tail).")
+        planesCount = self.__srv.getPlanesCount()
+        rowMin, rowMax, colMin, colMax = getShape(self.__srv.getShape()).getExtent('up')
+        print("You must add {} planes in the following grid; max plane width is {} (wing-wing), max plane length is {} (cabin-tail).".format(planesCount, colMax - colMin + 1, rowMax - rowMin + 1))
         self.printTable(self.__srv.getPlayerBoard())
         self.showPlane()
         addedPlanes = 0
-        while addedPlanes < 2:
+        while addedPlanes < planesCount:
             try:
                 cabPos, orientation = self.readPlane()
                 self.__srv.addPlayerPlane(cabPos, orientation)
                 addedPlanes += 1
-                if addedPlanes < 2:
+                if addedPlanes < planesCount:
                     self.printTable(self.__srv.getPlayerBoard())
             except Exception as ex:
                 print(ex)
@@ -71,9 +118,10 @@ class Console:
         b2 = secondBoard
         table = Texttable()
         print("Your planes:{}{}:".format(' '*32,msg))
-        table.header(self.__bHeader + ['<  >'] + self.__bHeader)
-        for i in range(8):
-            table.add_row([str(i + 1)] + [b1[i][j] for j in range(8)] + ['<  >'] + [str(i + 1)] + [b2[i][j] for j in range(8)])
+        width = self.__srv.getWidth()
+        table.header(self.__bHeader() + ['<  >'] + self.__bHeader())
+        for i in range(self.__srv.getHeight()):
+            table.add_row([str(i + 1)] + [b1[i][j] for j in range(width)] + ['<  >'] + [str(i + 1)] + [b2[i][j] for j in range(width)])
         print(table.draw() + '\n')
 
     def showHitResults(self,playerHit,compHit):
@@ -93,7 +141,12 @@ class Console:
             self.showHitResults(hitRes1,hitRes2)
             try:
                 # Player's turn
-                hitPos = self.readCell("\nInsert the cell you want to hit (eg: A4, E7 etc): ")
+                hitPos = self.readCell("\nInsert the cell you want to hit (eg: A4, E7 etc), [u] to undo your last "
+                                       "shot, [r] to redo it: ",('u','r'))
+                if hitPos in ('u','r'):
+                    self.undoRound(hitPos == 'u')
+                    hitRes1 = hitRes2 = None
+                    continue
                 hitRes1 = self.__srv.playerHit(hitPos)
                 if self.__srv.getWinner() == 'human':
                     self.printBoards2(self.__srv.getComputerBoard(), "Computer's planes")
@@ -109,6 +162,30 @@ class Console:
             except Exception as ex:
                 print(ex)
 
+    def undoRound(self,undo):
+        """
+        Method that takes back, or plays again, the last shot of the player together with the computer's answer.
+        :param undo: True to undo, False to redo
+        """
+        for i in range(2):
+            if undo and self.__srv.canUndo():
+                self.__srv.undo()
+            elif not undo and self.__srv.canRedo():
+                self.__srv.redo()
+            elif not i:
+                raise Exception("Nothing to {}!".format('undo' if undo else 'redo'))
+
+    def chooseDifficulty(self):
+        levels = list(DIFFICULTIES)
+        print("The difficulty is {}. Enter: {}".format(self.__srv.getDifficulty(),
+              ' | '.join("[{}] for {}".format(level[0], level) for level in levels)))
+        choice = input('->').strip().lower()
+        for level in levels:
+            if choice == level[0]:
+                self.__srv.setDifficulty(level)
+                return
+        raise Exception("Invalid difficulty!")
+
     def run(self):
         print("© © © © © ©  M. Ștefan C.  © © © © © ©")
         print("~ W E L C O M E   T O   P L A N E S ~\n")
@@ -120,6 +197,8 @@ class Console:
                     break
                 if choice == 's':
                     self.newGame()
+                elif choice == 'd':
+                    self.chooseDifficulty()
                 else:
                     raise Exception("Invalid choice!")
             except Exception as ex:
@@ -1,5 +1,14 @@
 import PySimpleGUI
+import threading
+from controllers.gameSrv import CellHit, PlaneDestroyed, GameWon, DIFFICULTIES
 from domain.plane import PlaneValidator
+from domain.shapes import getShape
+
+CANVAS_CELLS = 400  # boards with more cells are drawn on a canvas instead of one button per cell
+CELL_SIZE = 12  # the size of a canvas cell, in pixels
+EMPTY_COLOR = ('white', 'light blue')
+SHOT_COLORS = {'X': ('red', 'red'), 0: ('red', 'blue')}
+COMPUTER_MOVE = 'Computer move'  # the event posted by the worker thread that chooses the computer's move
 
 
 class GUI:
@@ -7,97 +16,179 @@ class GUI:
         self.__srv = planesService
         self.GUI = PySimpleGUI
         self.GUI.change_look_and_feel('DarkAmber')
-        self.window = self.GUI.Window('Planes', self.theLayout(), resizable=True, element_justification='center')
+        self.__hitRes = {'cabin': "{} DESTROYED a plane!", 'hit': "{} HIT a plane!", 'miss': "{} MISSED!"}
+        self.__worker = None
+        self.__playerResult = None
+        self.__turn = 0  # the id of the computer's turn, a result of an older turn is dropped
+        self.newWindow()
+        self.__srv.subscribe(self.onChange)
+
+    def newWindow(self):
+        """
+        Method that opens the window of a new game.
+        The shots are painted by onChange as the game reports them, the frames keep the board matrices as drawn.
+        """
+        width, height = self.__srv.getWidth(), self.__srv.getHeight()
+        self.__canvas = width * height > CANVAS_CELLS
+        self.window = self.GUI.Window('Planes', self.theLayout(), resizable=True, element_justification='center',
+                                      finalize=self.__canvas)
+        self.__frames = {b: [[' '] * width for i in range(height)] for b in (1, 2)}
+        self.__rectangles = {}
+        if self.__canvas:
+            for b in (1, 2):
+                graph = self.window[('grid', b)]
+                self.__rectangles[b] = [graph.draw_rectangle((j * CELL_SIZE, i * CELL_SIZE),
+                                                             ((j + 1) * CELL_SIZE, (i + 1) * CELL_SIZE),
+                                                             fill_color=EMPTY_COLOR[1], line_color='white')
+                                        for i in range(height) for j in range(width)]
         self.selectedCells = []
         self.addedPlanes = 0
-        self.__hitRes = {'cabin': "{} DESTROYED a plane!", 'hit': "{} HIT a plane!", 'miss': "{} MISSED!"}
+
+    def cancelComputerTurn(self):
+        """
+        Method that drops the pending computer move: the worker is waited for, a move takes at most the
+        strategy's time budget, and the result it posts is ignored.
+        """
+        self.__turn += 1
+        if self.__worker is not None:
+            self.__worker.join()
+            self.__worker = None
 
     def resetGame(self):
+        self.cancelComputerTurn()
         self.__srv.resetGame()
         self.window.Close()
-        self.window = self.GUI.Window('Planes', self.theLayout(), resizable=True, element_justification='center')
-        self.selectedCells = []
-        self.addedPlanes = 0
+        self.newWindow()
 
     def CBtn(self, button_text, i, j, b):
-        return self.GUI.Button(button_text, pad=(0, 0), size=(2, 1), button_color=('white', 'light blue'),
-                               key=(i, j, b))
+        return self.GUI.Button(button_text, pad=(0, 0), size=(2, 1), button_color=EMPTY_COLOR, key=(i, j, b))
+
+    def CGraph(self, b):
+        width, height = self.__srv.getWidth() * CELL_SIZE, self.__srv.getHeight() * CELL_SIZE
+        return self.GUI.Graph((width, height), (0, height), (width, 0), background_color=EMPTY_COLOR[1],
+                              key=('grid', b), enable_events=True)
+
+    def theGrids(self):
+        """
+        Method that gets the layout rows of the two grids: rows of buttons, or two canvases for the large boards.
+        """
+        if self.__canvas:
+            return [[self.CGraph(1), self.GUI.Text('  '), self.CGraph(2)]]
+        width, height = self.__srv.getWidth(), self.__srv.getHeight()
+        return [[self.CBtn('', i, j, 1) for j in range(width)] + [self.GUI.Text('  ')] +
+                [self.CBtn('', i, j, 2) for j in range(width)] for i in range(height)]
+
+    def paintCell(self, i, j, b, color):
+        """
+        Method that paints one cell of a grid.
+        :param i: int - the cell row
+        :param j: int - the cell column
+        :param b: int - 1 for the player's grid, 2 for the shots grid
+        :param color: tuple (text color, background color)
+        """
+        if self.__canvas:
+            rectangle = self.__rectangles[b][i * self.__srv.getWidth() + j]
+            self.window[('grid', b)].TKCanvas.itemconfig(rectangle, fill=color[1])
+        else:
+            self.window[(i, j, b)].Update(button_color=color)
+
+    def redraw(self, b, board, colors):
+        """
+        Method that repaints only the cells of a grid that changed since the last frame.
+        :param b: int - 1 for the player's grid, 2 for the shots grid
+        :param board: BoardView - the new board
+        :param colors: dict - symbol -> color, the cells whose new symbol is not in it are not painted
+        """
+        frame = self.__frames[b]
+        for i, row in enumerate(board):
+            drawn = frame[i]
+            for j, symbol in enumerate(row):
+                if symbol != drawn[j]:
+                    if symbol in colors:
+                        self.paintCell(i, j, b, colors[symbol])
+                    drawn[j] = symbol
 
     def theLayout(self):
+        rowMin, rowMax, colMin, colMax = getShape(self.__srv.getShape()).getExtent('up')
         return [[self.GUI.Text('~   W E L C O M E   T O   P L A N E S   ~')]] + \
                [[self.GUI.Text(
-                   "You must add 2 planes in your grid; plane width is 5 (wings), plane length is 4 (cabin-tail).\nClick 'Add plane' after each drown plane.",
+                   "You must add {} planes in your grid; plane width is {} (wings), plane length is {} (cabin-tail).\nClick 'Add plane' after each drown plane.".format(self.__srv.getPlanesCount(), colMax - colMin + 1, rowMax - rowMin + 1),
                    key='Info', size=(50, 3))]] + \
                [[self.GUI.Text('Your planes: ', size=(25, 1)), self.GUI.Text('Your shots: ', size=(25, 1))]] + \
-               [[self.CBtn('', i, j, 1) for j in range(8)] + [self.GUI.Text('  ')] + [self.CBtn('', i, j, 2) for j in
-                                                                                      range(8)] for i in range(8)] + \
+               self.theGrids() + \
                [[self.GUI.Button('Add plane', pad=(0, 5), size=(9, 1)),
-                 self.GUI.Text('{}'.format('~' * 40), pad=(2, 0))]] + \
+                 self.GUI.Text('{}'.format('~' * 40), pad=(2, 0)),
+                 self.GUI.Combo(list(DIFFICULTIES), default_value=self.__srv.getDifficulty(), key='Difficulty',
+                                enable_events=True, readonly=True, size=(8, 1))]] + \
                [[self.GUI.Quit('Quit game', pad=(0, 10), size=(9, 1)), self.GUI.Text('©  M. Ștefan C.', pad=(76, 10)),
                  self.GUI.Button('Reset game', pad=(0, 10), size=(9, 1))]]
 
+    def checkIdle(self):
+        if self.__worker is not None:
+            raise Exception("Wait, the computer is thinking!")
+
     def updateCell(self, key):
-        if self.addedPlanes == 2:
+        self.checkIdle()
+        if self.addedPlanes == self.__srv.getPlanesCount():
             raise Exception("You can't shoot your own planes!")
-        cell = self.window[key]
         cellPos = (key[0], key[1])
         if cellPos in self.selectedCells:
             self.selectedCells.remove(cellPos)
-            cell.Update(button_color=('white', 'light blue'))
+            self.paintCell(key[0], key[1], 1, EMPTY_COLOR)
         else:
             self.selectedCells.append(cellPos)
-            cell.Update(button_color=('white', 'grey'))
+            self.paintCell(key[0], key[1], 1, ('white', 'grey'))
 
     def addPlayerPlane(self):
-        if self.addedPlanes >= 2:
-            raise Exception('You already added 2 planes!')
-        cabPos, orientation = PlaneValidator.GUIValidate(self.selectedCells)
+        self.checkIdle()
+        planesCount = self.__srv.getPlanesCount()
+        if self.addedPlanes >= planesCount:
+            raise Exception('You already added {} planes!'.format(planesCount))
+        cabPos, orientation = PlaneValidator.GUIValidate(self.selectedCells, self.__srv.getWidth(), self.__srv.getHeight(),
+                                                         self.__srv.getShape())
         self.__srv.addPlayerPlane(cabPos, orientation)
         self.addedPlanes += 1
         color = 'green'
-        if self.addedPlanes < 2:
+        if self.addedPlanes < planesCount:
             color = 'dark green'
         for c in self.selectedCells:
-            cell = self.window[(c[0], c[1], 1)]
-            cell.Update(button_color=('white', color))
+            self.paintCell(c[0], c[1], 1, ('white', color))
         self.selectedCells.clear()
-        if self.addedPlanes == 2:
+        if self.addedPlanes == planesCount:
             self.window['Info'].Update("The computer placed its planes as well.\nTry to hit them in the second grid!")
 
-    def updateBoards(self):
-        b1 = self.__srv.getPlayerBoard()
-        b2 = self.__srv.getHitBoard()
-        for i in range(8):
-            for j in range(8):
-                if b1[i][j] == 'X':
-                    self.window[(i, j, 1)].Update(button_color=('red', 'red'))
-                elif b1[i][j] == 0:
-                    self.window[(i, j, 1)].Update(button_color=('red', 'blue'))
-                if b2[i][j] == 'X':
-                    self.window[(i, j, 2)].Update(button_color=('red', 'red'))
-                elif b2[i][j] == 0:
-                    self.window[(i, j, 2)].Update(button_color=('red', 'blue'))
+    def onChange(self, event):
+        """
+        Observer of the game: it paints the cells changed by a shot, the boards are never scanned.
+        :param event: CellHit/CellMissed/PlaneDestroyed/GameWon
+        """
+        if isinstance(event, GameWon):
+            return
+        b = 1 if event.board == 'player' else 2
+        if isinstance(event, PlaneDestroyed):
+            cells, symbol = event.cells, 'X'
+        else:
+            cells, symbol = (event.cell,), 'X' if isinstance(event, CellHit) else 0
+        for i, j in cells:
+            self.paintCell(i, j, b, SHOT_COLORS[symbol])
+            self.__frames[b][i][j] = symbol
 
     def showComputerPlanes(self):
-        bc = self.__srv.getComputerBoard()
-        for i in range(8):
-            for j in range(8):
-                if bc[i][j] == '#':
-                    self.window[(i, j, 2)].Update(button_color=('red', 'pink'))
+        self.redraw(2, self.__srv.getComputerBoard(), {'#': ('red', 'pink')})
 
-    def showHitResults(self, playerRes, computerRes):
+    def showHitResults(self, playerRes, computerRes, thinking=False):
         playInfo = "The computer placed its planes as well.\nTry to hit them in the second grid!\n"
         playerResultStr = self.__hitRes[playerRes].format('You')
         if computerRes is None:
-            computerRes = ''
+            computerRes = 'The computer is thinking...' if thinking else ''
         else:
             computerRes = self.__hitRes[computerRes].format('Computer')
         self.window.Element('Info').Update("{}{}{}{}".format(playInfo, playerResultStr, ' ' * 10, computerRes))
-        self.updateBoards()
 
     def shooting(self, key):
-        if self.addedPlanes < 2:
-            raise Exception("You have to add your 2 planes first!")
+        self.checkIdle()
+        if self.addedPlanes < self.__srv.getPlanesCount():
+            raise Exception("You have to add your {} planes first!".format(self.__srv.getPlanesCount()))
         if self.__srv.getWinner() is not None:
             raise Exception("This round has ended!\nPress 'Reset game' to start a new game.")
         # Player's turn
@@ -106,9 +197,39 @@ class GUI:
         if self.__srv.getWinner() == 'human':
             self.GUI.Popup("YOU HAVE WON!", title='Winner')
             return
-        # Computer's turn
-        hitRes2 = self.__srv.computerHit()
-        self.showHitResults(hitRes1, hitRes2)
+        # Computer's turn: the move is chosen on a worker thread, the window keeps answering meanwhile
+        self.__playerResult = hitRes1
+        self.showHitResults(hitRes1, None, thinking=True)
+        self.__worker = threading.Thread(target=self.thinking, args=(self.__turn, self.window), daemon=True)
+        self.__worker.start()
+
+    def thinking(self, turn, window):
+        """
+        Method run by the worker thread: it chooses the computer's move and posts it to the event loop.
+        Only the choice runs here, the move is played and painted by the GUI thread in computerMove.
+        :param turn: int - the id of the computer's turn
+        :param window: the window of the game
+        """
+        try:
+            window.write_event_value(COMPUTER_MOVE, (turn, self.__srv.nextComputerMove(), None))
+        except Exception as ex:
+            window.write_event_value(COMPUTER_MOVE, (turn, None, ex))
+
+    def computerMove(self, turn, hitPos, error):
+        """
+        Method that plays the computer's move chosen by the worker, unless its turn was cancelled.
+        :param turn: int - the id of the computer's turn
+        :param hitPos: tuple with the hit coordinates
+        :param error: the exception raised by the worker, or None
+        """
+        if turn != self.__turn:
+            return
+        self.__worker.join()
+        self.__worker = None
+        if error is not None:
+            raise error
+        hitRes2 = self.__srv.computerHit(hitPos)
+        self.showHitResults(self.__playerResult, hitRes2)
         if self.__srv.getWinner() == 'computer':
             self.showComputerPlanes()
             self.GUI.Popup("GAME OVER! You have lost.", title='Winner')
@@ -118,15 +239,24 @@ class GUI:
             try:
                 event, value = self.window.read()
                 if event in ('Quit game', None):
+                    self.cancelComputerTurn()
                     self.window.Close()
                     break
-                if event == 'Add plane':
+                if event == COMPUTER_MOVE:
+                    self.computerMove(*value[COMPUTER_MOVE])
+                elif event == 'Add plane':
                     self.addPlayerPlane()
                 elif event == 'Reset game':
                     self.resetGame()
-                elif event[2] == 1:
-                    self.updateCell(event)
+                elif event == 'Difficulty':
+                    self.__srv.setDifficulty(value['Difficulty'])
                 else:
-                    self.shooting(event)
+                    if event[0] == 'grid':  # a click on a canvas: the cell is found from the coordinates
+                        x, y = value[event]
+                        event = (y // CELL_SIZE, x // CELL_SIZE, event[1])
+                    if event[2] == 1:
+                        self.updateCell(event)
+                    else:
+                        self.shooting(event)
             except Exception as ex:
                 self.GUI.Popup(ex, title='Error')
@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor
+from controllers.gameSrv import GameService
+from functools import partial
+import asyncio
+import json
+
+
+class Session:
+    # the strategies cheap enough to run on the event loop, the others run on the executor
+    FAST_MODES = ('classic',)
+
+    def __init__(self,executor):
+        """
+        The game of one connection.
+        :param executor: concurrent.futures.Executor - runs the slow moves and the game setups
+        """
+        self.__executor = executor
+        self.__srv = None
+        self.__aiMode = 'classic'
+        self.__playerAiMode = None
+        self.__commands = {'new': self.newGame, 'place': self.placePlane, 'random_planes': self.randomPlanes,
+                           'shoot': self.shoot, 'auto': self.autoShoot, 'board': self.board}
+
+    async def execute(self,request):
+        """
+        Method that executes one request of the client.
+        :param request: dict - the decoded request, its 'cmd' key selects the command
+        :return: dict - the response
+        """
+        command = self.__commands.get(request.get('cmd'))
+        if command is None:
+            raise ValueError('Invalid command!')
+        if self.__srv is None and command != self.newGame:
+            raise ValueError("Start a game first with the 'new' command!")
+        response = await command(request)
+        response['ok'] = True
+        return response
+
+    async def __hit(self,mode,hit):
+        """
+        Method that plays a hit, on the executor if the strategy choosing it is slow.
+        :param mode: str - the strategy choosing the hit, None for a hit chosen by the client
+        :param hit: function that plays the hit and returns its result
+        :return: str - cabin/hit/miss
+        """
+        if mode is None or mode in self.FAST_MODES:
+            return hit()
+        return await asyncio.get_running_loop().run_in_executor(self.__executor,hit)
+
+    async def newGame(self,request):
+        aiMode, playerAiMode = request.get('ai','classic'), request.get('player_ai')
+        # placing the computer's planes and building the placement tables may take a while on large boards
+        self.__srv = await asyncio.get_running_loop().run_in_executor(
+            self.__executor,partial(GameService,request.get('seed'),aiMode,playerAiMode,request.get('width',8),
+                                    request.get('height',8),request.get('planes',2),
+                                    request.get('difficulty','medium'),request.get('shape','classic')))
+        self.__aiMode, self.__playerAiMode = aiMode, playerAiMode
+        return {'width': self.__srv.getWidth(), 'height': self.__srv.getHeight(), 'planes': self.__srv.getPlanesCount()}
+
+    async def placePlane(self,request):
+        self.__srv.addPlayerPlane(tuple(request['cabin']),request['orientation'])
+        return {}
+
+    async def randomPlanes(self,request):
+        self.__srv.addRandomPlayerPlanes()
+        return {}
+
+    async def __round(self,playerMode,playerHit):
+        """
+        Method that plays a round: the player's hit, then the computer's hit if the game is not over.
+        :param playerMode: str - the strategy choosing the player's hit, None for a hit chosen by the client
+        :param playerHit: function that makes the player's hit and returns its result
+        :return: dict - the results of the round
+        """
+        if self.__srv.getWinner() is not None:
+            raise ValueError('This round has ended!')
+        response = {'player': await self.__hit(playerMode,playerHit), 'computer': None}
+        if self.__srv.getWinner() is None:
+            response['computer'] = await self.__hit(self.__aiMode,self.__srv.computerHit)
+        response['winner'] = self.__srv.getWinner()
+        return response
+
+    async def shoot(self,request):
+        cell = tuple(request['cell'])
+        return await self.__round(None,lambda: self.__srv.playerHit(cell))
+
+    async def autoShoot(self,request):
+        return await self.__round(self.__playerAiMode,self.__srv.playerAutoHit)
+
+    async def board(self,request):
+        boards = {'player': self.__srv.getPlayerBoard, 'hits': self.__srv.getHitBoard}
+        which = request.get('which','player')
+        if which not in boards:
+            raise ValueError('Invalid board!')
+        return {'board': boards[which]().copyMatrix()}
+
+
+class Server:
+    def __init__(self,host='127.0.0.1',port=5000,workers=4):
+        """
+        Game server: every TCP connection owns a game session.
+        The protocol is newline-delimited JSON: each request line gets exactly one response line,
+        with 'ok': true and the results, or 'ok': false and an 'error' message.
+        Commands: new (width, height, planes, ai, player_ai, seed), place (cabin, orientation), random_planes,
+        shoot (cell), auto (the player's strategy shoots), board (which: player/hits).
+        :param host: str - the interface to listen on
+        :param port: int - the port to listen on, 0 for any free port
+        :param workers: int - the threads running the slow moves and the game setups
+        """
+        self.__host = host
+        self.__port = port
+        self.__executor = ThreadPoolExecutor(max_workers=workers)
+        self.__server = None
+        self.__sessions = 0
+
+    def getSessionsCount(self):
+        """
+        Getter for the number of open sessions.
+        :return: int
+        """
+        return self.__sessions
+
+    async def handleConnection(self,reader,writer):
+        """
+        Coroutine that serves one connection until the client closes it.
+        :param reader: asyncio.StreamReader
+        :param writer: asyncio.StreamWriter
+        """
+        session = Session(self.__executor)
+        self.__sessions += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await session.execute(json.loads(line))
+                except Exception as ex:
+                    response = {'ok': False, 'error': str(ex)}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.__sessions -= 1
+            writer.close()
+
+    async def start(self):
+        """
+        Coroutine that starts listening.
+        :return: the port the server listens on
+        """
+        self.__server = await asyncio.start_server(self.handleConnection,self.__host,self.__port)
+        return self.__server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """
+        Coroutine that stops listening and waits for the server to close.
+        """
+        self.__server.close()
+        await self.__server.wait_closed()
+        self.__executor.shutdown(wait=False)
+
+    async def serve(self):
+        """
+        Coroutine that serves clients forever.
+        """
+        port = await self.start()
+        print('Planes server listening on {}:{}'.format(self.__host,port))
+        async with self.__server:
+            await self.__server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
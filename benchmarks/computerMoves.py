@@ -0,0 +1,69 @@
+from controllers.gameSrv import GameService,DIFFICULTIES
+from controllers.strategies import ClassicStrategy
+import argparse
+import random
+import sys
+import time
+
+
+def benchmark(size,seed=0,hitRate=0.1):
+    """
+    Function that lets the classic strategy shoot every cell of a size x size board and measures
+    the average cost per shot in each tenth of the game.
+    :param size: int - the board width and height
+    :param seed: int - the seed of the random number generator
+    :param hitRate: float - the probability that a shot is reported as a hit
+    :return: list of float - microseconds per shot, one value per tenth of the game
+    """
+    rng = random.Random(seed)
+    strategy = ClassicStrategy(size,size,rng)
+    shots = size * size - 4
+    tenth = shots // 10
+    timings = []
+    for part in range(10):
+        start = time.perf_counter()
+        for i in range(tenth):
+            hitPos = strategy.nextMove()
+            strategy.registerResult(hitPos,'hit' if rng.random() < hitRate else 'miss')
+        timings.append((time.perf_counter() - start) / tenth * 1e6)
+    return timings
+
+
+def monteCarloLatency(difficulty,games):
+    """
+    Function that plays games of the montecarlo strategy on the usual 8x8 board and measures the wall clock
+    latency of its moves, the time budget of the difficulty included.
+    :param difficulty: str - one of DIFFICULTIES
+    :param games: int - the number of games
+    :return: float - the 99th percentile latency, in seconds
+    """
+    latencies = []
+    for g in range(games):
+        srv = GameService(seed=g,aiMode='montecarlo',difficulty=difficulty)
+        srv.addRandomPlayerPlanes()
+        while srv.getWinner() != 'computer':
+            start = time.perf_counter()
+            srv.computerHit()
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) * 99 // 100]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-shot cost of the classic computer strategy and the move '
+                                                 'latency of the montecarlo strategy.')
+    parser.add_argument('sizes', type=int, nargs='*', default=[8, 100, 1000])
+    parser.add_argument('--difficulty', choices=sorted(DIFFICULTIES), action='append', default=[],
+                        help='measure the p99 montecarlo latency, fails when it is over the budget')
+    parser.add_argument('--games', type=int, default=100)
+    args = parser.parse_args()
+    for size in args.sizes:
+        timings = benchmark(size)
+        print('{0}x{0}: '.format(size) + ' '.join('{:.2f}'.format(t) for t in timings) + ' us/shot per tenth of the game')
+    slow = False
+    for difficulty in args.difficulty:
+        p99 = monteCarloLatency(difficulty,args.games)
+        budget = DIFFICULTIES[difficulty]
+        print('montecarlo {}: p99 {:.2f} ms, budget {:.0f} ms'.format(difficulty,p99 * 1e3,budget * 1e3))
+        slow = slow or p99 >= budget
+    sys.exit(1 if slow else 0)
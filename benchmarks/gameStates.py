@@ -0,0 +1,54 @@
+from domain.gameState import GameState, BOARDS
+from domain.plane import Plane, getPlacementTable
+import argparse
+import random
+import time
+import tracemalloc
+
+
+def benchmark(statesCount,width=8,height=8,planesCount=2,seed=0,depth=40):
+    """
+    Function that grows a random search tree of game states: every new state is a shot from a random state
+    of the tree, so the tree branches like a lookahead search, down to a maximal depth.
+    :param statesCount: int - the number of child states created
+    :param width: int - the board width
+    :param height: int - the board height
+    :param planesCount: int - the number of planes of each player
+    :param seed: int - the seed of the random number generator
+    :param depth: int - the maximal number of moves of a state
+    :return: (float - bytes per state, float - microseconds per state)
+    """
+    rng = random.Random(seed)
+    table = getPlacementTable(width,height)
+    fleets = [[Plane(p.cabin,p.orientation) for p in table.sampleConfiguration(planesCount,rng)] for board in BOARDS]
+    root = GameState(width,height,*fleets)
+    cells = [divmod(cell,width) for cell in range(width * height)]
+    shots = [(rng.choice(BOARDS),rng.choice(cells)) for i in range(1 << 12)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    states = [root]
+    depths = [0]
+    for i in range(statesCount):
+        parent = rng.randrange(len(states))
+        if depths[parent] == depth:
+            parent = 0
+        board, cell = shots[i & 4095]
+        states.append(states[parent].shoot(board,cell)[0])
+        depths.append(depths[parent] + 1)
+    elapsed = time.perf_counter() - start
+    del depths  # the bookkeeping of the benchmark, not of the states
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / statesCount, elapsed / statesCount * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Memory and time of the child game states of a search tree.')
+    parser.add_argument('states', type=int, nargs='?', default=1000000)
+    parser.add_argument('--max-bytes', type=float, default=None, help='fail if a state takes more bytes')
+    args = parser.parse_args()
+    perState, timing = benchmark(args.states)
+    print('{} states: {:.1f} MB, {:.1f} bytes and {:.2f} us per state (traced)'.format(
+        args.states, perState * args.states / 1e6, perState, timing))
+    if args.max_bytes is not None and perState > args.max_bytes:
+        raise SystemExit(1)
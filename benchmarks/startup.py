@@ -0,0 +1,57 @@
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the cold starts to guard: name -> the python arguments
+TARGETS = {
+    'simulator': ['-c', 'import controllers.simulator'],
+    'server': ['-c', 'import UserInterface.Server'],
+    'headless': ['main.py', '--ui', 'headless', '--games', '0'],
+}
+
+
+def importTimes(arguments):
+    """
+    Function that starts a fresh interpreter with -X importtime and reads the import time of every module.
+    :param arguments: list of str - the python arguments after -X importtime
+    :return: dict - module -> (int - own microseconds, int - cumulative microseconds), in import order
+    :raises: subprocess.CalledProcessError if the interpreter fails
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime'] + arguments, cwd=ROOT, capture_output=True,
+                             text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, module = line[len('import time:'):].split('|')
+        times[module.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def startupTime(times):
+    """
+    Function that gets the total import time of a start: the sum of the own times of the modules.
+    :param times: dict - the result of importTimes
+    :return: float - milliseconds
+    """
+    return sum(own for own, cumulative in times.values()) / 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import time of the cold starts, measured with -X importtime.')
+    parser.add_argument('targets', nargs='*', help='{}, all by default'.format('/'.join(TARGETS)))
+    parser.add_argument('--max-ms', type=float, default=None, help='fail if a start imports for longer')
+    parser.add_argument('--top', type=int, default=5, help='the number of slowest modules shown')
+    args = parser.parse_args()
+    failed = False
+    for target in args.targets or TARGETS:
+        times = importTimes(TARGETS[target])
+        total = startupTime(times)
+        slowest = sorted(times.items(), key=lambda item: -item[1][0])[:args.top]
+        print('{}: {:.1f} ms in {} modules | slowest: {}'.format(
+            target, total, len(times), ', '.join('{} {:.1f}'.format(m, t[0] / 1000) for m, t in slowest)))
+        if args.max_ms is not None and total > args.max_ms:
+            failed = True
+    sys.exit(1 if failed else 0)
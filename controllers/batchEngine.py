@@ -0,0 +1,189 @@
+from domain.plane import PlaneError, getPlacementTable
+
+
+class BatchEngine:
+    def __init__(self,games,width=8,height=8,shape='classic'):
+        """
+        Engine that holds many games at once and advances all of them with one shot per game per step.
+        Every board state of a side is a single integer holding the boards of all the games one after another,
+        in lanes of (width * height + 1) bits: the board bitmask of the game followed by a guard bit.
+        A step resolves the shots of all the games with a constant number of whole-integer operations,
+        so the work per step does not grow with the number of Python calls.
+        The rules are the ones of GameService.playerHit/computerHit.
+        :param games: int - the number of games
+        :param width: int - the board width
+        :param height: int - the board height
+        :param shape: str - the name of the plane shape
+        """
+        self.__games = games
+        self.__width = width
+        self.__height = height
+        self.__cells = width * height
+        self.__lane = self.__cells + 1
+        self.__placements = getPlacementTable(width,height,shape)
+        # bit 0 and the guard bit of every lane: the sum of the geometric series with ratio 2 ** lane
+        self.__low = ((1 << (games * self.__lane)) - 1) // ((1 << self.__lane) - 1)
+        self.__guard = self.__low << self.__cells
+        # for every side: occupied, hit, miss, destroyed masks and the [plane mask, cabin mask] of every plane slot
+        self.__boards = {side: [0, 0, 0, 0] for side in ('player', 'computer')}
+        self.__planes = {side: [] for side in ('player', 'computer')}
+        self.__planesCount = {side: [0] * games for side in ('player', 'computer')}
+
+    def getGamesCount(self):
+        """
+        Getter for the number of games.
+        :return: int
+        """
+        return self.__games
+
+    def __laneFlags(self,masks):
+        """
+        Method that finds the lanes with at least one bit set: adding the guard bit and subtracting one
+        from every lane keeps the guard bit only where the lane was not empty, without borrowing across lanes.
+        :param masks: int - lanes without guard bits
+        :return: int - the guard bits of the non-empty lanes
+        """
+        return ((masks | self.__guard) - self.__low) & self.__guard
+
+    def __laneFill(self,flags):
+        """
+        Method that turns guard bits into full lanes.
+        :param flags: int - guard bits
+        :return: int - all the cell bits of the flagged lanes
+        """
+        return flags - (flags >> self.__cells)
+
+    def __decode(self,flags):
+        """
+        Method that converts lane flags into a list of booleans, one per game.
+        :param flags: int - guard bits
+        :return: list of bool
+        """
+        bits = format(flags,'0{}b'.format(self.__games * self.__lane))[::-1]
+        return [bits[g * self.__lane + self.__cells] == '1' for g in range(self.__games)]
+
+    def addPlane(self,side,game,cabinPos,orientation):
+        """
+        Method that adds a plane to the board of a game.
+        :param side: str - player/computer: the owner of the board
+        :param game: int - the index of the game
+        :param cabinPos: tuple with the coordinates of the plane cabin
+        :param orientation: str - up/down/left/right
+        :raises: PlaneError in case of invalid plane
+        """
+        placement = self.__placements.find(cabinPos,orientation)
+        if placement is None:
+            raise PlaneError('Invalid plane positioning! The plane is outside the playing area!')
+        shift = game * self.__lane
+        board = self.__boards[side]
+        if board[0] >> shift & placement.mask:
+            raise PlaneError('Invalid plane positioning! This plane overlaps the other plane!')
+        slot = self.__planesCount[side][game]
+        self.__planesCount[side][game] += 1
+        if slot == len(self.__planes[side]):
+            self.__planes[side].append([0, 0])
+        board[0] |= placement.mask << shift
+        self.__planes[side][slot][0] |= placement.mask << shift
+        self.__planes[side][slot][1] |= 1 << (shift + placement.cabin[0] * self.__width + placement.cabin[1])
+
+    def shotMask(self,shots):
+        """
+        Method that builds the mask of one shot per game.
+        :param shots: list with one tuple with the hit coordinates per game, or None for the games that do not shoot
+        :return: int - the shot mask
+        """
+        data = bytearray((self.__games * self.__lane + 7) // 8)
+        for g, shot in enumerate(shots):
+            if shot is not None:
+                pos = g * self.__lane + shot[0] * self.__width + shot[1]
+                data[pos >> 3] |= 1 << (pos & 7)
+        return int.from_bytes(data,'little')
+
+    def stepMask(self,side,shot):
+        """
+        Method that resolves one shot per game on the boards of a side, all the games at once.
+        :param side: str - player/computer: the owner of the boards that are shot
+        :param shot: int - the shot mask, at most one cell per lane
+        :return: (int, int, int) - the guard bits of the games whose result is cabin, hit and miss
+        """
+        board = self.__boards[side]
+        occupied, hit, miss, destroyed = board
+        cabinShots = 0
+        newlyDestroyed = 0
+        for planeMask, cabinMask in self.__planes[side]:
+            cabinShot = shot & cabinMask & ~destroyed
+            if cabinShot:
+                cabinShots |= cabinShot
+                newlyDestroyed |= planeMask & self.__laneFill(self.__laneFlags(cabinShot))
+        cabinFlags = self.__laneFlags(cabinShots)
+        shot &= ~self.__laneFill(cabinFlags)
+        struck = hit | destroyed
+        newHit = shot & occupied & ~struck
+        board[1] = hit | newHit
+        board[2] = miss | (shot & ~occupied)
+        board[3] = destroyed | newlyDestroyed
+        hitFlags = self.__laneFlags(newHit)
+        missFlags = self.__laneFlags(shot) & ~hitFlags
+        return cabinFlags, hitFlags, missFlags
+
+    def step(self,side,shots):
+        """
+        Method that resolves one shot per game on the boards of a side.
+        :param side: str - player/computer: the owner of the boards that are shot
+        :param shots: list with one tuple with the hit coordinates per game, or None for the games that do not shoot
+        :return: list of str - cabin/hit/miss for every game, None for the games that did not shoot
+        """
+        cabinFlags, hitFlags, missFlags = self.stepMask(side,self.shotMask(shots))
+        results = []
+        for cabin, hit, miss in zip(self.__decode(cabinFlags),self.__decode(hitFlags),self.__decode(missFlags)):
+            results.append('cabin' if cabin else 'hit' if hit else 'miss' if miss else None)
+        return results
+
+    def getWinnerFlags(self):
+        """
+        Method that finds the finished games: a side loses when all its plane cells are destroyed.
+        :return: (int, int) - the guard bits of the games won by the human and by the computer
+        """
+        lost = {}
+        for side, board in self.__boards.items():
+            lost[side] = self.__guard & ~self.__laneFlags(board[0] & ~board[3])
+        return lost['computer'], lost['player'] & ~lost['computer']
+
+    def getWinners(self):
+        """
+        Method that gets the winner of every game.
+        :return: list of str - human/computer, or None for the games in progress
+        """
+        human, computer = self.getWinnerFlags()
+        return ['human' if h else 'computer' if c else None for h, c in zip(self.__decode(human),self.__decode(computer))]
+
+    def getVisitedMask(self,side):
+        """
+        Getter for the cells of a side that were shot or destroyed, in all the games.
+        :param side: str - player/computer
+        :return: int - lanes of board bitmasks
+        """
+        board = self.__boards[side]
+        return board[1] | board[2] | board[3]
+
+    def getMatrix(self,side,game,showPlanes=True):
+        """
+        Getter for the board matrix of one game, in the format of Board.getMatrix.
+        :param side: str - player/computer
+        :param game: int - the index of the game
+        :param showPlanes: True/False - whether the untouched plane cells are shown
+        :return: list of lists - the board matrix
+        """
+        laneMask = (1 << self.__cells) - 1
+        shift = game * self.__lane
+        occupied, hit, miss, destroyed = (m >> shift & laneMask for m in self.__boards[side])
+        struck = hit | destroyed
+        planes = occupied if showPlanes else 0
+        matrix = []
+        for i in range(self.__height):
+            row = []
+            for j in range(self.__width):
+                bit = 1 << (i * self.__width + j)
+                row.append('X' if struck & bit else 0 if miss & bit else '#' if planes & bit else ' ')
+            matrix.append(row)
+        return matrix
@@ -0,0 +1,256 @@
+from controllers.gameSrv import GameService, PlaneDestroyed, CellHit, CellMissed
+from domain.board import Board
+from domain.plane import Plane, samplePlacements
+import argparse
+import ast
+import mmap
+import os
+import random
+import struct
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+# the .npy headers are padded to a fixed size, so the shape of the last shard can be rewritten in place
+NPY_HEADER_SIZE = 128
+# the planes of a sample, each of height x width cells
+CHANNELS = ('observed', 'occupancy', 'shot')
+UNKNOWN, MISSED, HIT, DESTROYED = 0, 1, 2, 3  # the cells of the observed plane
+BODY, CABIN = 1, 2  # the plane cells of the occupancy plane
+INDEX_NAME = 'index.bin'
+INDEX_MAGIC = b'PLDS'
+INDEX_VERSION = 1
+# magic, version, width, height, channels, shards count
+INDEX_HEADER = struct.Struct('<4sBHHBI')
+# samples count, games count of a shard
+INDEX_SHARD = struct.Struct('<II')
+SHARD_SIZE = 1 << 16  # samples per shard: 12 MB for 8x8 boards
+
+
+def shardName(shard):
+    """
+    Function that gets the file name of a shard.
+    :param shard: int - the shard number
+    :return: str
+    """
+    return 'shard-{:05d}.npy'.format(shard)
+
+
+def npyHeader(shape):
+    """
+    Function that builds the header of a .npy file (format 1.0) of uint8 values, in C order.
+    :param shape: tuple of int
+    :return: bytes - NPY_HEADER_SIZE bytes
+    """
+    header = "{{'descr': '|u1', 'fortran_order': False, 'shape': {}, }}".format(tuple(shape)).encode('latin1')
+    padding = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2 - len(header) - 1
+    if padding < 0:
+        raise ValueError('The shape does not fit in the header!')
+    return NPY_MAGIC + struct.pack('<H',NPY_HEADER_SIZE - len(NPY_MAGIC) - 2) + header + b' ' * padding + b'\n'
+
+
+def readShard(path):
+    """
+    Function that maps a shard without copying it. With numpy, numpy.load(path, mmap_mode='r') gives the same array.
+    :param path: str - the .npy file
+    :return: tuple of int - the shape (samples, channels, height, width), memoryview - the values, read-only
+    :raises: ValueError if the file is not a uint8 .npy file
+    """
+    with open(path,'rb') as file:
+        data = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+    if data[:len(NPY_MAGIC)] != NPY_MAGIC:
+        raise ValueError('Invalid shard!')
+    size = struct.unpack_from('<H',data,len(NPY_MAGIC))[0]
+    start = len(NPY_MAGIC) + 2
+    header = ast.literal_eval(data[start:start + size].decode('latin1'))
+    if header['descr'] != '|u1' or header['fortran_order']:
+        raise ValueError('Invalid shard!')
+    return header['shape'], memoryview(data)[start + size:]
+
+
+def readIndex(directory):
+    """
+    Function that reads the index of an exported dataset.
+    :param directory: str - the dataset directory
+    :return: tuple (width, height, channels), list of (str - shard file, int - samples count, int - games count)
+    :raises: ValueError if the index is invalid
+    """
+    with open(os.path.join(directory,INDEX_NAME),'rb') as file:
+        data = file.read()
+    magic, version, width, height, channels, shardsCount = INDEX_HEADER.unpack_from(data)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        raise ValueError('Invalid dataset index!')
+    shards = []
+    for shard in range(shardsCount):
+        samples, games = INDEX_SHARD.unpack_from(data,INDEX_HEADER.size + shard * INDEX_SHARD.size)
+        shards.append((shardName(shard),samples,games))
+    return (width,height,channels), shards
+
+
+class ShardWriter:
+    __slots__ = ('__directory', '__width', '__height', '__shardSize', '__sampleSize', '__shards', '__file',
+                 '__data', '__samples', '__games')
+
+    def __init__(self,directory,width,height,shardSize=SHARD_SIZE):
+        """
+        Writer of a dataset of fixed size samples: uint8 arrays of shape (channels, height, width), in .npy shards
+        of shardSize samples. Each shard is preallocated and memory-mapped, the samples are written in place,
+        so the memory used does not depend on the size of the dataset. The index lists the finished shards.
+        :param directory: str - the dataset directory, created if missing
+        :param width: int - the board width
+        :param height: int - the board height
+        :param shardSize: int - the number of samples of a shard
+        """
+        if shardSize < 1:
+            raise ValueError('Invalid shard size!')
+        os.makedirs(directory,exist_ok=True)
+        self.__directory = directory
+        self.__width = width
+        self.__height = height
+        self.__shardSize = shardSize
+        self.__sampleSize = len(CHANNELS) * width * height
+        self.__shards = []  # (samples count, games count) of the finished shards
+        self.__file = None
+        self.__data = None
+        self.__samples = 0
+        self.__games = 0
+
+    def __shape(self,samples):
+        return samples, len(CHANNELS), self.__height, self.__width
+
+    def __open(self):
+        """
+        Method that preallocates and maps the next shard.
+        """
+        self.__file = open(os.path.join(self.__directory,shardName(len(self.__shards))),'w+b')
+        self.__file.write(npyHeader(self.__shape(self.__shardSize)))
+        self.__file.truncate(NPY_HEADER_SIZE + self.__shardSize * self.__sampleSize)
+        self.__data = mmap.mmap(self.__file.fileno(),0)
+        self.__samples = 0
+        self.__games = 0
+
+    def __finish(self):
+        """
+        Method that closes the current shard, shrinking the last one to its samples, and updates the index.
+        """
+        self.__data.flush()
+        self.__data.close()
+        if self.__samples < self.__shardSize:
+            self.__file.seek(0)
+            self.__file.write(npyHeader(self.__shape(self.__samples)))
+            self.__file.truncate(NPY_HEADER_SIZE + self.__samples * self.__sampleSize)
+        self.__file.close()
+        self.__file = self.__data = None
+        self.__shards.append((self.__samples,self.__games))
+        self.__writeIndex()
+
+    def __writeIndex(self):
+        with open(os.path.join(self.__directory,INDEX_NAME),'wb') as file:
+            file.write(INDEX_HEADER.pack(INDEX_MAGIC,INDEX_VERSION,self.__width,self.__height,len(CHANNELS),
+                                         len(self.__shards)))
+            for samples, games in self.__shards:
+                file.write(INDEX_SHARD.pack(samples,games))
+
+    def addSample(self,observed,occupancy,shot):
+        """
+        Method that appends a sample.
+        :param observed: bytes-like - the observed plane, height x width values
+        :param occupancy: bytes-like - the occupancy plane, height x width values
+        :param shot: int - the cell of the next shot (row * width + col)
+        """
+        if self.__data is not None and self.__samples == self.__shardSize:
+            self.__finish()
+        if self.__data is None:
+            self.__open()
+        cells = self.__width * self.__height
+        offset = NPY_HEADER_SIZE + self.__samples * self.__sampleSize
+        self.__data[offset:offset + cells] = observed
+        self.__data[offset + cells:offset + 2 * cells] = occupancy
+        self.__data[offset + 2 * cells + shot] = 1  # the preallocated shard is zero filled
+        self.__samples += 1
+
+    def endGame(self):
+        """
+        Method that counts a game in the shard of its last sample.
+        """
+        self.__games += 1
+
+    def close(self):
+        """
+        Method that finishes the last shard.
+        :return: int - the number of samples written
+        """
+        if self.__data is not None:
+            self.__finish()
+        else:
+            self.__writeIndex()
+        return sum(samples for samples, games in self.__shards)
+
+
+def exportGames(directory,games,aiMode='density',width=8,height=8,planesCount=2,seed=0,difficulty='easy',
+                shardSize=SHARD_SIZE,shape='classic'):
+    """
+    Function that plays headless games and exports every shot of the computer as a sample: what the computer
+    observed of the player's board before the shot, where the player's planes really are and the chosen shot.
+    :param directory: str - the dataset directory
+    :param games: int - the number of games
+    :param aiMode: str - the computer's strategy
+    :param width: int - the board width
+    :param height: int - the board height
+    :param planesCount: int - the number of planes of the player
+    :param seed: int - the seed of the games
+    :param difficulty: str - the time budget of the montecarlo strategy
+    :param shardSize: int - the number of samples of a shard
+    :param shape: str - the plane shape of the games
+    :return: int - the number of samples written
+    """
+    writer = ShardWriter(directory,width,height,shardSize)
+    rng = random.Random(seed)
+    observed = bytearray(width * height)
+
+    def observe(event):
+        if type(event) is PlaneDestroyed and event.board == 'player':
+            for row, col in event.cells:
+                observed[row * width + col] = DESTROYED
+        elif type(event) is CellHit and event.board == 'player':
+            observed[event.cell[0] * width + event.cell[1]] = HIT
+        elif type(event) is CellMissed and event.board == 'player':
+            observed[event.cell[0] * width + event.cell[1]] = MISSED
+
+    service = GameService(rng.getrandbits(64),aiMode,None,width,height,planesCount,difficulty,shape)
+    service.subscribe(observe)
+    try:
+        for game in range(games):
+            if game:
+                service.resetGame()
+            observed[:] = bytes(width * height)
+            occupancy = bytearray(width * height)
+            for placement in samplePlacements(Board(width,height),planesCount,rng,shape=shape):
+                for row, col in Plane(placement.cabin,placement.orientation,shape).getPlaneCells():
+                    occupancy[row * width + col] = BODY
+                occupancy[placement.cabin[0] * width + placement.cabin[1]] = CABIN
+                service.addPlayerPlane(placement.cabin,placement.orientation)
+            while service.getWinner() is None:
+                move = service.nextComputerMove()
+                writer.addSample(observed,occupancy,move[0] * width + move[1])
+                service.computerHit(move)
+            writer.endGame()
+    finally:
+        service.unsubscribe(observe)
+        samples = writer.close()
+    return samples
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exports the shots of headless games as .npy training shards.')
+    parser.add_argument('games', type=int)
+    parser.add_argument('--out', required=True, help='the dataset directory')
+    parser.add_argument('--ai', default='density', help="the computer's strategy")
+    parser.add_argument('--difficulty', default='easy')
+    parser.add_argument('--width', type=int, default=8)
+    parser.add_argument('--height', type=int, default=8)
+    parser.add_argument('--planes', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    parser.add_argument('--shape', default='classic')
+    args = parser.parse_args()
+    print('{} samples'.format(exportGames(args.out,args.games,args.ai,args.width,args.height,args.planes,args.seed,
+                                          args.difficulty,args.shard_size,args.shape)))
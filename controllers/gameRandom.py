@@ -0,0 +1,74 @@
+import hashlib
+import os
+import random
+
+MASK = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+
+class GameRandom(random.Random):
+    """
+    Random number generator of a game: SplitMix64, whose whole state is one 64-bit integer, so a snapshot
+    stores it in 8 bytes and a restored game draws the same numbers. It is a random.Random, the strategies use
+    its randrange, choice and shuffle; getstate/setstate exchange the integer. The gauss pending value is not
+    part of the state, the games do not draw gaussians.
+    """
+    __slots__ = ('__state',)
+
+    def seed(self,a=None,version=2):
+        """
+        Method that seeds the generator.
+        :param a: int, str, bytes or None for a seed from the operating system
+        :param version: int - ignored, kept for random.Random
+        """
+        if a is None:
+            a = int.from_bytes(os.urandom(8),'little')
+        elif not isinstance(a,int):
+            data = a.encode() if isinstance(a,str) else bytes(a)
+            a = int.from_bytes(hashlib.blake2b(data,digest_size=8).digest(),'little')
+        self.__state = a & MASK
+        self.gauss_next = None
+
+    def __next(self):
+        """
+        Method that advances the state and mixes it into 64 random bits.
+        :return: int
+        """
+        self.__state = state = (self.__state + GOLDEN_GAMMA) & MASK
+        state = ((state ^ (state >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        state = ((state ^ (state >> 27)) * 0x94D049BB133111EB) & MASK
+        return state ^ (state >> 31)
+
+    def random(self):
+        """
+        Method that gets a float in [0, 1), from 53 random bits.
+        :return: float
+        """
+        return (self.__next() >> 11) * (1.0 / (1 << 53))
+
+    def getrandbits(self,k):
+        """
+        Method that gets an integer of k random bits.
+        :param k: int - the number of bits
+        :return: int
+        """
+        if k < 0:
+            raise ValueError('The number of bits must be non-negative!')
+        bits = 0
+        for shift in range(0,k,64):
+            bits |= self.__next() << shift
+        return bits & ((1 << k) - 1)
+
+    def getstate(self):
+        """
+        Getter for the state of the generator.
+        :return: int - 64 bits
+        """
+        return self.__state
+
+    def setstate(self,state):
+        """
+        Setter for the state of the generator.
+        :param state: int - a state returned by getstate
+        """
+        self.__state = state & MASK
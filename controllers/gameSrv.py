@@ -1,47 +1,272 @@
-from domain.board import Board
-from domain.plane import Plane,PlaneValidator,PlaneError
-import random
+from domain.board import Board,BoardView,SPARSE_LIMIT,packMask,unpackMask,packCells,unpackCells
+from domain.fleet import Fleet
+from domain.plane import Plane,PlaneValidator,PlaneError,getPlacementTable,samplePlacements
+from domain.gameState import GameState
+from domain.shapes import getShape, getShapeByKey, getShapeNames
+from controllers.strategies import AI_MODES, MonteCarloStrategy
+from controllers.gameRandom import GameRandom
+from collections import namedtuple
+import struct
+
+SNAPSHOT_VERSION = 7
+# version, width, height, planes count, computer strategy, player strategy (255 for none), difficulty,
+# plane shape (the key of its cells, the same in every process), RNG state
+SNAPSHOT_HEADER = struct.Struct('<BIIIBBBQQ')
+# the difficulty levels: the time of a move of the Monte Carlo strategy, in seconds
+DIFFICULTIES = {'easy': 0.001, 'medium': 0.01, 'hard': 0.1}
+ORIENTATIONS = ('up', 'down', 'left', 'right')
+RESULTS = ('miss', 'hit', 'cabin')
+# the kinds of moves recorded in a journal
+PLAYER_PLANE = 0
+PLAYER_SHOT = 1
+PLAYER_AUTO_SHOT = 2
+COMPUTER_SHOT = 3
+
+# the change events sent to the observers of a game, board is the owner of the board that changed: player/computer
+CellHit = namedtuple('CellHit', ['board', 'cell'])
+CellMissed = namedtuple('CellMissed', ['board', 'cell'])
+PlaneDestroyed = namedtuple('PlaneDestroyed', ['board', 'cells'])
+GameWon = namedtuple('GameWon', ['winner'])
 
 class GameService:
-    def __init__(self):
+    __slots__ = ('__width', '__height', '__planesCount', '__aiMode', '__playerAiMode', '__random', '__playerFleet',
+                 '__computerFleet', '__playerBoard', '__computerBoard', '__placements', '__ai', '__playerAi', '__journal',
+                 '__journalGame', '__journalMoves', '__observers', '__playerView', '__computerView', '__hitView',
+                 '__difficulty', '__undo', '__state', '__redo', '__strategies', '__shape')
+
+    def __init__(self,seed=None,aiMode='classic',playerAiMode=None,width=8,height=8,planesCount=2,
+                 difficulty='medium',shape='classic'):
         """
         Constructor of the game controller class.
+        :param seed: optional seed of the game's random number generator, for reproducible games
+        :param aiMode: str - the computer's strategy: classic (random hits and BFS), density (placement probabilities)
+        or montecarlo (drawn configurations, within a time budget)
+        :param playerAiMode: str - optional strategy that plays for the human player, for headless games
+        :param width: int - the number of columns of the boards
+        :param height: int - the number of rows of the boards
+        :param planesCount: int - the number of planes of each player
+        :param difficulty: str - easy/medium/hard, the time budget of the montecarlo strategies
+        :param shape: str - the name of the plane shape of both players, see domain.shapes
+        """
+        if aiMode not in AI_MODES or playerAiMode not in AI_MODES and playerAiMode is not None:
+            raise ValueError('Invalid AI mode!')
+        if difficulty not in DIFFICULTIES:
+            raise ValueError('Invalid difficulty!')
+        if shape not in getShapeNames():
+            raise ValueError('Invalid shape!')
+        if width < 1 or height < 1 or planesCount < 1:
+            raise ValueError('Invalid game size!')
+        self.__width = width
+        self.__height = height
+        self.__planesCount = planesCount
+        self.__aiMode = aiMode
+        self.__playerAiMode = playerAiMode
+        self.__difficulty = difficulty
+        self.__shape = shape
+        self.__random = GameRandom(seed)
+        self.__journal = None
+        self.__observers = []
+        self.__undo = False
+        self.__newGame()
+
+    def __newGame(self):
+        """
+        Method that initializes the boards, the planes and the computer's moves for a new game.
         """
-        self.__playerBoard = Board(8,8).getMatrix()
-        self.__computerBoard = Board(8,8).getMatrix()
-        self.__hitBoard = Board(8,8).getMatrix()
-        self.__computerPlanes = []
-        self.__playerPlanes = []
-        self.__computerMoves = [(0,0),(0,7),(7,0),(7,7)]
-        self.__neighboursQueue = []
+        self.__newBoards()
         self.addComputerPlanes()
 
+    def __newBoards(self):
+        """
+        Method that initializes empty boards and fresh strategies.
+        """
+        self.__playerFleet = Fleet(self.__width,self.__height)
+        self.__computerFleet = Fleet(self.__width,self.__height)
+        self.__playerBoard = self.__playerFleet.getBoard()
+        self.__computerBoard = self.__computerFleet.getBoard()
+        self.__playerView = BoardView(self.__playerBoard)
+        self.__computerView = BoardView(self.__computerBoard)
+        self.__hitView = BoardView(self.__computerBoard,showPlanes=False)
+        self.__state = None  # the history starts at the first shot, once the planes are placed
+        self.__redo = []
+        self.__strategies = None
+        self.__placements = getPlacementTable(self.__width,self.__height,self.__shape)
+        self.__newStrategies()
+
+    def __newStrategies(self):
+        """
+        Method that creates the strategies of a new game.
+        """
+        self.__ai = AI_MODES[self.__aiMode](self.__width,self.__height,self.__random,self.__planesCount,
+                                            shape=self.__shape)
+        self.__playerAi = None
+        if self.__playerAiMode is not None:
+            self.__playerAi = AI_MODES[self.__playerAiMode](self.__width,self.__height,self.__random,
+                                                            self.__planesCount,shape=self.__shape)
+        self.setDifficulty(self.__difficulty)
+
     def resetGame(self):
         """
-        Method that resets all the game progress by calling the initializer of the controller class.
+        Method that resets all the game progress, the random number generator keeps its state.
+        A journaled game goes on as a new game of the journal.
+        """
+        journal = self.__journal
+        self.__journal = None
+        self.__newGame()
+        self.setJournal(journal)
+
+    def setJournal(self,journal):
+        """
+        Method that starts recording the game in a journal: a keyframe of the current state, then every placement
+        and shot. The keyframes are snapshots, they do not change the game.
+        :param journal: Journal object, or None to stop recording
+        """
+        self.__journal = journal
+        if journal is not None:
+            self.__journalGame = journal.addGame(self.snapshot())
+            self.__journalMoves = 0
+
+    def subscribe(self,observer):
+        """
+        Method that registers an observer of the game changes. After every shot the observer is called with
+        the events describing what changed: CellHit, CellMissed or PlaneDestroyed, then GameWon if the game ended.
+        A shot that changes nothing sends no event. The observers stay registered when the game is reset.
+        :param observer: function that takes one event
+        """
+        self.__observers.append(observer)
+
+    def unsubscribe(self,observer):
+        """
+        Method that removes an observer of the game changes.
+        :param observer: function registered with subscribe
+        """
+        self.__observers.remove(observer)
+
+    def __shoot(self,fleet,hitPos):
+        """
+        Method that resolves a shot on a fleet and sends the change events to the observers.
+        :param fleet: Fleet object - the player's or the computer's fleet
+        :param hitPos: tuple with the hit coordinates
+        :return: str - cabin/hit/miss, and the destroyed plane in case of a cabin hit (None otherwise)
+        """
+        if not self.__observers:
+            return fleet.shoot(hitPos[0],hitPos[1])
+        shot = fleet.getBoard().isShot(hitPos[0],hitPos[1])
+        result, plane = fleet.shoot(hitPos[0],hitPos[1])
+        board = 'player' if fleet is self.__playerFleet else 'computer'
+        events = []
+        if result == 'cabin':
+            events.append(PlaneDestroyed(board,tuple(plane.getPlaneCells())))
+            if not fleet.getAlivePlanesCount():
+                events.append(GameWon('computer' if board == 'player' else 'human'))
+        elif result == 'hit':
+            events.append(CellHit(board,hitPos))
+        elif not shot:
+            events.append(CellMissed(board,hitPos))
+        for observer in tuple(self.__observers):
+            for event in events:
+                observer(event)
+        return result, plane
+
+    def getJournalGame(self):
+        """
+        Getter for the id of the game in its journal.
+        :return: int, None if the game is not journaled
+        """
+        return self.__journalGame if self.__journal is not None else None
+
+    def __record(self,kind,cell,value):
+        """
+        Method that appends a move to the journal, and a keyframe every few moves.
+        :param kind: int - PLAYER_PLANE/PLAYER_SHOT/PLAYER_AUTO_SHOT/COMPUTER_SHOT
+        :param cell: tuple with the coordinates of the shot, or of the plane cabin
+        :param value: int - the index of the result in RESULTS, or of the plane orientation in ORIENTATIONS
+        """
+        self.__journalMoves += 1
+        self.__journal.addMove(self.__journalGame,self.__journalMoves,kind,cell[0] * self.__width + cell[1],value)
+        if self.__journalMoves % self.__journal.getKeyframeInterval() == 0:
+            self.__journal.addKeyframe(self.__journalGame,self.__journalMoves,self.snapshot())
+
+    def getWidth(self):
+        """
+        Getter for the number of columns of the boards.
+        :return: int
+        """
+        return self.__width
+
+    def getHeight(self):
+        """
+        Getter for the number of rows of the boards.
+        :return: int
+        """
+        return self.__height
+
+    def getPlanesCount(self):
+        """
+        Getter for the number of planes of each player.
+        :return: int
+        """
+        return self.__planesCount
+
+    def getShape(self):
+        """
+        Getter for the plane shape of the game.
+        :return: str - the name of the shape
+        """
+        return self.__shape
+
+    def getDifficulty(self):
+        """
+        Getter for the difficulty level of the game.
+        :return: str - easy/medium/hard
+        """
+        return self.__difficulty
+
+    def setDifficulty(self,difficulty):
+        """
+        Setter for the difficulty level: the time budget of the montecarlo strategies, from their next move.
+        The other strategies take a few microseconds per move anyway.
+        :param difficulty: str - easy/medium/hard
+        :raises: ValueError if the level does not exist
+        """
+        if difficulty not in DIFFICULTIES:
+            raise ValueError('Invalid difficulty!')
+        self.__difficulty = difficulty
+        for ai in (self.__ai,self.__playerAi):
+            if isinstance(ai,MonteCarloStrategy):
+                ai.setBudget(DIFFICULTIES[difficulty])
+
+    def __footprint(self,board,plane):
         """
-        self.__init__()
+        Method that gets the footprint mask of a plane, from the placement table when the board has one.
+        :param board: Board object
+        :param plane: Plane object
+        :return: the mask, in the format of the board
+        """
+        if self.__placements is not None:
+            return self.__placements.find(plane.getCabinPosition(),plane.getPlaneOrientation()).mask
+        return board.cellsMask(plane.getPlaneCells())
 
     def getPlayerBoard(self):
         """
         Getter for the matrix that contains the player's planes.
-        :return: list of lists - the matrix described above
+        :return: BoardView - read-only view of the matrix described above, copyMatrix() gives a copy
         """
-        return self.__playerBoard[:][:]
+        return self.__playerView
 
     def getComputerBoard(self):
         """
         Getter for the matrix that contains the computer's planes.
-        :return: list of lists - the matrix described above
+        :return: BoardView - read-only view of the matrix described above, copyMatrix() gives a copy
         """
-        return self.__computerBoard[:][:]
+        return self.__computerView
 
     def getHitBoard(self):
         """
         Getter for the matrix where the player player shoots.
-        :return: list of lists - the matrix described above
+        :return: BoardView - read-only view of the matrix described above, copyMatrix() gives a copy
         """
-        return self.__hitBoard[:][:]
+        return self.__hitView
 
     def getWinner(self):
         """
@@ -49,9 +274,9 @@ class GameService:
         :return: str - the winner: human or computer
         """
         winner = None
-        if not len(self.__computerPlanes):
+        if not self.__computerFleet.getAlivePlanesCount():
             winner = 'human'
-        elif not len(self.__playerPlanes):
+        elif not self.__playerFleet.getAlivePlanesCount():
             winner = 'computer'
         return winner
 
@@ -61,143 +286,343 @@ class GameService:
         :param cabinPos: tuple with 2 int values - the coordinates of the plane cabin in the matrix
         :param orientation: str - up/down/left/right: the plane orientation
         """
-        plane = Plane(cabinPos, orientation)
+        if len(self.__playerFleet.getPlanes()) >= self.__planesCount:
+            raise PlaneError('You already added {} planes!'.format(self.__planesCount))
+        plane = Plane(cabinPos, orientation, self.__shape)
         PlaneValidator.validate(plane,self.__playerBoard)
-        planeCells = plane.getPlaneCells()
-        for cell in planeCells:
-            self.__playerBoard[cell[0]][cell[1]] = '#'
-        self.__playerPlanes.append(plane)
-
-    def addComputerPlanes(self):
-        """
-        Method that adds 2 random and valid planes to the computer's board.
-        """
-        addedPlanes = 0
-        while addedPlanes < 2:
-            try:
-                cabPos = (random.randint(0,7),random.randint(0,7))
-                orientation = random.choice(["up", "down", "left", "right"])
-                plane = Plane(cabPos, orientation)
-                PlaneValidator.validate(plane, self.__computerBoard)
-                planeCells = plane.getPlaneCells()
-                for cell in planeCells:
-                    self.__computerBoard[cell[0]][cell[1]] = '#'
-                self.__computerPlanes.append(plane)
-                addedPlanes += 1
-            except PlaneError:
-                pass
+        self.__playerFleet.addPlane(plane,self.__footprint(self.__playerBoard,plane))
+        self.__state = None
+        if self.__journal is not None:
+            self.__record(PLAYER_PLANE,cabinPos,ORIENTATIONS.index(orientation))
+
+    def addComputerPlanes(self,planesCount=None,seed=None):
+        """
+        Method that adds random and valid planes to the computer's board.
+        The planes are drawn uniformly from all the non-overlapping configurations, without retries.
+        :param planesCount: int - the number of planes (default: the planes count of the game)
+        :param seed: optional seed used instead of the game's random number generator
+        :raises: PlaneError if the planes can not fit on the board
+        """
+        rng = self.__random if seed is None else GameRandom(seed)
+        planesCount = self.__planesCount if planesCount is None else planesCount
+        for placement in samplePlacements(self.__computerBoard,planesCount,rng,shape=self.__shape):
+            self.__computerFleet.addPlane(Plane(placement.cabin,placement.orientation,self.__shape),placement.mask)
+        self.__state = None
+        if self.__journal is not None:
+            self.__journal.addKeyframe(self.__journalGame,self.__journalMoves,self.snapshot())
+
+    def addRandomPlayerPlanes(self,planesCount=None,seed=None):
+        """
+        Method that adds random and valid planes to the player's board, for headless games.
+        :param planesCount: int - the number of planes (default: the planes the player has not added yet)
+        :param seed: optional seed used instead of the game's random number generator
+        :raises: PlaneError if the player would have more planes than the game or the planes can not fit
+        """
+        rng = self.__random if seed is None else GameRandom(seed)
+        missing = self.__planesCount - len(self.__playerFleet.getPlanes())
+        planesCount = missing if planesCount is None else planesCount
+        if planesCount > missing:
+            raise PlaneError('You can only add {} more planes!'.format(missing))
+        for placement in samplePlacements(self.__playerBoard,planesCount,rng,shape=self.__shape):
+            self.__playerFleet.addPlane(Plane(placement.cabin,placement.orientation,self.__shape),placement.mask)
+            self.__state = None
+            if self.__journal is not None:
+                self.__record(PLAYER_PLANE,placement.cabin,ORIENTATIONS.index(placement.orientation))
 
     @staticmethod
     def markDestroyedPlane(plane,board):
         """
         Static method used to mark a destroyed plane's cells with 'X's on a board.
         :param plane: Plane object
-        :param board: list of lists (matrix)
+        :param board: Board object or list of lists (matrix)
         :return:
         """
+        if isinstance(board,Board):
+            board.markDestroyed(board.cellsMask(plane.getPlaneCells()))
+            return
         planeCells = plane.getPlaneCells()
         for c in planeCells:
             board[c[0]][c[1]] = 'X'
 
+    def __checkPosition(self,hitPosition):
+        """
+        Method that validates the coordinates of a hit.
+        :param hitPosition: tuple with the hit coordinates in the matrix
+        :raises: ValueError if the position is not a pair of coordinates inside the board
+        """
+        if type(hitPosition) is not tuple or len(hitPosition) != 2 or type(hitPosition[0]) is not int \
+                or type(hitPosition[1]) is not int or not 0 <= hitPosition[0] < self.__height \
+                or not 0 <= hitPosition[1] < self.__width:
+            raise ValueError('Invalid coordinates!')
+
     def playerHit(self,hitPosition):
         """
         Method that gets the result of the human player hit and marks it on the hit board & computer's board.
         :param hitPosition: tuple with the hit coordinates in the matrix
         :return: str - cabin/hit/miss
+        :raises: ValueError if the position is outside the board
+        """
+        self.__checkPosition(hitPosition)
+        self.__advance('computer',hitPosition)
+        result = self.__shoot(self.__computerFleet,hitPosition)[0]
+        if self.__journal is not None:
+            self.__record(PLAYER_SHOT,hitPosition,RESULTS.index(result))
+        return result
+
+    def playerAutoHit(self,hitPosition=None):
         """
-        for plane in self.__computerPlanes:
-            if plane.getCabinPosition() == hitPosition:
-                self.markDestroyedPlane(plane,self.__computerBoard)
-                self.markDestroyedPlane(plane,self.__hitBoard)
-                self.__computerPlanes.remove(plane)
-                return 'cabin'
-        row = hitPosition[0]
-        col = hitPosition[1]
-        if self.__computerBoard[row][col] == '#':
-            self.__hitBoard[row][col] = 'X'
-            self.__computerBoard[row][col] = 'X'
-            return 'hit'
-        self.__hitBoard[row][col] = 0
-        return 'miss'
-
-    def __addDestroyedCellsToMoves(self,plane):
-        """
-        Method that adds a destroyed plane's cells to the computer moves list,
-        so they won't be visited again by the computer
-        :param plane: Plane object
+        Method used in headless games: the player's hit is chosen by the player's strategy.
+        :param hitPosition: optional tuple with the hit coordinates, to replay a hit instead of choosing it
+        :return: str - cabin/hit/miss
+        :raises: ValueError if the game has no player strategy or the given position is outside the board
         """
-        for c in plane.getPlaneCells():
-            self.__computerMoves.append(c)
+        if self.__playerAi is None:
+            raise ValueError('The player has no strategy!')
+        if hitPosition is None:
+            hitPos = self.__playerAi.nextMove()
+        else:
+            self.__checkPosition(hitPosition)
+            hitPos = hitPosition
+        self.__advance('computer',hitPos)
+        result, plane = self.__shoot(self.__computerFleet,hitPos)
+        self.__playerAi.registerResult(hitPos,result,plane.getPlaneCells() if plane is not None else ())
+        if self.__journal is not None:
+            self.__record(PLAYER_AUTO_SHOT,hitPos,RESULTS.index(result))
+        return result
 
-    def __getRandomUnvisitedCell(self):
+    def nextComputerMove(self):
         """
-        Method that that gets a random unvisited cell by the computer.
-        :return: hitPos - tuple that contains the coordinates of the cell
+        Method that chooses the computer's next hit without playing it, so a slow strategy can think on a worker
+        thread while the game is not touched: computerHit(move) plays it afterwards.
+        :return: tuple with the hit coordinates
         """
-        hitPos = None
-        while hitPos is None:
-            row = random.randint(0, 7)
-            col = random.randint(0, 7)
-            hitPos = (row, col)
-            if hitPos in self.__computerMoves:
-                hitPos = None
-        return hitPos
+        return self.__ai.nextMove()
 
-    def __getComputerMove(self):
+    def computerHit(self,hitPosition=None):
         """
-        Method that gets the next computer move/hit.
-        :return: hitPos - tuple that contains the coordinates of the cell to be hit
+        Method that gets the result of the computer hit and marks it on the player's board.
+        The computer's strategy is informed of the result, to choose its next move accordingly.
+        :param hitPosition: optional tuple with the hit coordinates, to replay a hit instead of choosing it
+        :return: str - cabin/hit/miss
+        :raises: ValueError if the given position is outside the board
         """
-        if not len(self.__neighboursQueue):
-            hitPos = self.__getRandomUnvisitedCell()
+        if hitPosition is None:
+            hitPos = self.__ai.nextMove()
         else:
-            hitPos = self.__neighboursQueue.pop(0)
-        self.__computerMoves.append(hitPos)
-        return hitPos
+            self.__checkPosition(hitPosition)
+            hitPos = hitPosition
+        self.__advance('player',hitPos)
+        result, plane = self.__shoot(self.__playerFleet,hitPos)
+        self.__ai.registerResult(hitPos,result,plane.getPlaneCells() if plane is not None else ())
+        if self.__journal is not None:
+            self.__record(COMPUTER_SHOT,hitPos,RESULTS.index(result))
+        return result
+
+    @staticmethod
+    def __fleetShots(fleet):
+        """
+        Method that gets the shots on a fleet, in the format of Fleet.setShots.
+        :param fleet: Fleet object
+        :return: tuple (hit mask, miss mask, destroyed planes bitmask)
+        """
+        destroyed = 0
+        for planeId in range(len(fleet.getPlanes())):
+            if not fleet.getRemainingCells(planeId):
+                destroyed |= 1 << planeId
+        return fleet.getBoard().getHitMask(), fleet.getBoard().getMissMask(), destroyed
 
-    def __goodCell(self,row,col):
+    def __advance(self,board,hitPos):
+        """
+        Method that adds a shot to the history of the game, before it is played. The first shot starts the history
+        from the current boards, the shots that were undone can't be redone anymore.
+        :param board: str - the owner of the board that is shot: player/computer
+        :param hitPos: tuple with the hit coordinates
+        """
+        if not self.__undo:
+            return
+        if self.__state is None:
+            playerShots = self.__fleetShots(self.__playerFleet)
+            computerShots = self.__fleetShots(self.__computerFleet)
+            self.__state = GameState(self.__width,self.__height,self.__playerFleet.getPlanes(),
+                                     self.__computerFleet.getPlanes(),playerShots,computerShots)
+            self.__strategies = None
+            if any(playerShots) or any(computerShots):  # a restored game: the strategies already know some shots
+                self.__strategies = self.__ai.snapshot()
+                if self.__playerAi is not None:
+                    self.__strategies += self.__playerAi.snapshot()
+        self.__state = self.__state.shoot(board,hitPos)[0]
+        self.__redo.clear()
+
+    def setUndo(self,enabled):
+        """
+        Method that starts or stops keeping the history of the shots, for undo and redo. Every shot costs about
+        a hundred bytes of history, the history is off by default so the resident sessions stay small.
+        The history starts at the next shot.
+        :param enabled: True/False
+        :raises: ValueError if the boards are too large for a history (more than SPARSE_LIMIT cells)
+        """
+        if enabled and self.__width * self.__height > SPARSE_LIMIT:
+            raise ValueError('Undo is not available on boards with more than {} cells!'.format(SPARSE_LIMIT))
+        self.__undo = enabled
+        self.__state = None
+        self.__redo.clear()
+
+    def canUndo(self):
         """
-        Method checks if the cell's coordinates are inside the matrix and unvisited.
-        :param row: int - the cell row
-        :param col: int - the cell column
+        Method that checks if there is a shot to undo.
         :return: True/False
         """
-        condition1 = row in range(8) and col in range(8)
-        condition2 = (row,col) not in self.__computerMoves
-        return condition1 and condition2
+        return self.__state is not None and self.__state.getParent() is not None
 
-    def __enqueueNeighbours(self,row,col):
+    def canRedo(self):
         """
-        Method that adds the neighbours of a cell in the queue used by the computer
-        to hit cells near a successful shot.
-        :param row: int - the cell row
-        :param col: int - the cell column
+        Method that checks if there is an undone shot to play again.
+        :return: True/False
         """
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-        random.shuffle(directions)
-        for d in directions:
-            if self.__goodCell(row+d[0],col+d[1]):
-                self.__neighboursQueue.append((row+d[0],col+d[1]))
+        return bool(self.__redo)
 
-    def computerHit(self):
+    def undo(self):
         """
-        Method that gets the result of the computer hit and marks it on the player's board.
-        The neighbours queue is modified in case of a successful shot accordingly.
-        :return: str - cabin/hit/miss
+        Method that takes back the last shot, of the player or of the computer. Placing a plane starts a new history.
+        :raises: ValueError if there is no shot to undo
         """
-        hitPos = self.__getComputerMove()
-        row = hitPos[0]
-        col = hitPos[1]
-        for plane in self.__playerPlanes:
-            if plane.getCabinPosition() == hitPos:
-                self.markDestroyedPlane(plane,self.__playerBoard)
-                self.__addDestroyedCellsToMoves(plane)
-                self.__playerPlanes.remove(plane)
-                self.__neighboursQueue.clear()
-                return 'cabin'
-        if self.__playerBoard[row][col] == '#':
-            self.__playerBoard[row][col] = 'X'
-            self.__enqueueNeighbours(row,col)
-            return 'hit'
-        self.__playerBoard[row][col] = 0
-        return 'miss'
+        if not self.canUndo():
+            raise ValueError('There is no move to undo!')
+        self.__redo.append(self.__state)
+        self.__goTo(self.__state.getParent())
+
+    def redo(self):
+        """
+        Method that plays again the last shot taken back by undo, with the same result.
+        :raises: ValueError if there is no shot to redo
+        """
+        if not self.canRedo():
+            raise ValueError('There is no move to redo!')
+        self.__goTo(self.__redo.pop())
+
+    def __goTo(self,state):
+        """
+        Method that sets the boards to a state of the history. The strategies are rebuilt as they were at the first
+        state and told the results of the shots since, so they forget the undone shots. The observers are not
+        notified, the board views see the change through the board versions.
+        :param state: GameState object
+        """
+        self.__state = state
+        self.__playerFleet.setShots(*state.getShots('player'))
+        self.__computerFleet.setShots(*state.getShots('computer'))
+        self.__newStrategies()
+        if self.__strategies is not None:
+            offset = self.__ai.restore(self.__strategies)
+            if self.__playerAi is not None:
+                self.__playerAi.restore(self.__strategies,offset)
+        layout = state.getLayout()
+        for board, hitPos, result in state.getMoves():
+            strategy = self.__ai if board == 'player' else self.__playerAi
+            if strategy is not None:
+                cells = ()
+                if result == 'cabin':
+                    side = 0 if board == 'player' else 1
+                    planeId = layout.getPlaneAt(side,hitPos[0] * self.__width + hitPos[1])
+                    cells = layout.getPlanes(side)[planeId].getPlaneCells()
+                strategy.registerResult(hitPos,result,cells)
+        if self.__journal is not None:
+            self.__journalMoves += 1
+            self.__journal.addKeyframe(self.__journalGame,self.__journalMoves,self.snapshot())
+
+    def __packFleet(self,fleet):
+        """
+        Method that encodes a fleet: its planes, the destroyed planes flags and the hit and miss masks of its board.
+        :param fleet: Fleet object
+        :return: bytes
+        """
+        planes = fleet.getPlanes()
+        codes = []
+        destroyed = 0
+        for planeId, plane in enumerate(planes):
+            cabin = plane.getCabinPosition()
+            codes.append((cabin[0] * self.__width + cabin[1]) << 2 | ORIENTATIONS.index(plane.getPlaneOrientation()))
+            if not fleet.getRemainingCells(planeId):
+                destroyed |= 1 << planeId
+        board = fleet.getBoard()
+        cellsCount = self.__width * self.__height
+        return (packCells(codes,cellsCount) + destroyed.to_bytes((len(planes) + 7) // 8,'little')
+                + packMask(board.getHitMask(),cellsCount) + packMask(board.getMissMask(),cellsCount))
+
+    def __unpackFleet(self,fleet,data,offset):
+        """
+        Method that loads a fleet encoded by __packFleet into an empty fleet.
+        :param fleet: Fleet object
+        :param data: bytes
+        :param offset: int - the position of the fleet in data
+        :return: int - the position after the fleet
+        """
+        codes, offset = unpackCells(data,offset,self.__width * self.__height)
+        count = len(codes)
+        for code in codes:
+            plane = Plane(divmod(code >> 2,self.__width),ORIENTATIONS[code & 3],self.__shape)
+            fleet.addPlane(plane,self.__footprint(fleet.getBoard(),plane))
+        size = (count + 7) // 8
+        if offset + size > len(data):
+            raise struct.error('unpack requires {} more bytes'.format(offset + size - len(data)))
+        destroyed = int.from_bytes(data[offset:offset + size],'little')
+        hit, offset = unpackMask(data,offset + size,self.__width * self.__height)
+        miss, offset = unpackMask(data,offset,self.__width * self.__height)
+        fleet.setShots(hit,miss,destroyed)
+        return offset
+
+    def snapshot(self):
+        """
+        Method that encodes the whole game state in a compact versioned binary format:
+        the game size and strategies, the planes and shots of both fleets, the strategies' state and the RNG state.
+        The game is not changed, so it makes the same moves as a game restored from the snapshot.
+        :return: bytes
+        """
+        modes = list(AI_MODES)
+        data = [SNAPSHOT_HEADER.pack(SNAPSHOT_VERSION,self.__width,self.__height,self.__planesCount,
+                                     modes.index(self.__aiMode),
+                                     255 if self.__playerAiMode is None else modes.index(self.__playerAiMode),
+                                     list(DIFFICULTIES).index(self.__difficulty),
+                                     getShape(self.__shape).getKey(),self.__random.getstate()),
+                self.__packFleet(self.__playerFleet),self.__packFleet(self.__computerFleet),self.__ai.snapshot()]
+        if self.__playerAi is not None:
+            data.append(self.__playerAi.snapshot())
+        return b''.join(data)
+
+    @staticmethod
+    def restore(data):
+        """
+        Static method that builds a game from a snapshot.
+        :param data: bytes - the result of snapshot
+        :return: GameService object
+        :raises: ValueError if the data is not a valid snapshot
+        """
+        try:
+            version, width, height, planesCount, aiMode, playerAiMode, difficulty, shape, state = \
+                SNAPSHOT_HEADER.unpack_from(data)
+            if version != SNAPSHOT_VERSION:
+                raise ValueError('Unsupported snapshot version {}!'.format(version))
+            modes = list(AI_MODES)
+            srv = GameService.__new__(GameService)
+            srv.__width = width
+            srv.__height = height
+            srv.__planesCount = planesCount
+            srv.__aiMode = modes[aiMode]
+            srv.__playerAiMode = None if playerAiMode == 255 else modes[playerAiMode]
+            srv.__difficulty = list(DIFFICULTIES)[difficulty]
+            srv.__shape = getShapeByKey(shape).getName()
+            srv.__random = GameRandom()
+            srv.__random.setstate(state)
+            srv.__journal = None
+            srv.__observers = []
+            srv.__undo = False
+            srv.__newBoards()
+            offset = srv.__unpackFleet(srv.__playerFleet,data,SNAPSHOT_HEADER.size)
+            offset = srv.__unpackFleet(srv.__computerFleet,data,offset)
+            offset = srv.__ai.restore(data,offset)
+            if srv.__playerAi is not None:
+                offset = srv.__playerAi.restore(data,offset)
+        except (struct.error,IndexError) as ex:
+            raise ValueError('Invalid snapshot!') from ex
+        if offset != len(data):
+            raise ValueError('Invalid snapshot!')
+        return srv
@@ -0,0 +1,216 @@
+from bisect import bisect_right
+from collections import namedtuple
+from controllers.gameSrv import GameService, ORIENTATIONS, PLAYER_PLANE, PLAYER_SHOT, PLAYER_AUTO_SHOT
+import mmap
+import os
+import struct
+
+# game, move, kind, cell (the cabin cell for the planes), value (the result, or the orientation for the planes)
+RECORD = struct.Struct('<IIBIBxx')
+# game and move in big endian, so the entries sort as bytes; records position, keyframe position and length
+INDEX_ENTRY = struct.Struct('>IIQQI')
+INDEX_KEY = struct.Struct('>II')
+
+JournalRecord = namedtuple('JournalRecord', ['game', 'move', 'kind', 'cell', 'value'])
+
+
+class Journal:
+    def __init__(self,path,keyframeInterval=64):
+        """
+        Append-only journal of games: every placement and shot is a fixed-width record in the file at path.
+        The snapshot of a game is saved as a keyframe when it starts and after every keyframeInterval moves,
+        in path + '.key', and the index path + '.idx' maps (game, move) to the keyframe and to the records after it.
+        An existing journal is continued with new game ids.
+        :param path: str - the records file
+        :param keyframeInterval: int - the number of moves between two keyframes of a game
+        """
+        self.__keyframeInterval = keyframeInterval
+        self.__indexPath = path + '.idx'
+        self.__records = open(path,'ab')
+        self.__keyframes = open(path + '.key','ab')
+        self.__index = open(self.__indexPath,'ab')
+        self.__recordsSize = self.__records.tell()
+        self.__keyframesSize = self.__keyframes.tell()
+        self.__lastKey = b''
+        self.__sorted = True
+        self.__games = 0
+        if self.__index.tell():
+            with open(self.__indexPath,'rb') as index:
+                index.seek(-INDEX_ENTRY.size,os.SEEK_END)
+                self.__lastKey = index.read(INDEX_KEY.size)
+                self.__games = INDEX_KEY.unpack(self.__lastKey)[0] + 1
+
+    def getKeyframeInterval(self):
+        """
+        Getter for the number of moves between two keyframes of a game.
+        :return: int
+        """
+        return self.__keyframeInterval
+
+    def addGame(self,snapshot):
+        """
+        Method that starts a new game in the journal.
+        :param snapshot: bytes - the snapshot of the game before its first move
+        :return: int - the id of the game
+        """
+        game = self.__games
+        self.__games += 1
+        self.addKeyframe(game,0,snapshot)
+        return game
+
+    def addKeyframe(self,game,move,snapshot):
+        """
+        Method that saves the state of a game after a move.
+        :param game: int - the game id
+        :param move: int - the number of moves of the game so far
+        :param snapshot: bytes - the snapshot of the game
+        """
+        key = INDEX_KEY.pack(game,move)
+        if key < self.__lastKey:
+            self.__sorted = False
+        self.__lastKey = key
+        self.__index.write(INDEX_ENTRY.pack(game,move,self.__recordsSize,self.__keyframesSize,len(snapshot)))
+        self.__keyframes.write(snapshot)
+        self.__keyframesSize += len(snapshot)
+
+    def addMove(self,game,move,kind,cell,value):
+        """
+        Method that appends the record of a move.
+        :param game: int - the game id
+        :param move: int - the number of the move in its game, starting from 1
+        :param kind: int - the kind of move: PLAYER_PLANE/PLAYER_SHOT/PLAYER_AUTO_SHOT/COMPUTER_SHOT from gameSrv
+        :param cell: int - row * width + col: the shot cell, or the cabin of the plane
+        :param value: int - the index of the result in gameSrv.RESULTS, or of the plane orientation
+        """
+        self.__records.write(RECORD.pack(game,move,kind,cell,value))
+        self.__recordsSize += RECORD.size
+
+    def flush(self):
+        """
+        Method that writes the buffered records to the files.
+        """
+        for file in (self.__records,self.__keyframes,self.__index):
+            file.flush()
+
+    def close(self):
+        """
+        Method that closes the journal. The index is sorted if the games were journaled at the same time.
+        """
+        for file in (self.__records,self.__keyframes,self.__index):
+            file.close()
+        if not self.__sorted:
+            with open(self.__indexPath,'rb') as index:
+                data = index.read()
+            entries = sorted(data[i:i + INDEX_ENTRY.size] for i in range(0,len(data),INDEX_ENTRY.size))
+            with open(self.__indexPath,'wb') as index:
+                index.write(b''.join(entries))
+
+
+def _map(path):
+    """
+    Function that maps a file in memory for reading.
+    :param path: str
+    :return: mmap object, or empty bytes for an empty file
+    """
+    with open(path,'rb') as file:
+        if not os.fstat(file.fileno()).st_size:
+            return b''
+        return mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+
+
+class JournalReader:
+    def __init__(self,path):
+        """
+        Random access reader of a closed journal. The files are memory-mapped, nothing is loaded upfront.
+        :param path: str - the records file of the journal
+        """
+        self.__records = _map(path)
+        self.__keyframes = _map(path + '.key')
+        self.__index = _map(path + '.idx')
+
+    def getRecordsCount(self):
+        """
+        Getter for the number of moves in the journal, of all the games.
+        :return: int
+        """
+        return len(self.__records) // RECORD.size
+
+    def getRecord(self,position):
+        """
+        Getter for a record of the journal.
+        :param position: int - the index of the record in the file
+        :return: JournalRecord
+        """
+        return JournalRecord(*RECORD.unpack_from(self.__records,position * RECORD.size))
+
+    def __findKeyframe(self,game,move):
+        """
+        Method that finds the last keyframe of a game at or before a move, by bisecting the index.
+        :param game: int - the game id
+        :param move: int - the number of moves
+        :return: (int - the move of the keyframe, int - the records position, bytes - the snapshot)
+        :raises: ValueError if the game is not in the journal
+        """
+        keys = _IndexKeys(self.__index)
+        position = bisect_right(keys,INDEX_KEY.pack(game,move)) - 1
+        if position < 0 or INDEX_KEY.unpack(keys[position])[0] != game:
+            raise ValueError('The game {} is not in the journal!'.format(game))
+        entryGame, entryMove, recordsPos, keyframePos, size = INDEX_ENTRY.unpack_from(self.__index,
+                                                                                     position * INDEX_ENTRY.size)
+        return entryMove, recordsPos, bytes(self.__keyframes[keyframePos:keyframePos + size])
+
+    def getState(self,game,move):
+        """
+        Method that rebuilds a game after a move: its last keyframe is restored and only the records after it are
+        replayed. The boards and the strategies' knowledge are exact, the random number generator is not replayed.
+        :param game: int - the game id
+        :param move: int - the number of moves
+        :return: GameService object
+        :raises: ValueError if the game is not in the journal or it has less moves
+        """
+        keyframeMove, position, snapshot = self.__findKeyframe(game,move)
+        srv = GameService.restore(snapshot)
+        width = srv.getWidth()
+        current = keyframeMove
+        end = len(self.__records) - RECORD.size
+        while current != move and position <= end:
+            recordGame, recordMove, kind, cell, value = RECORD.unpack_from(self.__records,position)
+            position += RECORD.size
+            if recordGame != game:
+                continue
+            pos = divmod(cell,width)
+            if kind == PLAYER_PLANE:
+                srv.addPlayerPlane(pos,ORIENTATIONS[value])
+            elif kind == PLAYER_SHOT:
+                srv.playerHit(pos)
+            elif kind == PLAYER_AUTO_SHOT:
+                srv.playerAutoHit(pos)
+            else:
+                srv.computerHit(pos)
+            current = recordMove
+        if current != move:
+            raise ValueError('The game {} has only {} moves!'.format(game,current))
+        return srv
+
+    def close(self):
+        """
+        Method that unmaps the files.
+        """
+        for data in (self.__records,self.__keyframes,self.__index):
+            if isinstance(data,mmap.mmap):
+                data.close()
+
+
+class _IndexKeys:
+    """
+    Sequence view of the (game, move) keys of the index entries, for bisect.
+    """
+    def __init__(self,index):
+        self.__index = index
+
+    def __len__(self):
+        return len(self.__index) // INDEX_ENTRY.size
+
+    def __getitem__(self,position):
+        start = position * INDEX_ENTRY.size
+        return self.__index[start:start + INDEX_KEY.size]
@@ -0,0 +1,196 @@
+from domain.plane import getPlacementTable
+import argparse
+import mmap
+import os
+import struct
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),'openings.book')
+BOOK_MAGIC = b'PLOB'
+BOOK_VERSION = 1
+# magic, version, lines count
+BOOK_HEADER = struct.Struct('<4sBH')
+# width, height, planes count, root node
+BOOK_LINE = struct.Struct('<HHBI')
+# the cell to shoot (row * width + col), the next node after a miss and after a hit (-1 for none)
+BOOK_NODE = struct.Struct('<Hii')
+# the book lines shipped in BOOK_PATH: width, height, planes count, depth
+DEFAULT_LINES = ((8, 8, 1, 10), (8, 8, 2, 10), (8, 8, 3, 10), (10, 10, 2, 10))
+BOOK_NODES_LIMIT = 32767  # the strategies' snapshots keep the node in 2 bytes
+BOOK_START = -2  # the book was not looked up yet
+OUT_OF_BOOK = -1
+
+
+class OpeningBook:
+    __slots__ = ('__data', '__roots', '__nodes')
+
+    def __init__(self,path=BOOK_PATH):
+        """
+        Read-only opening book: for some board sizes and planes counts, the first shots of the game as a tree
+        of nodes, the next shot depending on the results so far. The file is memory-mapped, so a lookup only
+        reads the few nodes it walks through. A missing book is empty.
+        :param path: str - the book file
+        :raises: ValueError if the file is not an opening book
+        """
+        self.__data = b''
+        self.__roots = {}
+        self.__nodes = 0
+        if not os.path.exists(path) or not os.path.getsize(path):
+            return
+        with open(path,'rb') as file:
+            self.__data = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+        magic, version, linesCount = BOOK_HEADER.unpack_from(self.__data)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            raise ValueError('Invalid opening book!')
+        for i in range(linesCount):
+            width, height, planesCount, root = BOOK_LINE.unpack_from(self.__data,BOOK_HEADER.size + i * BOOK_LINE.size)
+            self.__roots[(width,height,planesCount)] = root
+        self.__nodes = BOOK_HEADER.size + linesCount * BOOK_LINE.size
+
+    def getRoot(self,width,height,planesCount):
+        """
+        Getter for the first node of the book line of a game.
+        :param width: int - the board width
+        :param height: int - the board height
+        :param planesCount: int - the number of enemy planes
+        :return: int - the node, OUT_OF_BOOK if the book has no line for this game
+        """
+        return self.__roots.get((width,height,planesCount),OUT_OF_BOOK)
+
+    def getMove(self,node):
+        """
+        Getter for the shot of a node.
+        :param node: int
+        :return: int - row * width + col
+        """
+        return BOOK_NODE.unpack_from(self.__data,self.__nodes + node * BOOK_NODE.size)[0]
+
+    def getNext(self,node,result):
+        """
+        Getter for the node that follows the result of the shot of a node. A destroyed plane ends the book line.
+        :param node: int
+        :param result: str - cabin/hit/miss
+        :return: int - the next node, or OUT_OF_BOOK
+        """
+        if result == 'cabin':
+            return OUT_OF_BOOK
+        cell, miss, hit = BOOK_NODE.unpack_from(self.__data,self.__nodes + node * BOOK_NODE.size)
+        return hit if result == 'hit' else miss
+
+
+_book = None
+
+
+def getOpeningBook():
+    """
+    Function that gets the shipped opening book, which is mapped at the first call.
+    :return: OpeningBook object
+    """
+    global _book
+    if _book is None:
+        _book = OpeningBook()
+    return _book
+
+
+def _configurations(width,height,planesCount):
+    """
+    Function that lists the configurations of the enemy planes.
+    :return: list of (int - mask of the occupied cells, int - mask of the cabins)
+    """
+    table = getPlacementTable(width,height)
+    placements = table.getPlacements()
+    compatibleAfter = table.getCompatibleAfter()
+    configurations = []
+    stack = [(planesCount,(1 << len(placements)) - 1,0,0)]
+    while stack:
+        left, candidates, occupied, cabins = stack.pop()
+        if not left:
+            configurations.append((occupied,cabins))
+            continue
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            placement = placements[low.bit_length() - 1]
+            cabin = 1 << placement.cabin[0] * width + placement.cabin[1]
+            stack.append((left - 1,candidates & compatibleAfter[placement.index],occupied | placement.mask,
+                          cabins | cabin))
+    return configurations
+
+
+def _bestCell(configurations,cellsCount,shot,hits):
+    """
+    Function that chooses the shot of a book node: the cell most likely to be a plane part, or once there
+    are hits, the cell most likely to be a cabin, counted over the configurations consistent with the results.
+    :return: int - the cell, or None if no cell can be a plane part
+    """
+    for index in (1,0) if hits else (0,):
+        counts = [0] * cellsCount
+        for configuration in configurations:
+            mask = configuration[index] & ~shot
+            while mask:
+                low = mask & -mask
+                mask ^= low
+                counts[low.bit_length() - 1] += 1
+        best = max(counts)
+        if best:
+            return counts.index(best)
+    return None
+
+
+def buildLine(width,height,planesCount,depth):
+    """
+    Function that builds the book line of a game: the nodes of the first depth shots, root first.
+    :param width: int - the board width
+    :param height: int - the board height
+    :param planesCount: int - the number of enemy planes
+    :param depth: int - the number of shots covered by the book
+    :return: list of [int - the cell, int - the miss node, int - the hit node], the nodes numbered from 0
+    """
+    nodes = []
+
+    def build(configurations,shot,hits,left):
+        cell = _bestCell(configurations,width * height,shot,hits)
+        if cell is None:
+            return OUT_OF_BOOK
+        node = len(nodes)
+        nodes.append([cell,OUT_OF_BOOK,OUT_OF_BOOK])
+        if left > 1:
+            bit = 1 << cell
+            missed = [c for c in configurations if not c[0] & bit]
+            hit = [c for c in configurations if c[0] & bit and not c[1] & bit]
+            if missed:
+                nodes[node][1] = build(missed,shot | bit,hits,left - 1)
+            if hit:
+                nodes[node][2] = build(hit,shot | bit,hits | bit,left - 1)
+        return node
+
+    build(_configurations(width,height,planesCount),0,0,depth)
+    return nodes
+
+
+def writeBook(path,lines=DEFAULT_LINES):
+    """
+    Function that generates an opening book.
+    :param path: str - the book file
+    :param lines: iterable of tuples (width, height, planes count, depth)
+    :raises: ValueError if the book has more than BOOK_NODES_LIMIT nodes
+    """
+    directory = []
+    nodes = []
+    for width, height, planesCount, depth in lines:
+        offset = len(nodes)
+        directory.append(BOOK_LINE.pack(width,height,planesCount,offset))
+        for cell, miss, hit in buildLine(width,height,planesCount,depth):
+            nodes.append(BOOK_NODE.pack(cell,miss + offset if miss >= 0 else miss,hit + offset if hit >= 0 else hit))
+    if len(nodes) > BOOK_NODES_LIMIT:
+        raise ValueError('The opening book is too large!')
+    with open(path,'wb') as file:
+        file.write(BOOK_HEADER.pack(BOOK_MAGIC,BOOK_VERSION,len(directory)))
+        file.write(b''.join(directory))
+        file.write(b''.join(nodes))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates the opening book of the computer strategies.')
+    parser.add_argument('--out', default=BOOK_PATH)
+    args = parser.parse_args()
+    writeBook(args.out)
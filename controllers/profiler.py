@@ -0,0 +1,165 @@
+from controllers.gameSrv import GameService
+from controllers.strategies import ClassicStrategy, DensityStrategy, MonteCarloStrategy
+import functools
+import json
+import sys
+import time
+
+HISTOGRAM_BUCKETS = 24  # bucket i counts the calls that took less than 2 ** i microseconds, the last one the rest
+# the methods instrumented by default, the private ones by their mangled name
+HOT_PATHS = {
+    GameService: ('addPlayerPlane', 'addRandomPlayerPlanes', 'addComputerPlanes', 'playerHit', 'playerAutoHit',
+                  'computerHit', 'snapshot', '_GameService__shoot'),
+    ClassicStrategy: ('nextMove', 'registerResult'),
+    DensityStrategy: ('nextMove', 'registerResult', '_DensityStrategy__bestCells'),
+    MonteCarloStrategy: ('nextMove', 'registerResult', '_MonteCarloStrategy__sample'),
+}
+
+
+class Profiler:
+    def __init__(self):
+        """
+        Profiler of the hot paths: the instrumented methods are wrapped only while the profiler is enabled,
+        so there is no cost at all when it is off. For every method it records the number of calls,
+        the total and max latency, a latency histogram with power of two buckets, and the memory blocks
+        left allocated by the calls (sys.getallocatedblocks).
+        """
+        self.__stats = {}  # name -> [calls, total seconds, max seconds, allocated blocks, histogram]
+        self.__originals = []  # (class, attribute, original function)
+
+    def __wrap(self,name,function):
+        """
+        Method that builds the recording wrapper of a function.
+        :param name: str - the name of the function in the report
+        :param function: the function to wrap
+        :return: the wrapper
+        """
+        stats = self.__stats.setdefault(name,[0,0.0,0.0,0,[0] * HISTOGRAM_BUCKETS])
+        clock = time.perf_counter
+        blocks = sys.getallocatedblocks
+
+        @functools.wraps(function)
+        def wrapper(*args,**kwargs):
+            allocated = blocks()
+            start = clock()
+            try:
+                return function(*args,**kwargs)
+            finally:
+                elapsed = clock() - start
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+                stats[3] += blocks() - allocated
+                stats[4][min(int(elapsed * 1e6).bit_length(),HISTOGRAM_BUCKETS - 1)] += 1
+        return wrapper
+
+    def instrument(self,cls,attributes):
+        """
+        Method that wraps methods of a class, until disable is called.
+        :param cls: the class
+        :param attributes: iterable of str - the method names, the private ones mangled (_Class__method)
+        """
+        for attribute in attributes:
+            original = cls.__dict__[attribute]
+            name = '{}.{}'.format(cls.__name__,attribute.replace('_{}'.format(cls.__name__),'',1))
+            self.__originals.append((cls,attribute,original))
+            setattr(cls,attribute,self.__wrap(name,original))
+
+    def enable(self,paths=None):
+        """
+        Method that instruments the hot paths.
+        :param paths: dict - class -> method names, HOT_PATHS by default
+        """
+        for cls, attributes in (HOT_PATHS if paths is None else paths).items():
+            self.instrument(cls,attributes)
+
+    def disable(self):
+        """
+        Method that puts back the original methods. The recorded statistics are kept.
+        """
+        for cls, attribute, original in reversed(self.__originals):
+            setattr(cls,attribute,original)
+        self.__originals.clear()
+
+    def isEnabled(self):
+        """
+        Method that checks if some methods are instrumented.
+        :return: True/False
+        """
+        return bool(self.__originals)
+
+    def getStats(self):
+        """
+        Getter for the recorded statistics, as plain data that can be sent between processes.
+        :return: dict - name -> [calls, total seconds, max seconds, allocated blocks, histogram list]
+        """
+        return {name: stats[:4] + [list(stats[4])] for name, stats in self.__stats.items()}
+
+    def merge(self,stats):
+        """
+        Method that adds statistics recorded by another profiler, eg in a worker process.
+        :param stats: dict - the result of getStats
+        """
+        for name, (calls, total, maximum, allocated, histogram) in stats.items():
+            mine = self.__stats.setdefault(name,[0,0.0,0.0,0,[0] * HISTOGRAM_BUCKETS])
+            mine[0] += calls
+            mine[1] += total
+            mine[2] = max(mine[2],maximum)
+            mine[3] += allocated
+            mine[4] = [a + b for a, b in zip(mine[4],histogram)]
+
+    @staticmethod
+    def __percentile(histogram,calls,share):
+        """
+        Method that estimates a latency percentile from a histogram: the upper bound of its bucket.
+        :return: float - microseconds
+        """
+        seen = 0
+        for bucket, count in enumerate(histogram):
+            seen += count
+            if seen >= share * calls:
+                return float(1 << bucket)
+        return float(1 << (len(histogram) - 1))
+
+    def toJson(self):
+        """
+        Method that exports the statistics, with the latencies in microseconds.
+        :return: str - JSON object: name -> {calls, total_us, mean_us, max_us, p50_us, p99_us, allocated_blocks,
+        histogram}
+        """
+        report = {}
+        for name, (calls, total, maximum, allocated, histogram) in sorted(self.__stats.items()):
+            report[name] = {'calls': calls, 'total_us': total * 1e6, 'mean_us': total * 1e6 / calls if calls else 0.0,
+                            'max_us': maximum * 1e6, 'p50_us': self.__percentile(histogram,calls,0.5),
+                            'p99_us': self.__percentile(histogram,calls,0.99), 'allocated_blocks': allocated,
+                            'histogram': histogram}
+        return json.dumps(report,indent=1)
+
+    def report(self):
+        """
+        Method that formats the statistics as a table, the slowest paths in total first.
+        :return: str
+        """
+        lines = ['{:45} {:>9} {:>12} {:>10} {:>10} {:>10} {:>10}'.format('method','calls','total ms','mean us',
+                                                                       'p99 us','max us','blocks')]
+        for name, (calls, total, maximum, allocated, histogram) in sorted(self.__stats.items(),
+                                                                          key=lambda item: -item[1][1]):
+            if calls:
+                lines.append('{:45} {:9} {:12.3f} {:10.1f} {:>10} {:10.1f} {:10}'.format(
+                    name,calls,total * 1e3,total * 1e6 / calls,'<{:.0f}'.format(self.__percentile(histogram,calls,0.99)),
+                    maximum * 1e6,allocated))
+        return '\n'.join(lines)
+
+    def dump(self,path):
+        """
+        Method that writes the report: as JSON if the path ends with .json, as a table otherwise, on the standard
+        output for the path '-'.
+        :param path: str
+        """
+        text = self.toJson() if path.endswith('.json') else self.report()
+        if path == '-':
+            print(text)
+        else:
+            with open(path,'w') as file:
+                file.write(text + '\n')
@@ -0,0 +1,197 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from controllers.gameSrv import GameService, DIFFICULTIES
+from controllers.profiler import Profiler
+from domain.shapes import getShapeNames
+import argparse
+import os
+import random
+import time
+
+
+class SimulationStats:
+    def __init__(self):
+        """
+        Aggregated results of a batch of headless games.
+        """
+        self.games = 0
+        self.wins = {'human': 0, 'computer': 0}
+        self.shots = {}  # number of rounds until the game ended -> number of games
+        self.elapsed = 0.0
+        self.profile = None  # Profiler object, for the profiled simulations
+
+    def addGame(self,winner,rounds):
+        """
+        Method that adds the result of one game.
+        :param winner: str - human/computer
+        :param rounds: int - the number of rounds played
+        """
+        self.games += 1
+        self.wins[winner] += 1
+        self.shots[rounds] = self.shots.get(rounds,0) + 1
+
+    def merge(self,other):
+        """
+        Method that adds the results of another batch to these results.
+        :param other: SimulationStats object
+        """
+        self.games += other.games
+        for winner in self.wins:
+            self.wins[winner] += other.wins[winner]
+        for rounds, count in other.shots.items():
+            self.shots[rounds] = self.shots.get(rounds,0) + count
+        if other.profile is not None:
+            if self.profile is None:
+                self.profile = Profiler()
+            self.profile.merge(other.profile.getStats())
+
+    def getWinRate(self,winner):
+        """
+        Method that gets the win rate of a side.
+        :param winner: str - human/computer
+        :return: float - between 0 and 1
+        """
+        return self.wins[winner] / self.games if self.games else 0.0
+
+    def getMeanShots(self):
+        """
+        Method that gets the average number of rounds per game.
+        :return: float
+        """
+        return sum(r * c for r, c in self.shots.items()) / self.games if self.games else 0.0
+
+    def getGamesPerSecond(self):
+        """
+        Method that gets the simulation throughput.
+        :return: float
+        """
+        return self.games / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        """
+        Method that formats the results on one line.
+        :return: str
+        """
+        return "games: {} | player wins: {:.2%} | computer wins: {:.2%} | mean rounds: {:.2f} | games/s: {:.0f}".format(
+            self.games, self.getWinRate('human'), self.getWinRate('computer'), self.getMeanShots(),
+            self.getGamesPerSecond())
+
+
+def playGame(playerAiMode,computerAiMode,seed,width=8,height=8,planesCount=2,difficulty='medium',shape='classic'):
+    """
+    Function that plays one complete game between two strategies, without any UI.
+    The player shoots first, as in the interactive games.
+    :param playerAiMode: str - the strategy of the player
+    :param computerAiMode: str - the strategy of the computer
+    :param seed: int - the seed of the game
+    :param width: int - the board width
+    :param height: int - the board height
+    :param planesCount: int - the number of planes of each player
+    :param difficulty: str - the difficulty of the montecarlo strategies
+    :param shape: str - the name of the plane shape
+    :return: (str - the winner, int - the number of rounds)
+    """
+    srv = GameService(seed,computerAiMode,playerAiMode,width,height,planesCount,difficulty,shape)
+    srv.addRandomPlayerPlanes()
+    rounds = 0
+    while True:
+        rounds += 1
+        srv.playerAutoHit()
+        if srv.getWinner() == 'human':
+            return 'human', rounds
+        srv.computerHit()
+        if srv.getWinner() == 'computer':
+            return 'computer', rounds
+
+
+def playBatch(playerAiMode,computerAiMode,games,seed,size=(8,8,2),profile=False,difficulty='medium',shape='classic'):
+    """
+    Function run by the worker processes: it plays a batch of games with a RNG seeded for the batch.
+    :param playerAiMode: str - the strategy of the player
+    :param computerAiMode: str - the strategy of the computer
+    :param games: int - the number of games
+    :param seed: int - the seed of the batch
+    :param size: tuple (width, height, planes count) - the size of the games
+    :param profile: bool - True to profile the hot paths of the games
+    :param difficulty: str - the difficulty of the montecarlo strategies
+    :param shape: str - the name of the plane shape
+    :return: SimulationStats object
+    """
+    rng = random.Random(seed)
+    stats = SimulationStats()
+    if profile:
+        stats.profile = Profiler()
+        stats.profile.enable()
+    try:
+        for i in range(games):
+            winner, rounds = playGame(playerAiMode,computerAiMode,rng.getrandbits(64),*size,difficulty,shape)
+            stats.addGame(winner,rounds)
+    finally:
+        if profile:
+            stats.profile.disable()
+    return stats
+
+
+def simulate(games,playerAiMode='classic',computerAiMode='classic',workers=None,seed=0,batchSize=1000,size=(8,8,2),
+             profile=False,difficulty='medium',shape='classic'):
+    """
+    Generator that plays games on a process pool and yields the aggregated results after every finished batch.
+    Only a few batches are in flight at a time, so the memory use does not depend on the number of games.
+    :param games: int - the number of games
+    :param playerAiMode: str - the strategy of the player
+    :param computerAiMode: str - the strategy of the computer
+    :param workers: int - the number of worker processes (default: the number of CPUs)
+    :param seed: int - the seed of the whole simulation, every batch gets its own seed derived from it
+    :param batchSize: int - the number of games played by a worker in one task
+    :param size: tuple (width, height, planes count) - the size of the games
+    :param profile: bool - True to profile the hot paths in the workers, the results get the merged profile
+    :param difficulty: str - the difficulty of the montecarlo strategies
+    :param shape: str - the name of the plane shape
+    :return: generator of SimulationStats objects - the results so far
+    """
+    workers = workers or os.cpu_count() or 1
+    seeds = random.Random(seed)
+    stats = SimulationStats()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        submitted = 0
+        while submitted < games or pending:
+            while submitted < games and len(pending) < 2 * workers:
+                count = min(batchSize,games - submitted)
+                pending.add(pool.submit(playBatch,playerAiMode,computerAiMode,count,seeds.getrandbits(64),size,
+                                        profile,difficulty,shape))
+                submitted += count
+            done, pending = wait(pending,return_when=FIRST_COMPLETED)
+            for future in done:
+                stats.merge(future.result())
+            stats.elapsed = time.perf_counter() - start
+            yield stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless self-play of the Planes game.')
+    parser.add_argument('games', type=int)
+    parser.add_argument('--player', default='classic', help='the strategy of the player')
+    parser.add_argument('--computer', default='classic', help='the strategy of the computer')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--width', type=int, default=8)
+    parser.add_argument('--height', type=int, default=8)
+    parser.add_argument('--planes', type=int, default=2)
+    parser.add_argument('--difficulty', choices=list(DIFFICULTIES), default='medium',
+                        help='the time the montecarlo strategies take for a move')
+    parser.add_argument('--shape', choices=getShapeNames(), default='classic', help='the shape of the planes')
+    parser.add_argument('--profile', nargs='?', const='-', default=None, metavar='PATH',
+                        help='profile the hot paths and write the report to PATH (JSON for .json, default: stdout)')
+    args = parser.parse_args()
+    stats = SimulationStats()
+    for stats in simulate(args.games, args.player, args.computer, args.workers, args.seed, args.batch,
+                          (args.width, args.height, args.planes), args.profile is not None, args.difficulty,
+                          args.shape):
+        print(stats.report())
+    print('rounds distribution:')
+    for rounds in sorted(stats.shots):
+        print('{:4} {}'.format(rounds, stats.shots[rounds]))
+    if stats.profile is not None:
+        stats.profile.dump(args.profile)
@@ -0,0 +1,320 @@
+from collections import OrderedDict
+from domain.plane import getPlacementTable
+import argparse
+import struct
+import time
+
+POLICY_VERSION = 1
+# version, width, height, planes count, entries count
+POLICY_HEADER = struct.Struct('<BHHBI')
+
+
+class Solver:
+    __slots__ = ('__table', '__width', '__height', '__planesCount', '__cacheSize', '__cache', '__configs',
+                 '__configIndex', '__withPlacement', '__covering', '__cabins', '__cabinCovering', '__beliefBytes',
+                 '__symmetries')
+
+    def __init__(self,width=8,height=8,planesCount=2,cacheSize=1 << 20):
+        """
+        Exact solver of the shooting game: it finds the shot that minimizes the expected number of shots needed
+        to destroy all the enemy planes, the enemy configuration being uniform among the ones consistent with
+        the results seen so far (the computer draws its planes this way).
+        A state is the mask of the consistent configurations (the belief) and the destroyed placements. The results
+        are kept in a transposition table with LRU eviction, keyed by the state folded by the symmetries of
+        the board, so the mirrored and rotated states are solved once.
+        :param width: int - the board width
+        :param height: int - the board height
+        :param planesCount: int - the number of enemy planes
+        :param cacheSize: int - the maximum number of states kept in the transposition table
+        :raises: ValueError if the board has no placement table
+        """
+        self.__table = getPlacementTable(width,height)
+        if self.__table is None:
+            raise ValueError('The solver needs a smaller board!')
+        self.__width = width
+        self.__height = height
+        self.__planesCount = planesCount
+        self.__cacheSize = cacheSize
+        self.__cache = OrderedDict()  # canonical state -> (best shot in the canonical frame, expected shots)
+        placements = self.__table.getPlacements()
+        compatibleAfter = self.__table.getCompatibleAfter()
+        self.__configs = []
+        self.__enumerate(planesCount,(1 << len(placements)) - 1,(),compatibleAfter)
+        self.__configIndex = {config: i for i, config in enumerate(self.__configs)}
+        self.__withPlacement = [0] * len(placements)  # placement -> mask of the configurations containing it
+        for i, config in enumerate(self.__configs):
+            for p in config:
+                self.__withPlacement[p] |= 1 << i
+        cells = width * height
+        self.__covering = [0] * cells  # cell -> mask of the configurations having a plane on it
+        self.__cabins = [[] for c in range(cells)]  # cell -> the placements having their cabin on it
+        for placement in placements:
+            cabin = placement.cabin[0] * width + placement.cabin[1]
+            self.__cabins[cabin].append(placement.index)
+            for c in placement.cells:
+                self.__covering[c[0] * width + c[1]] |= self.__withPlacement[placement.index]
+        # cell -> mask of the configurations having a cabin on it
+        self.__cabinCovering = [sum(self.__withPlacement[p] for p in self.__cabins[c]) for c in range(cells)]
+        self.__beliefBytes = (len(self.__configs) + 7) // 8
+        self.__symmetries = self.__buildSymmetries()
+
+    def __enumerate(self,planesCount,candidates,chosen,compatibleAfter):
+        """
+        Method that lists the configurations: sorted tuples of non-overlapping placement indices.
+        """
+        if not planesCount:
+            self.__configs.append(chosen)
+            return
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            index = low.bit_length() - 1
+            self.__enumerate(planesCount - 1,candidates & compatibleAfter[index],chosen + (index,),compatibleAfter)
+
+    def __buildSymmetries(self):
+        """
+        Method that builds the symmetries of the board: the mirrors and the half turn, and the quarter turns and
+        diagonal mirrors of the square boards. The plane is symmetric about its axis, so every symmetry maps
+        a placement to a placement and a configuration to a configuration.
+        :return: list of (list - cell -> cell, list - placement -> placement, list - the images of the nibbles of
+        a configurations mask: nibble position * 16 + nibble -> mask), the identity first
+        """
+        w, h = self.__width, self.__height
+        transforms = [lambda r, c: (r, c), lambda r, c: (h - 1 - r, c), lambda r, c: (r, w - 1 - c),
+                      lambda r, c: (h - 1 - r, w - 1 - c)]
+        if w == h:
+            transforms += [lambda r, c: (c, r), lambda r, c: (w - 1 - c, r), lambda r, c: (c, h - 1 - r),
+                           lambda r, c: (w - 1 - c, h - 1 - r)]
+        symmetries = []
+        for transform in transforms:
+            cellMap = [0] * (w * h)
+            for r in range(h):
+                for c in range(w):
+                    r2, c2 = transform(r,c)
+                    cellMap[r * w + c] = r2 * w + c2
+            placementMap = [self.__table.findByCells(transform(*cell) for cell in placement.cells).index
+                            for placement in self.__table.getPlacements()]
+            configMap = [self.__configIndex[tuple(sorted(placementMap[p] for p in config))]
+                         for config in self.__configs]
+            nibbles = []
+            for position in range(0,self.__beliefBytes * 8,4):
+                for nibble in range(16):
+                    nibbles.append(sum(1 << configMap[position + bit] for bit in range(4)
+                                       if nibble >> bit & 1 and position + bit < len(configMap)))
+            symmetries.append((cellMap,placementMap,nibbles))
+        return symmetries
+
+    def getConfigurationsCount(self):
+        """
+        Getter for the number of configurations of the enemy planes.
+        :return: int
+        """
+        return len(self.__configs)
+
+    def getCacheSize(self):
+        """
+        Getter for the number of states in the transposition table.
+        :return: int
+        """
+        return len(self.__cache)
+
+    def __canonical(self,belief,destroyed):
+        """
+        Method that folds a state with the board symmetries: the smallest of its images is the key.
+        :return: (tuple - the key, int - the index of the symmetry that gives it)
+        """
+        best = None
+        data = belief.to_bytes(self.__beliefBytes,'little')
+        for index, (cellMap, placementMap, nibbles) in enumerate(self.__symmetries):
+            mapped = 0
+            for position, byte in enumerate(data):
+                if byte:
+                    mapped |= nibbles[position * 32 + (byte & 15)] | nibbles[position * 32 + 16 + (byte >> 4)]
+            key = (mapped,tuple(sorted(placementMap[p] for p in destroyed)))
+            if best is None or key < best:
+                best, bestIndex = key, index
+        return best, bestIndex
+
+    def __remember(self,key,entry):
+        """
+        Method that adds a state to the transposition table, evicting the least recently used one when it is full.
+        """
+        self.__cache[key] = entry
+        if len(self.__cache) > self.__cacheSize:
+            self.__cache.popitem(last=False)
+
+    def __lowerBound(self,belief,destroyed):
+        """
+        Method that bounds the expected shots of a state from below: every alive plane needs a shot on its cabin.
+        With one plane left, a shot that does not destroy it is a hit or a miss, so at most 2 ** (k - 1) cabin cells
+        can be shot at the k-th shot of a strategy: the likeliest cabin cells are shot first, at best.
+        :param belief: int - the mask of the consistent configurations
+        :param destroyed: tuple of int - the destroyed placements
+        :return: float
+        """
+        alive = self.__planesCount - len(destroyed)
+        if alive != 1:
+            return float(alive)
+        known = 0
+        for p in destroyed:
+            cabin = self.__table.getPlacements()[p].cabin
+            known |= 1 << cabin[0] * self.__width + cabin[1]
+        counts = sorted(((belief & cabins).bit_count() for cell, cabins in enumerate(self.__cabinCovering)
+                         if not known >> cell & 1),reverse=True)
+        bound, shot, slots = 0, 1, 1
+        for i, count in enumerate(counts):
+            if not count:
+                break
+            if i == slots:
+                shot += 1
+                slots += 1 << (shot - 1)
+            bound += shot * count
+        return bound / belief.bit_count()
+
+    def __solve(self,belief,destroyed):
+        """
+        Method that solves a state. The consistent configurations and the destroyed planes are all the shooter
+        knows: a shot whose result is already certain is never worth it, unless it destroys a plane.
+        :param belief: int - the mask of the consistent configurations
+        :param destroyed: tuple of int - the destroyed placements, sorted
+        :return: (int - the best cell, float - the expected number of shots to destroy all the planes)
+        """
+        alive = self.__planesCount - len(destroyed)
+        if not alive:
+            return None, 0.0
+        if not belief & (belief - 1):  # the planes are known: one shot on every cabin
+            for p in self.__configs[belief.bit_length() - 1]:
+                if p not in destroyed:
+                    cabin = self.__table.getPlacements()[p].cabin
+                    return cabin[0] * self.__width + cabin[1], float(alive)
+        key, symmetry = self.__canonical(belief,destroyed)
+        entry = self.__cache.get(key)
+        if entry is not None:
+            self.__cache.move_to_end(key)
+            return self.__symmetries[symmetry][0].index(entry[0]), entry[1]
+        total = belief.bit_count()
+        moves = []
+        for cell in range(self.__width * self.__height):
+            outcomes = []
+            cabins = 0
+            for p in self.__cabins[cell]:
+                configs = belief & self.__withPlacement[p]
+                if configs and p not in destroyed:
+                    cabins |= configs
+                    outcomes.append((configs,tuple(sorted(destroyed + (p,)))))
+            hit = belief & self.__covering[cell] & ~cabins
+            if hit:
+                outcomes.append((hit,destroyed))
+            miss = belief & ~self.__covering[cell]
+            if miss:
+                outcomes.append((miss,destroyed))
+            if not cabins and len(outcomes) == 1:
+                continue
+            bounds = [configs.bit_count() / total * self.__lowerBound(configs,outcomeDestroyed)
+                      for configs, outcomeDestroyed in outcomes]
+            moves.append((1 + sum(bounds),cell,outcomes,bounds))
+        moves.sort(key=lambda m: m[0])
+        bestCell, best = None, float('inf')
+        for bound, cell, outcomes, bounds in moves:
+            if bound >= best:
+                break
+            value = 1.0
+            rest = bound - 1
+            for (configs, outcomeDestroyed), outcomeBound in zip(outcomes,bounds):
+                rest -= outcomeBound
+                value += configs.bit_count() / total * self.__solve(configs,outcomeDestroyed)[1]
+                if value + rest >= best:
+                    break
+            else:
+                if value < best:
+                    bestCell, best = cell, value
+        self.__remember(key,(self.__symmetries[symmetry][0][bestCell],best))
+        return bestCell, best
+
+    def solve(self,hits=(),misses=(),destroyed=()):
+        """
+        Method that solves a state of the game.
+        :param hits: iterable of tuples - the hit cells of the planes which are not destroyed
+        :param misses: iterable of tuples - the missed cells
+        :param destroyed: iterable of tuples (cabin position, orientation) - the destroyed planes
+        :return: (tuple - the coordinates of the best shot, float - the expected number of shots left)
+        :raises: ValueError if a destroyed plane does not fit or no configuration is consistent with the state
+        """
+        placements = [self.__table.find(cabin,orientation) for cabin, orientation in destroyed]
+        if None in placements:
+            raise ValueError('A destroyed plane does not fit on the board!')
+        destroyedPlacements = tuple(sorted(placement.index for placement in placements))
+        hitsMask = sum(1 << (c[0] * self.__width + c[1]) for c in set(hits))
+        missesMask = sum(1 << (c[0] * self.__width + c[1]) for c in set(misses))
+        belief = (1 << len(self.__configs)) - 1
+        for p in destroyedPlacements:
+            belief &= self.__withPlacement[p]
+        for cell in range(self.__width * self.__height):
+            if hitsMask >> cell & 1:
+                belief &= self.__covering[cell]
+                for p in self.__cabins[cell]:
+                    belief &= ~self.__withPlacement[p]
+            elif missesMask >> cell & 1:
+                belief &= ~self.__covering[cell]
+        if not belief:
+            raise ValueError('No configuration is consistent with the state!')
+        cell, expected = self.__solve(belief,destroyedPlacements)
+        return (None if cell is None else divmod(cell,self.__width)), expected
+
+    def __policyEntry(self):
+        """
+        Method that gets the format of a policy entry: the mask of the consistent configurations,
+        the destroyed placements (0xFFFF for none), the best cell and the expected shots.
+        :return: struct.Struct object
+        """
+        return struct.Struct('<{}s{}HHd'.format(self.__beliefBytes,self.__planesCount))
+
+    def savePolicy(self,path):
+        """
+        Method that saves the transposition table: the optimal shot and value of every solved state.
+        :param path: str - the policy file
+        """
+        entry = self.__policyEntry()
+        with open(path,'wb') as file:
+            file.write(POLICY_HEADER.pack(POLICY_VERSION,self.__width,self.__height,self.__planesCount,
+                                          len(self.__cache)))
+            for (belief, destroyed), (cell, expected) in self.__cache.items():
+                padded = destroyed + (0xFFFF,) * (self.__planesCount - len(destroyed))
+                file.write(entry.pack(belief.to_bytes(self.__beliefBytes,'little'),*padded,cell,expected))
+
+    def loadPolicy(self,path):
+        """
+        Method that loads a policy saved by savePolicy into the transposition table.
+        :param path: str - the policy file
+        :raises: ValueError if the policy is for another game
+        """
+        with open(path,'rb') as file:
+            data = file.read()
+        version, width, height, planesCount, count = POLICY_HEADER.unpack_from(data)
+        if (version, width, height, planesCount) != (POLICY_VERSION, self.__width, self.__height, self.__planesCount):
+            raise ValueError('The policy is for another game!')
+        entry = self.__policyEntry()
+        for fields in entry.iter_unpack(data[POLICY_HEADER.size:POLICY_HEADER.size + count * entry.size]):
+            destroyed = tuple(p for p in fields[1:1 + planesCount] if p != 0xFFFF)
+            self.__remember((int.from_bytes(fields[0],'little'),destroyed),(fields[-2],fields[-1]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exact solver of the Planes game: precomputes the optimal policy.')
+    # the states grow quickly with the board: 7x7 with 1 plane takes 0.4 s, while 7x7 with 2 planes
+    # and 8x8 with 1 plane did not finish in 4 minutes
+    parser.add_argument('--width', type=int, default=7)
+    parser.add_argument('--height', type=int, default=7)
+    parser.add_argument('--planes', type=int, default=1)
+    parser.add_argument('--cache', type=int, default=1 << 22, help='the maximum number of states kept')
+    parser.add_argument('--out', default=None, help='the file the policy is saved to')
+    args = parser.parse_args()
+    solver = Solver(args.width, args.height, args.planes, args.cache)
+    if not solver.getConfigurationsCount():
+        raise SystemExit('{} planes do not fit on a {}x{} board!'.format(args.planes, args.width, args.height))
+    start = time.perf_counter()
+    cell, expected = solver.solve()
+    print('configurations: {} | first shot: {} | expected shots: {:.4f} | states: {} | {:.1f}s'.format(
+        solver.getConfigurationsCount(), cell, expected, solver.getCacheSize(), time.perf_counter() - start))
+    if args.out:
+        solver.savePolicy(args.out)
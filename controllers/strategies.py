@@ -0,0 +1,558 @@
+from array import array
+from collections import deque
+from domain.board import SPARSE_LIMIT, packMask, unpackMask, packCells, unpackCells, maskCells
+from controllers.openingBook import getOpeningBook, BOOK_START, OUT_OF_BOOK
+import random
+import struct
+import time
+from domain.plane import getPlacementTable
+from domain.shapes import getShape
+
+BOOK_NODE_FORMAT = struct.Struct('<h')  # the books have less than 32768 nodes
+MONTE_CARLO_STATE = struct.Struct('<Bh')  # the destroyed planes and the book node
+BUDGET_SHARE = 0.7  # the part of its time budget the Monte Carlo AI spends drawing configurations
+
+
+def _bookMove(node,width,height,planesCount):
+    """
+    Function that gets the opening book shot of a strategy, the book is looked up at the first shot of a game.
+    :param node: int - the book node of the strategy, BOOK_START or OUT_OF_BOOK
+    :return: (int - the book node, int - the cell to shoot, or None when the game is out of the book)
+    """
+    if node == BOOK_START:
+        node = getOpeningBook().getRoot(width,height,planesCount)
+    if node == OUT_OF_BOOK:
+        return node, None
+    return node, getOpeningBook().getMove(node)
+
+
+def _bookNext(node,cell,width,height,planesCount,result):
+    """
+    Function that follows the result of a shot in the opening book.
+    :param node: int - the book node of the strategy, BOOK_START or OUT_OF_BOOK
+    :param cell: int - the shot cell: a shot that is not the book move leaves the book
+    :param result: str - cabin/hit/miss
+    :return: int - the next book node
+    """
+    node, move = _bookMove(node,width,height,planesCount)
+    if move != cell:
+        return OUT_OF_BOOK
+    return getOpeningBook().getNext(node,result)
+
+
+class IdentityMap(dict):
+    """
+    Dictionary where every missing key is mapped to itself: a lazily stored identity array for huge boards.
+    """
+    def __missing__(self,key):
+        return key
+
+
+class ClassicStrategy:
+    __slots__ = ('__width', '__height', '__random', '__pool', '__positions', '__poolSize', '__neighboursQueue', '__queued',
+                 '__planesCount', '__bookNode', '__shape')
+
+    def __init__(self,width,height,rng,planesCount=2,shape='classic'):
+        """
+        The original computer player: it hits random unvisited cells until a plane part is found,
+        then it uses a BFS queue to hit the neighbours of the successful shots.
+        The unvisited cells are kept in a pool with swap-remove, so a random pick is always one step,
+        and the queue ignores the cells that are already in it.
+        The first shots come from the opening book, while the game follows one of its lines.
+        :param width: int - the board width
+        :param height: int - the board height
+        :param rng: random.Random object
+        :param planesCount: int - the number of enemy planes
+        :param shape: str - the name of the enemy plane shape
+        """
+        self.__width = width
+        self.__height = height
+        self.__random = rng
+        self.__planesCount = planesCount
+        self.__shape = getShape(shape)
+        self.__bookNode = BOOK_START if shape == 'classic' else OUT_OF_BOOK  # the book is made for the classic planes
+        self.__reset()
+
+    def __reset(self):
+        """
+        Method that starts a new pool, where only the four corners are visited if no plane can cover them,
+        and an empty queue. No classic plane can cover a corner: the wings and the tail stick out of both sides
+        of the plane's axis.
+        """
+        width = self.__width
+        height = self.__height
+        if width * height > SPARSE_LIMIT:
+            self.__pool = IdentityMap()  # only the positions that were swapped are stored
+            self.__positions = IdentityMap()
+        else:
+            typecode = 'h' if width * height < 1 << 15 else 'l'  # 2 bytes per cell on the usual boards
+            self.__pool = array(typecode,range(width * height))  # the unvisited cells: row * width + col
+            self.__positions = array(typecode,range(width * height))  # cell -> its index in the pool, -1 if visited
+        self.__poolSize = width * height
+        self.__neighboursQueue = deque()
+        self.__queued = set()
+        if not self.__shape.coversCorners():
+            for corner in ((0,0),(0,width-1),(height-1,0),(height-1,width-1)):
+                self.__visit(corner[0] * width + corner[1])
+
+    def __visit(self,cell):
+        """
+        Method that removes a cell from the pool of unvisited cells, by moving the last cell in its place.
+        :param cell: int - row * width + col
+        """
+        position = self.__positions[cell]
+        if position < 0:
+            return
+        self.__poolSize -= 1
+        last = self.__pool[self.__poolSize]
+        if isinstance(self.__pool,IdentityMap):
+            self.__pool.pop(self.__poolSize,None)
+        else:
+            self.__pool.pop()
+        if last != cell:
+            self.__pool[position] = last
+            self.__positions[last] = position
+        self.__positions[cell] = -1
+
+    def __getRandomUnvisitedCell(self):
+        """
+        Method that that gets a random unvisited cell by the computer.
+        :return: int - the index of the cell
+        """
+        return self.__pool[self.__random.randrange(self.__poolSize)]
+
+    def nextMove(self):
+        """
+        Method that gets the next computer move/hit.
+        :return: hitPos - tuple that contains the coordinates of the cell to be hit
+        """
+        self.__bookNode, cell = _bookMove(self.__bookNode,self.__width,self.__height,self.__planesCount)
+        while cell is None and self.__neighboursQueue:
+            queued = self.__neighboursQueue.popleft()
+            self.__queued.discard(queued)
+            if self.__positions[queued] >= 0:
+                cell = queued
+                break
+        if cell is None:
+            cell = self.__getRandomUnvisitedCell()
+        self.__visit(cell)
+        return divmod(cell,self.__width)
+
+    def __goodCell(self,row,col):
+        """
+        Method checks if the cell's coordinates are inside the matrix, unvisited and not queued already.
+        :param row: int - the cell row
+        :param col: int - the cell column
+        :return: True/False
+        """
+        if not (0 <= row < self.__height and 0 <= col < self.__width):
+            return False
+        cell = row * self.__width + col
+        return self.__positions[cell] >= 0 and cell not in self.__queued
+
+    def __enqueueNeighbours(self,row,col):
+        """
+        Method that adds the neighbours of a cell in the queue used by the computer
+        to hit cells near a successful shot.
+        :param row: int - the cell row
+        :param col: int - the cell column
+        """
+        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        self.__random.shuffle(directions)
+        for d in directions:
+            if self.__goodCell(row+d[0],col+d[1]):
+                cell = (row+d[0]) * self.__width + col+d[1]
+                self.__neighboursQueue.append(cell)
+                self.__queued.add(cell)
+
+    def registerResult(self,hitPos,result,destroyedCells=()):
+        """
+        Method that updates the computer's knowledge with the result of its last hit.
+        The destroyed cells are marked as visited, so they won't be visited again.
+        :param hitPos: tuple with the hit coordinates
+        :param result: str - cabin/hit/miss
+        :param destroyedCells: the cells of the destroyed plane, in case of a cabin hit
+        """
+        cell = hitPos[0] * self.__width + hitPos[1]
+        self.__visit(cell)  # already visited unless the hit was not chosen here
+        self.__bookNode = _bookNext(self.__bookNode,cell,self.__width,self.__height,self.__planesCount,result)
+        if result == 'cabin':
+            for c in destroyedCells:
+                self.__visit(c[0] * self.__width + c[1])
+            self.__neighboursQueue.clear()
+            self.__queued.clear()
+        elif result == 'hit':
+            self.__enqueueNeighbours(hitPos[0],hitPos[1])
+
+    def snapshot(self):
+        """
+        Method that encodes the state of the strategy: the pool in its current order, the queue and the book node.
+        On the huge boards the pool is the visited cells set and the cells moved by the swap-removes.
+        The strategy is not changed, so it makes the same moves as a strategy restored from the snapshot.
+        :return: bytes
+        """
+        cellsCount = self.__width * self.__height
+        if isinstance(self.__positions,IdentityMap):
+            visited = {cell for cell, position in self.__positions.items() if position < 0}
+            moved = [value for position, cell in self.__pool.items() if position < self.__poolSize
+                     for value in (position, cell)]
+            pool = packMask(visited,cellsCount) + packCells(moved,cellsCount)
+        else:
+            pool = packCells(self.__pool,cellsCount)
+        return pool + packCells(list(self.__neighboursQueue),cellsCount) + BOOK_NODE_FORMAT.pack(self.__bookNode)
+
+    def restore(self,data,offset=0):
+        """
+        Method that loads a state encoded by snapshot.
+        :param data: bytes
+        :param offset: int - the position of the state in data
+        :return: int - the position after the state
+        """
+        cellsCount = self.__width * self.__height
+        if cellsCount > SPARSE_LIMIT:
+            visited, offset = unpackMask(data,offset,cellsCount)
+            moved, offset = unpackCells(data,offset,cellsCount)
+            self.__pool = IdentityMap()
+            self.__positions = IdentityMap.fromkeys(visited,-1)
+            for position, cell in zip(moved[::2],moved[1::2]):
+                self.__pool[position] = cell
+                self.__positions[cell] = position
+            self.__poolSize = cellsCount - len(visited)
+        else:
+            pool, offset = unpackCells(data,offset,cellsCount)
+            typecode = self.__pool.typecode
+            self.__pool = array(typecode,pool)
+            self.__poolSize = len(self.__pool)
+            self.__positions = array(typecode,[-1]) * cellsCount
+            for position, cell in enumerate(self.__pool):
+                self.__positions[cell] = position
+        queue, offset = unpackCells(data,offset,cellsCount)
+        self.__bookNode, = BOOK_NODE_FORMAT.unpack_from(data,offset)
+        self.__neighboursQueue = deque(queue)
+        self.__queued = set(queue)
+        return offset + BOOK_NODE_FORMAT.size
+
+
+class DensityStrategy:
+    __slots__ = ('__width', '__height', '__random', '__table', '__cellPlacements', '__cabinPlacements', '__alive',
+                 '__unvisited', '__hits', '__planesCount', '__bookNode')
+
+    def __init__(self,width,height,rng,planesCount=2,shape='classic'):
+        """
+        Computer player that keeps the set of enemy plane placements still consistent with its shots
+        and hits the cell most likely to be a plane part, or the most likely cabin once it has hits.
+        The scoring uses the placement table's cell-by-placement bit matrix: the score of a cell
+        is the popcount of its row masked with the consistent placements.
+        The first shots come from the opening book, while the game follows one of its lines.
+        :param width: int - the board width
+        :param height: int - the board height
+        :param rng: random.Random object, used to break ties
+        :param planesCount: int - the number of enemy planes
+        :param shape: str - the name of the enemy plane shape
+        """
+        self.__width = width
+        self.__height = height
+        self.__random = rng
+        self.__planesCount = planesCount
+        self.__bookNode = BOOK_START if shape == 'classic' else OUT_OF_BOOK  # the book is made for the classic planes
+        self.__table = getPlacementTable(width,height,shape)
+        if self.__table is None:
+            raise ValueError('The density AI needs a smaller board!')
+        self.__cellPlacements = self.__table.getCellPlacements()
+        self.__cabinPlacements = self.__table.getCabinPlacements()
+        self.__alive = (1 << len(self.__table.getPlacements())) - 1
+        self.__unvisited = 0  # bitmask of the unvisited cells that some placement covers
+        for i in range(width * height):
+            if self.__cellPlacements[i]:
+                self.__unvisited |= 1 << i
+        self.__hits = 0
+
+    def __bestCells(self,rows,candidates):
+        """
+        Method that gets the unvisited cells with the highest score.
+        :param rows: list of int - the placement masks of every cell
+        :param candidates: int - mask of the placements taken into account
+        :return: (int - the best score, list of int - the cell indices having it)
+        """
+        best = 0
+        bestCells = []
+        unvisited = self.__unvisited
+        while unvisited:
+            low = unvisited & -unvisited
+            unvisited ^= low
+            i = low.bit_length() - 1
+            score = (rows[i] & candidates).bit_count()
+            if score > best:
+                best = score
+                bestCells = [i]
+            elif score == best:
+                bestCells.append(i)
+        return best, bestCells
+
+    def nextMove(self):
+        """
+        Method that gets the next computer move/hit.
+        :return: hitPos - tuple that contains the coordinates of the cell to be hit
+        """
+        self.__bookNode, index = _bookMove(self.__bookNode,self.__width,self.__height,self.__planesCount)
+        if index is not None:
+            self.__unvisited &= ~(1 << index)
+            return divmod(index,self.__width)
+        candidates = self.__alive
+        if self.__hits:
+            covering = 0
+            hits = self.__hits
+            while hits:
+                low = hits & -hits
+                hits ^= low
+                covering |= self.__cellPlacements[low.bit_length() - 1]
+            candidates &= covering
+            best, bestCells = self.__bestCells(self.__cabinPlacements,candidates)
+            if not best:
+                best, bestCells = self.__bestCells(self.__cellPlacements,candidates)
+        else:
+            best, bestCells = self.__bestCells(self.__cellPlacements,candidates)
+        if not best:
+            bestCells = [i for i in range(self.__unvisited.bit_length()) if self.__unvisited >> i & 1]
+        index = self.__random.choice(bestCells)
+        self.__unvisited &= ~(1 << index)
+        return divmod(index,self.__width)
+
+    def registerResult(self,hitPos,result,destroyedCells=()):
+        """
+        Method that removes the placements contradicted by the result of the last hit.
+        :param hitPos: tuple with the hit coordinates
+        :param result: str - cabin/hit/miss
+        :param destroyedCells: the cells of the destroyed plane, in case of a cabin hit
+        """
+        index = hitPos[0] * self.__width + hitPos[1]
+        self.__unvisited &= ~(1 << index)  # already visited unless the hit was not chosen here
+        self.__bookNode = _bookNext(self.__bookNode,index,self.__width,self.__height,self.__planesCount,result)
+        if result == 'miss':
+            self.__alive &= ~self.__cellPlacements[index]
+        elif result == 'hit':
+            self.__alive &= ~self.__cabinPlacements[index]
+            self.__hits |= 1 << index
+        else:
+            for c in destroyedCells:
+                cell = c[0] * self.__width + c[1]
+                self.__alive &= ~self.__cellPlacements[cell]
+                self.__hits &= ~(1 << cell)
+                self.__unvisited &= ~(1 << cell)
+
+    def snapshot(self):
+        """
+        Method that encodes the state of the strategy: the consistent placements, the unvisited cells, the hits
+        and the book node.
+        :return: bytes
+        """
+        cellsCount = len(self.__cellPlacements)
+        placementsCount = len(self.__table.getPlacements())
+        return (self.__alive.to_bytes((placementsCount + 7) // 8,'little') + packMask(self.__unvisited,cellsCount)
+                + packMask(self.__hits,cellsCount) + BOOK_NODE_FORMAT.pack(self.__bookNode))
+
+    def restore(self,data,offset=0):
+        """
+        Method that loads a state encoded by snapshot.
+        :param data: bytes
+        :param offset: int - the position of the state in data
+        :return: int - the position after the state
+        """
+        cellsCount = len(self.__cellPlacements)
+        size = (len(self.__table.getPlacements()) + 7) // 8
+        if offset + size > len(data):
+            raise struct.error('unpack requires {} more bytes'.format(offset + size - len(data)))
+        self.__alive = int.from_bytes(data[offset:offset + size],'little')
+        self.__unvisited, offset = unpackMask(data,offset + size,cellsCount)
+        self.__hits, offset = unpackMask(data,offset,cellsCount)
+        self.__bookNode, = BOOK_NODE_FORMAT.unpack_from(data,offset)
+        return offset + BOOK_NODE_FORMAT.size
+
+
+class MonteCarloStrategy:
+    __slots__ = ('__width', '__height', '__random', '__table', '__cellPlacements', '__cabinPlacements', '__masks',
+                 '__cabins', '__alive', '__unvisited', '__hits', '__destroyed', '__planesCount', '__budget',
+                 '__bookNode', '__clock')
+
+    def __init__(self,width,height,rng,planesCount=2,budget=0.01,shape='classic',clock=time.perf_counter):
+        """
+        Anytime computer player: until its time budget runs out, it draws configurations of the enemy planes
+        consistent with its shots, and it hits the cell most often covered by them, or the most frequent cabin
+        once it has hits. The draws are uniform: every alive plane is drawn among the consistent placements and
+        the sets that overlap or leave a hit uncovered are rejected. Without any accepted draw it falls back on
+        the placement density. The moves depend on the timing, so the games are not reproducible.
+        The first shots come from the opening book, while the game follows one of its lines.
+        :param width: int - the board width
+        :param height: int - the board height
+        :param rng: random.Random object
+        :param planesCount: int - the number of enemy planes
+        :param budget: float - the time for a move, in seconds
+        :param shape: str - the name of the enemy plane shape
+        :param clock: function that gets the time in seconds, the deadlines are kept on it
+        """
+        self.__width = width
+        self.__height = height
+        self.__random = rng
+        self.__planesCount = planesCount
+        self.__budget = budget
+        self.__clock = clock
+        self.__bookNode = BOOK_START if shape == 'classic' else OUT_OF_BOOK  # the book is made for the classic planes
+        self.__table = getPlacementTable(width,height,shape)
+        if self.__table is None:
+            raise ValueError('The Monte Carlo AI needs a smaller board!')
+        self.__cellPlacements = self.__table.getCellPlacements()
+        self.__cabinPlacements = self.__table.getCabinPlacements()
+        self.__masks = [placement.mask for placement in self.__table.getPlacements()]
+        self.__cabins = [1 << placement.cabin[0] * width + placement.cabin[1]
+                         for placement in self.__table.getPlacements()]
+        self.__alive = (1 << len(self.__masks)) - 1
+        self.__unvisited = 0  # bitmask of the unvisited cells that some placement covers
+        for i in range(width * height):
+            if self.__cellPlacements[i]:
+                self.__unvisited |= 1 << i
+        self.__hits = 0
+        self.__destroyed = 0
+
+    def getBudget(self):
+        """
+        Getter for the time of a move.
+        :return: float - seconds
+        """
+        return self.__budget
+
+    def setBudget(self,budget):
+        """
+        Setter for the time of a move.
+        :param budget: float - seconds
+        """
+        self.__budget = budget
+
+    def __sample(self,deadline):
+        """
+        Method that counts, for every unvisited cell, the draws that cover it (or that have a cabin on it).
+        :param deadline: float - the clock time when the drawing stops
+        :return: list of int - the counts of the cells
+        """
+        counts = [0] * (self.__width * self.__height)
+        alive = self.__alive
+        candidates = []
+        while alive:
+            low = alive & -alive
+            alive ^= low
+            candidates.append(low.bit_length() - 1)
+        planes = self.__planesCount - self.__destroyed
+        if not candidates or planes <= 0:
+            return counts
+        hits = self.__hits
+        targets = self.__cabins if hits else self.__masks
+        unvisited = self.__unvisited
+        masks = self.__masks
+        # the draws of a move come from a generator seeded by the game's one, the C Mersenne Twister is faster
+        choice = random.Random(self.__random.getrandbits(64)).choice
+        clock = self.__clock
+        attempts = 0
+        while True:
+            attempts += 1
+            if not attempts & 3 and clock() >= deadline:
+                return counts
+            occupied = 0
+            chosen = []
+            for i in range(planes):
+                placement = choice(candidates)
+                if occupied & masks[placement]:
+                    break
+                occupied |= masks[placement]
+                chosen.append(placement)
+            else:
+                if occupied & hits == hits:
+                    for placement in chosen:
+                        mask = targets[placement] & unvisited
+                        while mask:
+                            low = mask & -mask
+                            mask ^= low
+                            counts[low.bit_length() - 1] += 1
+
+    def __densityCell(self):
+        """
+        Method that gets the unvisited cell covered by the most consistent placements, or having the most cabins
+        once there are hits.
+        :return: int - the index of the cell
+        """
+        rows = self.__cabinPlacements if self.__hits else self.__cellPlacements
+        best, bestCell = -1, None
+        unvisited = self.__unvisited
+        while unvisited:
+            low = unvisited & -unvisited
+            unvisited ^= low
+            i = low.bit_length() - 1
+            score = (rows[i] & self.__alive).bit_count()
+            if score > best:
+                best, bestCell = score, i
+        return bestCell
+
+    def nextMove(self):
+        """
+        Method that gets the next computer move/hit, within the time budget.
+        :return: hitPos - tuple that contains the coordinates of the cell to be hit
+        """
+        self.__bookNode, index = _bookMove(self.__bookNode,self.__width,self.__height,self.__planesCount)
+        if index is None:
+            # the rest of the budget is left for the scoring and for the caller
+            counts = self.__sample(self.__clock() + self.__budget * BUDGET_SHARE)
+            best = max(counts)
+            index = counts.index(best) if best else self.__densityCell()
+        self.__unvisited &= ~(1 << index)
+        return divmod(index,self.__width)
+
+    def registerResult(self,hitPos,result,destroyedCells=()):
+        """
+        Method that removes the placements contradicted by the result of the last hit.
+        :param hitPos: tuple with the hit coordinates
+        :param result: str - cabin/hit/miss
+        :param destroyedCells: the cells of the destroyed plane, in case of a cabin hit
+        """
+        index = hitPos[0] * self.__width + hitPos[1]
+        self.__unvisited &= ~(1 << index)  # already visited unless the hit was not chosen here
+        self.__bookNode = _bookNext(self.__bookNode,index,self.__width,self.__height,self.__planesCount,result)
+        if result == 'miss':
+            self.__alive &= ~self.__cellPlacements[index]
+        elif result == 'hit':
+            self.__alive &= ~self.__cabinPlacements[index]
+            self.__hits |= 1 << index
+        else:
+            self.__destroyed += 1
+            for c in destroyedCells:
+                cell = c[0] * self.__width + c[1]
+                self.__alive &= ~self.__cellPlacements[cell]
+                self.__hits &= ~(1 << cell)
+                self.__unvisited &= ~(1 << cell)
+
+    def snapshot(self):
+        """
+        Method that encodes the state of the strategy: the consistent placements, the unvisited cells, the hits,
+        the number of destroyed planes and the book node. The budget belongs to the game.
+        :return: bytes
+        """
+        cellsCount = len(self.__cellPlacements)
+        return (self.__alive.to_bytes((len(self.__masks) + 7) // 8,'little') + packMask(self.__unvisited,cellsCount)
+                + packMask(self.__hits,cellsCount) + MONTE_CARLO_STATE.pack(self.__destroyed,self.__bookNode))
+
+    def restore(self,data,offset=0):
+        """
+        Method that loads a state encoded by snapshot.
+        :param data: bytes
+        :param offset: int - the position of the state in data
+        :return: int - the position after the state
+        """
+        cellsCount = len(self.__cellPlacements)
+        size = (len(self.__masks) + 7) // 8
+        if offset + size > len(data):
+            raise struct.error('unpack requires {} more bytes'.format(offset + size - len(data)))
+        self.__alive = int.from_bytes(data[offset:offset + size],'little')
+        self.__unvisited, offset = unpackMask(data,offset + size,cellsCount)
+        self.__hits, offset = unpackMask(data,offset,cellsCount)
+        self.__destroyed, self.__bookNode = MONTE_CARLO_STATE.unpack_from(data,offset)
+        return offset + MONTE_CARLO_STATE.size
+
+
+AI_MODES = {'classic': ClassicStrategy, 'density': DensityStrategy, 'montecarlo': MonteCarloStrategy}
@@ -1,23 +1,414 @@
-from copy import deepcopy
+import struct
+
+SPARSE_LIMIT = 1 << 16  # boards with more cells keep their state in sets of cell indices
+
+
+def packMask(mask,cellsCount):
+    """
+    Function that encodes a board mask into bytes: the bitmask in little endian order,
+    or the number of cells followed by the cell indices for the sparse boards.
+    :param mask: int - bitmask (set of cell indices for sparse boards)
+    :param cellsCount: int - the number of cells of the board
+    :return: bytes
+    """
+    if cellsCount > SPARSE_LIMIT:
+        cells = sorted(mask)
+        return struct.pack('<I{}I'.format(len(cells)),len(cells),*cells)
+    return mask.to_bytes((cellsCount + 7) // 8,'little')
+
+
+def unpackMask(data,offset,cellsCount):
+    """
+    Function that decodes a board mask encoded by packMask.
+    :param data: bytes
+    :param offset: int - the position of the mask in data
+    :param cellsCount: int - the number of cells of the board
+    :return: (the mask in the format of the board, int - the position after the mask)
+    """
+    if cellsCount > SPARSE_LIMIT:
+        count, = struct.unpack_from('<I',data,offset)
+        return set(struct.unpack_from('<{}I'.format(count),data,offset + 4)), offset + 4 + 4 * count
+    size = (cellsCount + 7) // 8
+    if offset + size > len(data):
+        raise struct.error('unpack requires {} more bytes'.format(offset + size - len(data)))
+    return int.from_bytes(data[offset:offset + size],'little'), offset + size
+
+
+def cellFormat(cellsCount):
+    """
+    Function that gets the struct format of a cell index, or of a count of cells, of a board.
+    The format leaves two more bits free, for a plane orientation.
+    :param cellsCount: int - the number of cells of the board
+    :return: str - 'B' for the boards with up to 64 cells, 'H' for up to 2 ** 14 cells, 'I' for the others
+    """
+    if cellsCount <= 1 << 6:
+        return 'B'
+    return 'H' if cellsCount <= 1 << 14 else 'I'
+
+
+def packCells(cells,cellsCount):
+    """
+    Function that encodes a list of cell indices: their number followed by the indices.
+    :param cells: list of int - the cell indices, or other values that fit in the cell format of the board
+    :param cellsCount: int - the number of cells of the board
+    :return: bytes
+    """
+    return struct.pack('<{}{}{}'.format(cellFormat(cellsCount),len(cells),cellFormat(cellsCount)),len(cells),*cells)
+
+
+def unpackCells(data,offset,cellsCount):
+    """
+    Function that decodes a list of cell indices encoded by packCells.
+    :param data: bytes
+    :param offset: int - the position of the list in data
+    :param cellsCount: int - the number of cells of the board
+    :return: (tuple of int, int - the position after the list)
+    """
+    fmt = cellFormat(cellsCount)
+    count, = struct.unpack_from('<' + fmt,data,offset)
+    offset += struct.calcsize(fmt)
+    return struct.unpack_from('<{}{}'.format(count,fmt),data,offset), offset + count * struct.calcsize(fmt)
+
+
+def maskCells(mask):
+    """
+    Generator of the cell indices of a board mask, in increasing order.
+    :param mask: int - bitmask (set of cell indices for sparse boards)
+    :return: generator of int - row * width + col
+    """
+    if not isinstance(mask,int):
+        yield from sorted(mask)
+        return
+    while mask:
+        low = mask & -mask
+        mask ^= low
+        yield low.bit_length() - 1
+
 
 class Board:
+    __slots__ = ('__width', '__height', '__fillEl', '__sparse', '__occupied', '__hit', '__miss', '__destroyed',
+                 '__version')
+
     def __init__(self,width,height,fillEl=' '):
         """
         Board object constructor.
+        The board state is kept in integer bitmasks, one bit per cell: bit (row * width + col).
+        Boards with more than SPARSE_LIMIT cells use sets of cell indices instead, so the memory and the cost
+        of a shot depend only on the cells that are used. The masks of such boards are sets as well.
         :param width: int - positive number
         :param height: int - positive number
         :param fillEl: one element to fill the board cells
         """
-        self.__matrix = []
-        for i in range(height):
-            self.__matrix += [[fillEl]*width]
+        self.__width = width
+        self.__height = height
+        self.__fillEl = fillEl
+        self.__sparse = width * height > SPARSE_LIMIT
+        self.__version = 0  # incremented by every change of the board
+        if self.__sparse:
+            self.__occupied = set()
+            self.__hit = set()
+            self.__miss = set()
+            self.__destroyed = set()
+        else:
+            self.__occupied = 0
+            self.__hit = 0
+            self.__miss = 0
+            self.__destroyed = 0
+
+    def getWidth(self):
+        """
+        Getter for the board width.
+        :return: int - the number of columns
+        """
+        return self.__width
+
+    def getHeight(self):
+        """
+        Getter for the board height.
+        :return: int - the number of rows
+        """
+        return self.__height
+
+    def getVersion(self):
+        """
+        Getter for the version of the board, it changes whenever the board changes.
+        :return: int
+        """
+        return self.__version
+
+    def isSparse(self):
+        """
+        Method that checks if the board keeps its state in sets instead of bitmasks.
+        :return: True/False
+        """
+        return self.__sparse
+
+    def cellBit(self,row,col):
+        """
+        Method that gets the bit corresponding to a cell of the board.
+        :param row: int - the cell row
+        :param col: int - the cell column
+        :return: int - a mask with only the cell's bit set (frozenset with the cell index for sparse boards)
+        """
+        if self.__sparse:
+            return frozenset((row * self.__width + col,))
+        return 1 << (row * self.__width + col)
+
+    def cellsMask(self,cells):
+        """
+        Method that gets the mask of a group of cells.
+        :param cells: iterable of tuples with the coordinates of the cells
+        :return: int - a mask with the bits of all the cells set (frozenset of cell indices for sparse boards)
+        """
+        if self.__sparse:
+            return frozenset(cell[0] * self.__width + cell[1] for cell in cells)
+        mask = 0
+        for cell in cells:
+            mask |= 1 << (cell[0] * self.__width + cell[1])
+        return mask
+
+    def getOccupiedMask(self):
+        """
+        Getter for the mask of the cells covered by planes.
+        :return: int - bitmask (set of cell indices for sparse boards)
+        """
+        return self.__occupied
+
+    def getHitMask(self):
+        """
+        Getter for the mask of the plane cells that were shot.
+        :return: int - bitmask (set of cell indices for sparse boards)
+        """
+        return self.__hit
+
+    def getMissMask(self):
+        """
+        Getter for the mask of the empty cells that were shot.
+        :return: int - bitmask (set of cell indices for sparse boards)
+        """
+        return self.__miss
 
-    def getMatrix(self):
+    def getDestroyedMask(self):
         """
-        Getter for the board matrix
+        Getter for the mask of the cells of the destroyed planes.
+        :return: int - bitmask (set of cell indices for sparse boards)
+        """
+        return self.__destroyed
+
+    def overlaps(self,mask):
+        """
+        Method that checks if a footprint overlaps the cells already taken on the board.
+        :param mask: int - the footprint mask (frozenset of cell indices for sparse boards)
+        :return: True/False
+        """
+        return bool(self.__occupied & mask)
+
+    def addMask(self,mask):
+        """
+        Method that marks the cells of a footprint as occupied.
+        :param mask: int - the footprint mask
+        """
+        self.__occupied |= mask
+        self.__version += 1
+
+    def shoot(self,row,col):
+        """
+        Method that records a shot on the board.
+        :param row: int - the cell row
+        :param col: int - the cell column
+        :return: True if an untouched plane cell was hit, False otherwise
+        """
+        if self.__sparse:
+            cell = row * self.__width + col
+            if cell in self.__hit or cell in self.__destroyed:
+                return False
+            self.__version += 1
+            if cell in self.__occupied:
+                self.__hit.add(cell)
+                return True
+            self.__miss.add(cell)
+            return False
+        bit = 1 << (row * self.__width + col)
+        if (self.__hit | self.__destroyed) & bit:
+            return False
+        self.__version += 1
+        if self.__occupied & bit:
+            self.__hit |= bit
+            return True
+        self.__miss |= bit
+        return False
+
+    def isShot(self,row,col):
+        """
+        Method that checks if a cell was already shot or destroyed.
+        :param row: int - the cell row
+        :param col: int - the cell column
+        :return: True/False
+        """
+        cell = row * self.__width + col
+        if self.__sparse:
+            return cell in self.__hit or cell in self.__miss or cell in self.__destroyed
+        return bool((self.__hit | self.__miss | self.__destroyed) >> cell & 1)
+
+    def setShots(self,hitMask,missMask):
+        """
+        Method that replaces the shots recorded on the board, used to restore a saved board.
+        The destroyed cells are cleared, the destroyed planes are marked again afterwards.
+        :param hitMask: the mask of the plane cells that were shot, in the format of the board
+        :param missMask: the mask of the empty cells that were shot, in the format of the board
+        """
+        self.__hit = hitMask
+        self.__miss = missMask
+        self.__destroyed = set() if self.__sparse else 0
+        self.__version += 1
+
+    def markDestroyed(self,mask):
+        """
+        Method that marks the cells of a footprint as destroyed.
+        :param mask: int - the footprint mask
+        """
+        self.__destroyed |= mask
+        self.__version += 1
+
+    def isDestroyed(self,mask):
+        """
+        Method that checks if all the cells of a footprint are destroyed.
+        :param mask: int - the footprint mask
+        :return: True/False
+        """
+        if self.__sparse:
+            return self.__destroyed.issuperset(mask)
+        return mask & ~self.__destroyed == 0
+
+    def getRow(self,row,showPlanes=True):
+        """
+        Getter for one row of the board matrix, in the format of getMatrix.
+        :param row: int - the row index
+        :param showPlanes: True/False - whether the untouched plane cells are shown
+        :return: tuple - the symbols of the row cells
+        """
+        start = row * self.__width
+        if self.__sparse:
+            symbols = []
+            for cell in range(start,start + self.__width):
+                if cell in self.__hit or cell in self.__destroyed:
+                    symbols.append('X')
+                elif cell in self.__miss:
+                    symbols.append(0)
+                elif showPlanes and cell in self.__occupied:
+                    symbols.append('#')
+                else:
+                    symbols.append(self.__fillEl)
+            return tuple(symbols)
+        rowMask = (1 << self.__width) - 1
+        struck = (self.__hit | self.__destroyed) >> start & rowMask
+        miss = self.__miss >> start & rowMask
+        planes = self.__occupied >> start & rowMask if showPlanes else 0
+        symbols = []
+        bit = 1
+        for j in range(self.__width):
+            if struck & bit:
+                symbols.append('X')
+            elif miss & bit:
+                symbols.append(0)
+            elif planes & bit:
+                symbols.append('#')
+            else:
+                symbols.append(self.__fillEl)
+            bit <<= 1
+        return tuple(symbols)
+
+    def getMatrix(self,showPlanes=True):
+        """
+        Getter for the board matrix, built from the bitmasks.
+        Hit and destroyed cells are 'X', missed cells are 0 and the untouched plane cells are '#'.
+        :param showPlanes: True/False - whether the untouched plane cells are shown
+        :return: list of lists - the board matrix
+        """
+        if self.__sparse:
+            matrix = [[self.__fillEl] * self.__width for i in range(self.__height)]
+            for cells, symbol in ((self.__occupied if showPlanes else (), '#'), (self.__miss, 0),
+                                  (self.__hit, 'X'), (self.__destroyed, 'X')):
+                for cell in cells:
+                    matrix[cell // self.__width][cell % self.__width] = symbol
+            return matrix
+        struck = self.__hit | self.__destroyed
+        planes = self.__occupied if showPlanes else 0
+        matrix = []
+        bit = 1
+        for i in range(self.__height):
+            row = []
+            for j in range(self.__width):
+                if struck & bit:
+                    row.append('X')
+                elif self.__miss & bit:
+                    row.append(0)
+                elif planes & bit:
+                    row.append('#')
+                else:
+                    row.append(self.__fillEl)
+                bit <<= 1
+            matrix.append(row)
+        return matrix
+
+
+class BoardView:
+    __slots__ = ('__board', '__showPlanes', '__cache')
+
+    def __init__(self,board,showPlanes=True):
+        """
+        Read-only view of a board, indexed like the board matrix: view[row][col].
+        Nothing is copied upfront: the rows are built as tuples when they are read, at most once per board version,
+        so the readers can't change the game and can share the view, on other threads as well.
+        :param board: Board object
+        :param showPlanes: True/False - whether the untouched plane cells are shown
+        """
+        self.__board = board
+        self.__showPlanes = showPlanes
+        # (board version, rows built for it): replaced as a whole, so a reader never mixes two versions
+        self.__cache = (None, {})
+
+    def getVersion(self):
+        """
+        Getter for the version of the board, it changes whenever the board changes.
+        :return: int
+        """
+        return self.__board.getVersion()
+
+    def copyMatrix(self):
+        """
+        Method that gets a copy of the matrix, that the caller is free to change.
         :return: list of lists - the board matrix
         """
-        return deepcopy(self.__matrix)
+        return self.__board.getMatrix(self.__showPlanes)
+
+    def __len__(self):
+        return self.__board.getHeight()
+
+    def __getitem__(self,row):
+        if not 0 <= row < self.__board.getHeight():
+            raise IndexError('Invalid row!')
+        version = self.__board.getVersion()
+        cache = self.__cache
+        if cache[0] != version:
+            cache = (version, {})
+            self.__cache = cache
+        line = cache[1].get(row)
+        if line is None:
+            line = self.__board.getRow(row,self.__showPlanes)
+            if self.__board.getVersion() == version:  # a row built while the board changed is not kept
+                cache[1][row] = line
+        return line
 
+    def __iter__(self):
+        for row in range(self.__board.getHeight()):
+            yield self[row]
 
+    def __eq__(self,other):
+        try:
+            return len(self) == len(other) and all(tuple(a) == tuple(b) for a, b in zip(self,other))
+        except TypeError:
+            return NotImplemented
 
+    def __repr__(self):
+        return 'BoardView({})'.format(self.copyMatrix())
@@ -0,0 +1,122 @@
+from array import array
+from domain.board import Board
+
+
+class Fleet:
+    __slots__ = ('__board', '__width', '__planes', '__masks', '__cabins', '__remaining', '__cells', '__alivePlanes')
+
+    def __init__(self,width,height):
+        """
+        The planes of one player together with their board.
+        Every plane cell is indexed by its position, so a shot is resolved in constant time
+        no matter how many planes are on the board.
+        The index is an array of 2 bytes per cell holding the plane id + 1 (0 for the empty cells),
+        or a dictionary of the plane cells only for the sparse boards.
+        :param width: int - the board width
+        :param height: int - the board height
+        """
+        self.__board = Board(width,height)
+        self.__width = width
+        self.__planes = []
+        self.__masks = []
+        self.__remaining = []  # the number of untouched cells of every plane, 0 for the destroyed planes
+        self.__cabins = []  # the cabin cell of every plane: row * width + col
+        if self.__board.isSparse():
+            self.__cells = {}  # row * width + col -> plane id + 1
+        else:
+            self.__cells = array('H',bytes(2 * width * height))
+        self.__alivePlanes = 0
+
+    def getBoard(self):
+        """
+        Getter for the board of the fleet.
+        :return: Board object
+        """
+        return self.__board
+
+    def getPlanes(self):
+        """
+        Getter for the planes of the fleet, the index of a plane in the list is its id.
+        :return: list of Plane objects
+        """
+        return self.__planes
+
+    def getAlivePlanesCount(self):
+        """
+        Getter for the number of planes which are not destroyed.
+        :return: int
+        """
+        return self.__alivePlanes
+
+    def getRemainingCells(self,planeId):
+        """
+        Getter for the number of untouched cells of a plane.
+        :param planeId: int - the plane id
+        :return: int - 0 if the plane is destroyed
+        """
+        return self.__remaining[planeId]
+
+    def addPlane(self,plane,mask):
+        """
+        Method that adds a validated plane to the fleet.
+        :param plane: Plane object
+        :param mask: the footprint mask of the plane, in the format of the board
+        """
+        planeId = len(self.__planes)
+        cabin = plane.getCabinPosition()
+        cells = plane.getPlaneCells()
+        for c in cells:
+            self.__cells[c[0] * self.__width + c[1]] = planeId + 1
+        self.__planes.append(plane)
+        self.__cabins.append(cabin[0] * self.__width + cabin[1])
+        self.__masks.append(mask)
+        self.__remaining.append(len(cells))
+        self.__alivePlanes += 1
+        self.__board.addMask(mask)
+
+    def shoot(self,row,col):
+        """
+        Method that resolves a shot and marks its result on the board.
+        Hitting the cabin of a plane destroys the whole plane.
+        :param row: int - the cell row
+        :param col: int - the cell column
+        :return: str - cabin/hit/miss, and the destroyed plane in case of a cabin hit (None otherwise)
+        """
+        cell = row * self.__width + col
+        if self.__board.isSparse():
+            planeId = self.__cells.get(cell,0) - 1
+        else:
+            planeId = self.__cells[cell] - 1
+        if planeId < 0:
+            self.__board.shoot(row,col)
+            return 'miss', None
+        if not self.__remaining[planeId]:
+            return 'miss', None
+        if self.__cabins[planeId] == cell:
+            self.__board.markDestroyed(self.__masks[planeId])
+            self.__remaining[planeId] = 0
+            self.__alivePlanes -= 1
+            return 'cabin', self.__planes[planeId]
+        if self.__board.shoot(row,col):
+            self.__remaining[planeId] -= 1
+            return 'hit', None
+        return 'miss', None
+
+    def setShots(self,hitMask,missMask,destroyed):
+        """
+        Method that restores the shots of a saved fleet, once its planes are added.
+        :param hitMask: the mask of the plane cells that were shot, in the format of the board
+        :param missMask: the mask of the empty cells that were shot, in the format of the board
+        :param destroyed: int - bitmask of the ids of the destroyed planes
+        """
+        self.__board.setShots(hitMask,missMask)
+        self.__alivePlanes = len(self.__planes)
+        for planeId, mask in enumerate(self.__masks):
+            if destroyed >> planeId & 1:
+                self.__board.markDestroyed(mask)
+                self.__remaining[planeId] = 0
+                self.__alivePlanes -= 1
+            elif self.__board.isSparse():
+                self.__remaining[planeId] = len(mask) - len(mask & hitMask)
+            else:
+                self.__remaining[planeId] = mask.bit_count() - (mask & hitMask).bit_count()
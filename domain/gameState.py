@@ -0,0 +1,206 @@
+from domain.board import SPARSE_LIMIT
+
+BOARDS = ('player', 'computer')  # the owners of the boards, the computer shoots on the player's board
+RESULTS = ('miss', 'hit', 'cabin')
+
+
+class GameLayout:
+    __slots__ = ('__width', '__height', '__planes', '__cabins', '__masks')
+
+    def __init__(self,width,height,playerPlanes,computerPlanes):
+        """
+        The planes of both players, shared by all the states of a game: they never change once the shots started.
+        :param width: int - the board width
+        :param height: int - the board height
+        :param playerPlanes: list of Plane objects
+        :param computerPlanes: list of Plane objects
+        """
+        self.__width = width
+        self.__height = height
+        self.__planes = (tuple(playerPlanes),tuple(computerPlanes))
+        # the cabin cell and the footprint bitmask of every plane
+        self.__cabins = tuple(tuple(p.getCabinPosition()[0] * width + p.getCabinPosition()[1] for p in planes)
+                              for planes in self.__planes)
+        self.__masks = tuple(tuple(p.getPlaneMask(width) for p in planes) for planes in self.__planes)
+
+    def getWidth(self):
+        """
+        Getter for the board width.
+        :return: int - the number of columns
+        """
+        return self.__width
+
+    def getHeight(self):
+        """
+        Getter for the board height.
+        :return: int - the number of rows
+        """
+        return self.__height
+
+    def getPlanes(self,side):
+        """
+        Getter for the planes of a board.
+        :param side: int - the index of the board owner in BOARDS
+        :return: tuple of Plane objects, the index of a plane is its id
+        """
+        return self.__planes[side]
+
+    def getPlaneAt(self,side,cell):
+        """
+        Getter for the plane covering a cell.
+        :param side: int - the index of the board owner in BOARDS
+        :param cell: int - row * width + col
+        :return: int - the plane id, -1 for an empty cell
+        """
+        for planeId, mask in enumerate(self.__masks[side]):
+            if mask >> cell & 1:
+                return planeId
+        return -1
+
+    def getCabin(self,side,planeId):
+        """
+        Getter for the cabin of a plane.
+        :param side: int - the index of the board owner in BOARDS
+        :param planeId: int - the plane id
+        :return: int - row * width + col
+        """
+        return self.__cabins[side][planeId]
+
+    def getMask(self,side,planeId):
+        """
+        Getter for the footprint of a plane.
+        :param side: int - the index of the board owner in BOARDS
+        :param planeId: int - the plane id
+        :return: int - the bitmask of the plane cells
+        """
+        return self.__masks[side][planeId]
+
+
+class GameState:
+    # a state is 5 references: a million of them are kept by the searches and the undo histories
+    __slots__ = ('__parent', '__layout', '__player', '__computer', '__move')
+
+    def __init__(self,width,height,playerPlanes,computerPlanes,playerShots=(0,0,0),computerShots=(0,0,0)):
+        """
+        Immutable state of a game: the planes and the shots on both boards. A shot gives a new state which
+        shares everything with its parent except the shots of the board that was shot, one integer where the hit
+        cells, the missed cells and the destroyed planes of the board are packed. So branching a search or
+        keeping an undo history costs about a hundred bytes per move, the planes are never copied.
+        The parent is kept as well, it is the undo of the last move.
+        Only the bitmask boards are supported, up to SPARSE_LIMIT cells.
+        :param width: int - the board width
+        :param height: int - the board height
+        :param playerPlanes: list of Plane objects
+        :param computerPlanes: list of Plane objects
+        :param playerShots: tuple (hit mask, miss mask, destroyed planes bitmask) of the player's board
+        :param computerShots: tuple (hit mask, miss mask, destroyed planes bitmask) of the computer's board
+        :raises: ValueError if the board has more than SPARSE_LIMIT cells
+        """
+        if width * height > SPARSE_LIMIT:
+            raise ValueError('The game states need a bitmask board!')
+        cellsCount = width * height
+        self.__parent = None
+        self.__layout = GameLayout(width,height,playerPlanes,computerPlanes)
+        self.__player = playerShots[0] | playerShots[1] << cellsCount | playerShots[2] << 2 * cellsCount
+        self.__computer = computerShots[0] | computerShots[1] << cellsCount | computerShots[2] << 2 * cellsCount
+        self.__move = None
+
+    def getParent(self):
+        """
+        Getter for the state before the last move.
+        :return: GameState object, None for the first state
+        """
+        return self.__parent
+
+    def getLayout(self):
+        """
+        Getter for the planes of the game, shared with all its states.
+        :return: GameLayout object
+        """
+        return self.__layout
+
+    def getMove(self):
+        """
+        Getter for the last move, the one that led from the parent to this state.
+        :return: (str - the owner of the board that was shot: player/computer, tuple with the hit coordinates,
+        str - cabin/hit/miss), None for the first state
+        """
+        if self.__move is None:
+            return None
+        cell, side, result = self.__move >> 3, self.__move >> 2 & 1, self.__move & 3
+        return BOARDS[side], divmod(cell,self.__layout.getWidth()), RESULTS[result]
+
+    def getMoves(self):
+        """
+        Getter for the moves from the first state to this one, by walking up the parents.
+        :return: list of tuples in the format of getMove
+        """
+        moves = []
+        state = self
+        while state.__parent is not None:
+            moves.append(state.getMove())
+            state = state.__parent
+        moves.reverse()
+        return moves
+
+    def getShots(self,board):
+        """
+        Getter for the shots on a board, in the format of Fleet.setShots.
+        :param board: str - the owner of the board: player/computer
+        :return: tuple (hit mask, miss mask, destroyed planes bitmask)
+        """
+        cellsCount = self.__layout.getWidth() * self.__layout.getHeight()
+        shots = self.__player if board == 'player' else self.__computer
+        full = (1 << cellsCount) - 1
+        return shots & full, shots >> cellsCount & full, shots >> 2 * cellsCount
+
+    def getAlivePlanesCount(self,board):
+        """
+        Getter for the number of planes of a board which are not destroyed.
+        :param board: str - the owner of the board: player/computer
+        :return: int
+        """
+        side = BOARDS.index(board)
+        return len(self.__layout.getPlanes(side)) - self.getShots(board)[2].bit_count()
+
+    def getWinner(self):
+        """
+        Method that gets the winner of the game by checking if a player is out of planes.
+        :return: str - the winner: human or computer, None if the game is not over
+        """
+        if not self.getAlivePlanesCount('computer'):
+            return 'human'
+        if not self.getAlivePlanesCount('player'):
+            return 'computer'
+        return None
+
+    def shoot(self,board,hitPos):
+        """
+        Method that resolves a shot like Fleet.shoot, without changing this state.
+        :param board: str - the owner of the board that is shot: player/computer
+        :param hitPos: tuple with the hit coordinates
+        :return: (GameState object - the state after the shot, str - cabin/hit/miss)
+        """
+        layout = self.__layout
+        side = BOARDS.index(board)
+        cellsCount = layout.getWidth() * layout.getHeight()
+        cell = hitPos[0] * layout.getWidth() + hitPos[1]
+        shots = self.__player if side == 0 else self.__computer
+        planeId = layout.getPlaneAt(side,cell)
+        result = 0
+        if planeId < 0:
+            shots |= 1 << cell + cellsCount
+        elif not shots >> 2 * cellsCount + planeId & 1:
+            if layout.getCabin(side,planeId) == cell:
+                shots |= 1 << 2 * cellsCount + planeId
+                result = 2
+            elif not shots >> cell & 1:
+                shots |= 1 << cell
+                result = 1
+        child = GameState.__new__(GameState)
+        child.__parent = self
+        child.__layout = layout
+        child.__player = shots if side == 0 else self.__player
+        child.__computer = self.__computer if side == 0 else shots
+        child.__move = cell << 3 | side << 2 | result
+        return child, RESULTS[result]
@@ -1,13 +1,24 @@
+from collections import namedtuple
+from math import factorial
+from domain.board import Board
+from domain.shapes import ORIENTATIONS, getShape, recognize
+
+
 class Plane:
-    def __init__(self,cabinPosition,orientation):
+    # a plane is only its cabin, orientation and shared shape, many thousands of them are kept by resident sessions
+    __slots__ = ('__cabPos', '__orientation', '__shape')
+
+    def __init__(self,cabinPosition,orientation,shape='classic'):
         """
         Plane object constructor.
         :param cabinPosition: tuple that contains the coordinates of the cabin in the matrix
         :param orientation: str - up/down/left/right
+        :param shape: str - the name of a registered shape
+        :raises: ValueError if the shape is not registered
         """
         self.__cabPos = cabinPosition  # tuple with the coordinates in the board matrix, eg: (0,2) - row and column
         self.__orientation = orientation
-        self.__DirAndSign = self.getPlaneDirections(self.__orientation)
+        self.__shape = getShape(shape)
 
     def getCabinPosition(self):
         """
@@ -23,32 +34,372 @@ class Plane:
         """
         return self.__orientation
 
+    def getShape(self):
+        """
+        Getter for the plane shape.
+        :return: Shape object
+        """
+        return self.__shape
+
     @staticmethod
-    def getPlaneDirections(orientation):
+    def getCabinRange(orientation,width,height,shape='classic'):
         """
-        Method that gets the plane directions for its cells based on a given orientation.
+        Method that gets the cabin positions for which a plane with a given orientation is inside a board.
         :param orientation: str - up/down/left/right
-        :return: tuple that contains the corresponding cell directions and the sign used to iterate over the matrix
+        :param width: int - the board width
+        :param height: int - the board height
+        :param shape: str - the name of the plane shape
+        :return: tuple (first row, last row, first column, last column), the ranges are empty if the plane can't fit
+        """
+        rowMin, rowMax, colMin, colMax = getShape(shape).getExtent(orientation)
+        return -rowMin, height - 1 - rowMax, -colMin, width - 1 - colMax
+
+    def getPlaneMask(self,width):
+        """
+        Method that gets the footprint of the plane as a board bitmask.
+        :param width: int - the width of the board
+        :return: int - a mask with the bits of all the plane cells set
         """
-        UpDownDirections = [(0, 0), (1, -2), (1, -1), (1, 0), (1, 1), (1, 2), (2, 0), (3, -1), (3, 0), (3, 1)]
-        LeftRightDirections = [(0, 0), (-2, 1), (-1, 1), (0, 1), (1, 1), (2, 1), (0, 2), (-1, 3), (0, 3), (1, 3)]
-        DirAndSign = {'up': (UpDownDirections,1), 'down': (UpDownDirections,-1),
-                      'left': (LeftRightDirections,1), 'right': (LeftRightDirections,-1)}
-        return DirAndSign[orientation]
+        mask = 0
+        for cell in self.getPlaneCells():
+            mask |= 1 << (cell[0] * width + cell[1])
+        return mask
 
     def getPlaneCells(self):
         """
         Method that gets all the cells that the plane occupies on the board.
-        :return: cells - list that contains all 10 cells of the plane
+        The cells are computed from the shared geometry, they are not stored in the plane.
+        :return: cells - list that contains all the cells of the plane, the cabin first
+        """
+        row, col = self.__cabPos
+        return [(row + r, col + c) for r, c in self.__shape.getCells(self.__orientation)]
+
+
+Placement = namedtuple('Placement', ['index', 'cabin', 'orientation', 'cells', 'mask'])
+
+
+class PlacementTable:
+    def __init__(self,width,height,shape='classic'):
+        """
+        Index of every in-bounds plane placement of a shape on a board of the given size.
+        Each placement keeps its cells tuple and its footprint mask, so the geometry is computed only once.
+        :param width: int - the board width
+        :param height: int - the board height
+        :param shape: str - the name of the plane shape
+        """
+        self.__width = width
+        self.__height = height
+        self.__shape = getShape(shape)
+        self.__placements = []
+        self.__byCabin = {}
+        self.__byCells = {}
+        self.__cellPlacements = None
+        self.__cabinPlacements = None
+        self.__compatibleAfter = None
+        self.__counts = {}
+        for row in range(height):
+            for col in range(width):
+                for orientation in ORIENTATIONS:
+                    cells = tuple((row + r, col + c) for r, c in self.__shape.getCells(orientation))
+                    if all(0 <= c[0] < height and 0 <= c[1] < width for c in cells):
+                        mask = 0
+                        for c in cells:
+                            mask |= 1 << (c[0] * width + c[1])
+                        placement = Placement(len(self.__placements),(row,col),orientation,cells,mask)
+                        self.__placements.append(placement)
+                        self.__byCabin[((row,col),orientation)] = placement
+                        self.__byCells[frozenset(cells)] = placement
+
+    def getShape(self):
         """
-        cells = []
-        directions = self.__DirAndSign[0]
-        sign = self.__DirAndSign[1]
-        for d in directions:
-            currentRow = self.__cabPos[0] + sign * d[0]
-            currentCol = self.__cabPos[1] + sign * d[1]
-            cells.append((currentRow,currentCol))
-        return cells
+        Getter for the plane shape of the placements.
+        :return: Shape object
+        """
+        return self.__shape
+
+    def getCellPlacements(self):
+        """
+        Getter for the placements covering each cell, as masks over the placement indices.
+        :return: list of int - element (row * width + col) has bit i set if placement i covers that cell
+        """
+        if self.__cellPlacements is None:
+            cellPlacements = [0] * (self.__width * self.__height)
+            for placement in self.__placements:
+                for c in placement.cells:
+                    cellPlacements[c[0] * self.__width + c[1]] |= 1 << placement.index
+            self.__cellPlacements = cellPlacements
+        return self.__cellPlacements
+
+    def getCabinPlacements(self):
+        """
+        Getter for the placements having their cabin on each cell, as masks over the placement indices.
+        :return: list of int - element (row * width + col) has bit i set if placement i has its cabin on that cell
+        """
+        if self.__cabinPlacements is None:
+            cabinPlacements = [0] * (self.__width * self.__height)
+            for placement in self.__placements:
+                cabinPlacements[placement.cabin[0] * self.__width + placement.cabin[1]] |= 1 << placement.index
+            self.__cabinPlacements = cabinPlacements
+        return self.__cabinPlacements
+
+    def getCompatibleAfter(self):
+        """
+        Getter for the compatibility structure of the placements.
+        :return: list of int - element i has bit j set if j > i and placements i and j do not overlap
+        """
+        if self.__compatibleAfter is None:
+            cellPlacements = self.getCellPlacements()
+            allPlacements = (1 << len(self.__placements)) - 1
+            compatibleAfter = []
+            for placement in self.__placements:
+                conflicts = 0
+                for c in placement.cells:
+                    conflicts |= cellPlacements[c[0] * self.__width + c[1]]
+                compatibleAfter.append(allPlacements & ~conflicts & ~((2 << placement.index) - 1))
+            self.__compatibleAfter = compatibleAfter
+        return self.__compatibleAfter
+
+    def countConfigurations(self,planesCount,candidates=None):
+        """
+        Method that counts the sets of mutually non-overlapping placements of a number of planes.
+        :param planesCount: int - the number of planes
+        :param candidates: int - mask of the placement indices that may be used (default: all of them)
+        :return: int - the number of configurations
+        """
+        if candidates is None:
+            candidates = (1 << len(self.__placements)) - 1
+        if planesCount == 0:
+            return 1
+        if planesCount * self.__shape.getCellsCount() > self.__width * self.__height \
+                or candidates.bit_count() < planesCount:
+            return 0
+        if planesCount == 1:
+            return candidates.bit_count()
+        key = (candidates,planesCount)
+        count = self.__counts.get(key)
+        if count is None:
+            compatibleAfter = self.getCompatibleAfter()
+            count = 0
+            rest = candidates
+            while rest:
+                low = rest & -rest
+                rest ^= low
+                count += self.countConfigurations(planesCount - 1,rest & compatibleAfter[low.bit_length() - 1])
+            self.__counts[key] = count
+        return count
+
+    def getFreePlacements(self,occupiedMask):
+        """
+        Method that gets the placements which do not overlap the occupied cells of a board.
+        :param occupiedMask: int - board bitmask of the occupied cells
+        :return: int - mask of the placement indices
+        """
+        cellPlacements = self.getCellPlacements()
+        blocked = 0
+        while occupiedMask:
+            low = occupiedMask & -occupiedMask
+            occupiedMask ^= low
+            blocked |= cellPlacements[low.bit_length() - 1]
+        return ((1 << len(self.__placements)) - 1) & ~blocked
+
+    def supportsExactSampling(self,planesCount):
+        """
+        Method that checks if the configurations of a number of planes can be counted quickly:
+        the counting visits up to (placements ** (planes - 1)) / (planes - 1)! partial configurations,
+        each one a mask operation over the placements bits.
+        :param planesCount: int - the number of planes
+        :return: True/False
+        """
+        count = len(self.__placements)
+        return count ** planesCount <= EXACT_SAMPLING_LIMIT * factorial(max(planesCount - 1,0))
+
+    def sampleConfiguration(self,planesCount,rng,occupiedMask=0):
+        """
+        Method that draws, uniformly at random, one of the sets of mutually non-overlapping placements.
+        Each placement is chosen with a weight equal to the number of configurations it can be completed to,
+        so there is no rejection loop.
+        :param planesCount: int - the number of planes
+        :param rng: random.Random object
+        :param occupiedMask: int - board bitmask of the cells already taken by other planes
+        :return: list of Placement tuples
+        :raises: PlaneError if the planes can not fit on the board
+        """
+        candidates = self.getFreePlacements(occupiedMask)
+        total = self.countConfigurations(planesCount,candidates)
+        if not total:
+            raise PlaneError('Invalid number of planes! {} planes do not fit on the board!'.format(planesCount))
+        compatibleAfter = self.getCompatibleAfter()
+        chosen = []
+        while len(chosen) < planesCount:
+            r = rng.randrange(total)
+            rest = candidates
+            while True:
+                low = rest & -rest
+                rest ^= low
+                index = low.bit_length() - 1
+                count = self.countConfigurations(planesCount - len(chosen) - 1,rest & compatibleAfter[index])
+                if r < count:
+                    break
+                r -= count
+            chosen.append(self.__placements[index])
+            candidates = rest & compatibleAfter[index]
+            total = count
+        return chosen
+
+    def getPlacements(self):
+        """
+        Getter for all the legal placements.
+        :return: list of Placement tuples
+        """
+        return self.__placements
+
+    def find(self,cabinPosition,orientation):
+        """
+        Method that looks up the placement of a plane by its cabin and orientation.
+        :param cabinPosition: tuple with the coordinates of the cabin
+        :param orientation: str - up/down/left/right
+        :return: Placement tuple, or None if the plane does not fit on the board
+        """
+        try:
+            return self.__byCabin.get((cabinPosition,orientation))
+        except TypeError:
+            return None
+
+    def findByCells(self,cells):
+        """
+        Method that looks up the placement that occupies exactly the given cells.
+        :param cells: iterable of tuples with cell coordinates
+        :return: Placement tuple, or None if the cells do not form a plane
+        """
+        return self.__byCells.get(frozenset(cells))
+
+
+TABLE_LIMIT = 4096  # the placement tables are built only for boards with at most this many cells
+EXACT_SAMPLING_LIMIT = 200000000  # the placement bits operated on when counting the configurations, ~0.1 s
+_placementTables = {}
+
+
+def getPlacementTable(width,height,shape='classic'):
+    """
+    Function that gets the placement table of a board size and a plane shape, building it on first use.
+    :param width: int - the board width
+    :param height: int - the board height
+    :param shape: str - the name of the plane shape
+    :return: PlacementTable object, or None for boards with more than TABLE_LIMIT cells
+    """
+    if width * height > TABLE_LIMIT:
+        return None
+    # keyed by the Shape object: a shape registered again under the same name gets its own table
+    key = (width,height,getShape(shape))
+    table = _placementTables.get(key)
+    if table is None:
+        table = _placementTables[key] = PlacementTable(width,height,shape)
+    return table
+
+
+def _searchPlacements(board,planesCount,rng,shape,ranges):
+    """
+    Function that looks for placements of planes which fit on a board, next to its planes, by a backtracking
+    search over the placements in a random order. The search is exhaustive: it fails only if no configuration
+    exists. A group of taken cells which can not be completed is remembered, it is not searched again,
+    and a search stops early when the cells its placements can still cover are too few for its planes.
+    :param board: Board object
+    :param planesCount: int - the number of planes
+    :param rng: random.Random object
+    :param shape: str - the name of the plane shape
+    :param ranges: dict - orientation -> (first row, last row, first column, last column) of the cabins
+    :return: list of Placement tuples, their masks are in the format of the board, None if the planes do not fit
+    """
+    width = board.getWidth()
+    occupied = board.getOccupiedMask()
+    if board.isSparse():
+        occupied = sum(1 << cell for cell in occupied)
+    candidates = []
+    for orientation in sorted(ranges):
+        rowMin, rowMax, colMin, colMax = ranges[orientation]
+        for row in range(rowMin,rowMax + 1):
+            for col in range(colMin,colMax + 1):
+                cells = tuple(Plane((row,col),orientation,shape).getPlaneCells())
+                mask = 0
+                for cell in cells:
+                    mask |= 1 << (cell[0] * width + cell[1])
+                if not mask & occupied:
+                    candidates.append(((row,col),orientation,cells,mask))
+    rng.shuffle(candidates)
+    cellsCount = getShape(shape).getCellsCount()
+    failed = set()
+
+    def search(taken,planesLeft,candidates):
+        if not planesLeft:
+            return []
+        coverable = 0
+        for candidate in candidates:
+            coverable |= candidate[3]
+        if taken not in failed and coverable.bit_count() >= planesLeft * cellsCount:
+            # the placements before the current one could not be completed, so they are left out of the rest
+            for i, candidate in enumerate(candidates):
+                mask = candidate[3]
+                found = search(taken | mask,planesLeft - 1,[c for c in candidates[i + 1:] if not c[3] & mask])
+                if found is not None:
+                    return [candidate] + found
+        failed.add(taken)
+        return None
+
+    found = search(occupied,planesCount,candidates)
+    if found is None:
+        return None
+    return [Placement(None,cabin,orientation,cells,board.cellsMask(cells)) for cabin, orientation, cells, mask in found]
+
+
+def samplePlacements(board,planesCount,rng,attempts=1000,shape='classic'):
+    """
+    Function that draws random placements of planes which fit on a board, next to its planes.
+    Boards with a placement table and few enough planes get a uniform draw among all the configurations,
+    without rejections. Otherwise each plane is drawn independently and redrawn if it overlaps,
+    at most a bounded number of times, and a crowded board falls back to a backtracking search,
+    so the draw fails only if the planes can not fit.
+    :param board: Board object
+    :param planesCount: int - the number of planes
+    :param rng: random.Random object
+    :param attempts: int - the number of draws allowed for each plane before searching
+    :param shape: str - the name of the plane shape
+    :return: list of Placement tuples, their masks are in the format of the board
+    :raises: PlaneError if the planes can not fit on the board
+    """
+    width, height = board.getWidth(), board.getHeight()
+    table = getPlacementTable(width,height,shape)
+    if table is not None and table.supportsExactSampling(planesCount):
+        return table.sampleConfiguration(planesCount,rng,board.getOccupiedMask())
+    ranges = {}
+    for orientation in ORIENTATIONS:
+        rowMin, rowMax, colMin, colMax = Plane.getCabinRange(orientation,width,height,shape)
+        if rowMin <= rowMax and colMin <= colMax:
+            ranges[orientation] = (rowMin, rowMax, colMin, colMax)
+    occupiedCount = len(board.getOccupiedMask()) if board.isSparse() else board.getOccupiedMask().bit_count()
+    if planesCount and (not ranges or planesCount * getShape(shape).getCellsCount() > width * height - occupiedCount):
+        raise PlaneError('Invalid number of planes! {} planes do not fit on the board!'.format(planesCount))
+    chosen = []
+    taken = board.cellsMask(())
+    failures = 0
+    while len(chosen) < planesCount:
+        if failures == attempts:
+            chosen = _searchPlacements(board,planesCount,rng,shape,ranges)
+            if chosen is None:
+                raise PlaneError('Invalid number of planes! {} planes do not fit on the board!'.format(planesCount))
+            break
+        orientation = rng.choice(sorted(ranges))
+        rowMin, rowMax, colMin, colMax = ranges[orientation]
+        cabin = (rng.randint(rowMin,rowMax),rng.randint(colMin,colMax))
+        cells = tuple(Plane(cabin,orientation,shape).getPlaneCells())
+        mask = board.cellsMask(cells)
+        if board.overlaps(mask) or taken & mask:
+            failures += 1
+            continue
+        chosen.append(Placement(None,cabin,orientation,cells,mask))
+        taken = taken | mask
+        failures = 0
+    return chosen
+
 
 class PlaneValidator:
     @staticmethod
@@ -56,49 +407,55 @@ class PlaneValidator:
         """
         Static method used to validate a plane by checking its cabin position and the positioning on the board.
         :param plane: PLane objects
-        :param board: list of lists - Board matrix
+        :param board: Board object (the overlap check is a single mask operation) or list of lists - Board matrix
         :raises: PlaneError in case of invalid plane
         """
+        if isinstance(board,Board):
+            height, width = board.getHeight(), board.getWidth()
+        else:
+            height, width = len(board), len(board[0])
         cabPos = plane.getCabinPosition()
-        if type(cabPos) is not tuple or len(cabPos) != 2 or cabPos[0] not in range(8) or cabPos[1] not in range(8):
+        if type(cabPos) is not tuple or len(cabPos) != 2 or not 0 <= cabPos[0] < height or not 0 <= cabPos[1] < width:
             raise PlaneError('Invalid cabin position!')
-        cells = plane.getPlaneCells()
-        for cell in cells:
-            if cell[0] not in range(8) or cell[1] not in range(8):
+        table = getPlacementTable(width,height,plane.getShape().getName())
+        if table is not None:
+            placement = table.find(cabPos,plane.getPlaneOrientation())
+            if placement is None:
                 raise PlaneError('Invalid plane positioning! The plane is outside the playing area!')
-            if board[cell[0]][cell[1]] == '#':
-                raise PlaneError('Invalid plane positioning! This plane overlaps the other plane!')
+            cells = placement.cells
+        else:
+            cells = plane.getPlaneCells()
+            for cell in cells:
+                if not 0 <= cell[0] < height or not 0 <= cell[1] < width:
+                    raise PlaneError('Invalid plane positioning! The plane is outside the playing area!')
+        if isinstance(board,Board):
+            overlaps = board.overlaps(placement.mask if table is not None else board.cellsMask(cells))
+        else:
+            overlaps = any(board[cell[0]][cell[1]] == '#' for cell in cells)
+        if overlaps:
+            raise PlaneError('Invalid plane positioning! This plane overlaps the other plane!')
 
     @staticmethod
-    def GUIValidate(selectedCells):
+    def GUIValidate(selectedCells,width=8,height=8,shape='classic'):
         """
         Static method used to validate a plane input from GUI, using the selected cells.
         In case of valid plane, it returns the cabin position and the orientation.
+        The plane is recognized with a single lookup of the selected cells moved to the origin.
         :param selectedCells: list of cells
+        :param width: int - the board width
+        :param height: int - the board height
+        :param shape: str - the name of the plane shape of the game
         :return: cabin position (tuple with the coordinates), direction (str - up/down/left/right)
         :raises: PlaneError in case of invalid plane
         """
-        if len(selectedCells) != 10:
+        found = recognize(selectedCells)
+        if found is None or found[0] is not getShape(shape):
+            raise PlaneError("Invalid plane!")
+        planeShape, orientation, cabin = found
+        rowMin, rowMax, colMin, colMax = planeShape.getExtent(orientation)
+        if cabin[0] + rowMin < 0 or cabin[0] + rowMax >= height or cabin[1] + colMin < 0 or cabin[1] + colMax >= width:
             raise PlaneError("Invalid plane!")
-        UpDownDirections = [(0, 0), (1, -2), (1, -1), (1, 0), (1, 1), (1, 2), (2, 0), (3, -1), (3, 0), (3, 1)]
-        LeftRightDirections = [(0, 0), (-2, 1), (-1, 1), (0, 1), (1, 1), (2, 1), (0, 2), (-1, 3), (0, 3), (1, 3)]
-        DirAndSign = {'up': (UpDownDirections, 1), 'down': (UpDownDirections, -1),
-                      'left': (LeftRightDirections, 1), 'right': (LeftRightDirections, -1)}
-        for d in DirAndSign:
-            ds = DirAndSign[d]
-            directions = ds[0]
-            s = ds[1]
-            for cab in selectedCells:
-                ok = True
-                for c in selectedCells:
-                    row = (c[0]-cab[0])//s
-                    col = (c[1]-cab[1])//s
-                    if (row,col) not in directions:
-                        ok = False
-                        break
-                if ok:
-                    return cab,d
-        raise PlaneError("Invalid plane!")
+        return cabin,orientation
 
 class PlaneError(Exception):
     """
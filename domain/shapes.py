@@ -0,0 +1,195 @@
+import hashlib
+import struct
+
+ORIENTATIONS = ('up', 'down', 'left', 'right')
+# the cells of the built-in shapes heading up, relative to the cabin: (rows towards the tail, columns)
+CLASSIC_CELLS = ((0, 0), (1, -2), (1, -1), (1, 0), (1, 1), (1, 2), (2, 0), (3, -1), (3, 0), (3, 1))
+JET_CELLS = ((0, 0), (1, -1), (1, 0), (1, 1), (2, 0), (3, -1), (3, 0), (3, 1))
+
+
+class Shape:
+    __slots__ = ('__name', '__cells', '__extents', '__key')
+
+    def __init__(self,name,cells):
+        """
+        A plane shape with its four orientations, compiled once: the shape heading up is turned by a quarter
+        turn for left, half a turn for down and three quarters for right.
+        :param name: str - the name of the shape
+        :param cells: iterable of tuples (row, col) - the cells heading up, relative to the cabin (0, 0)
+        :raises: ValueError if the cabin is missing or a cell is repeated
+        """
+        up = tuple(cells)
+        if (0, 0) not in up or len(set(up)) != len(up):
+            raise ValueError('Invalid shape {}!'.format(name))
+        self.__name = name
+        self.__cells = {'up': up,
+                        'down': tuple((-r, -c) for r, c in up),
+                        'left': tuple((-c, r) for r, c in up),
+                        'right': tuple((c, -r) for r, c in up)}
+        # the first row, last row, first column and last column of every orientation
+        self.__extents = {orientation: (min(r for r, c in cells), max(r for r, c in cells),
+                                        min(c for r, c in cells), max(c for r, c in cells))
+                          for orientation, cells in self.__cells.items()}
+        cellsData = b''.join(struct.pack('<ii',r,c) for r, c in sorted(up))
+        self.__key = int.from_bytes(hashlib.blake2b(cellsData,digest_size=8).digest(),'little')
+
+    def getName(self):
+        """
+        Getter for the name of the shape.
+        :return: str
+        """
+        return self.__name
+
+    def getKey(self):
+        """
+        Getter for the key of the shape: a hash of its cells, the same in every process that registers it,
+        whatever the order of the registrations.
+        :return: int - 64 bits
+        """
+        return self.__key
+
+    def getCellsCount(self):
+        """
+        Getter for the number of cells of the shape.
+        :return: int
+        """
+        return len(self.__cells['up'])
+
+    def getCells(self,orientation):
+        """
+        Getter for the cells of an orientation, relative to the cabin.
+        :param orientation: str - up/down/left/right
+        :return: tuple of tuples (row, col), the cabin first
+        """
+        return self.__cells[orientation]
+
+    def getExtent(self,orientation):
+        """
+        Getter for the rectangle covered by an orientation, relative to the cabin.
+        :param orientation: str - up/down/left/right
+        :return: tuple (first row, last row, first column, last column)
+        """
+        return self.__extents[orientation]
+
+    def coversCorners(self):
+        """
+        Method that checks if the shape can cover a corner of the board: if an orientation has a cell at the corner
+        of its rectangle. The orientations are the four quarter turns, so the four corners are covered alike.
+        :return: True/False
+        """
+        for orientation, (rowMin, rowMax, colMin, colMax) in self.__extents.items():
+            if (rowMin, colMin) in self.__cells[orientation]:
+                return True
+        return False
+
+
+_shapes = {}  # name -> Shape, in the order of registration
+# the recognition index: the cells of an orientation moved to the origin -> (shape, orientation, cabin)
+_signatures = {}
+_keys = {}  # the key of a shape -> Shape
+
+
+def _normalize(cells):
+    """
+    Function that moves a group of cells so that its first row and first column are 0.
+    :param cells: collection of tuples (row, col)
+    :return: (frozenset of tuples - the moved cells, int - the first row, int - the first column)
+    """
+    rowMin = min(c[0] for c in cells)
+    colMin = min(c[1] for c in cells)
+    return frozenset((r - rowMin, c - colMin) for r, c in cells), rowMin, colMin
+
+
+def registerShape(name,cells):
+    """
+    Function that adds a plane shape, which the boards, the validation and the strategies can use by its name.
+    :param name: str - the name of the shape
+    :param cells: iterable of tuples (row, col) - the cells heading up, relative to the cabin (0, 0)
+    :return: Shape object
+    :raises: ValueError if the name is taken or an orientation has the same cells as another shape
+    """
+    if name in _shapes:
+        raise ValueError('The shape {} already exists!'.format(name))
+    shape = Shape(name,cells)
+    signatures = {}
+    for orientation in ORIENTATIONS:
+        signature, rowMin, colMin = _normalize(shape.getCells(orientation))
+        if _signatures.get(signature,(shape,))[0] is not shape:
+            raise ValueError('The shape {} looks like the shape {}!'.format(name,_signatures[signature][0].getName()))
+        # a symmetric shape has orientations with the same cells: the first one is recognized
+        signatures.setdefault(signature,(shape,orientation,(-rowMin,-colMin)))
+    _signatures.update(signatures)
+    _shapes[name] = shape
+    _keys[shape.getKey()] = shape
+    return shape
+
+
+def unregisterShape(name):
+    """
+    Function that removes a shape added by registerShape, the built-in shapes stay.
+    :param name: str - the name of the shape
+    :raises: ValueError if there is no such shape or it is built-in
+    """
+    shape = getShape(name)
+    if name in BUILTIN_SHAPES:
+        raise ValueError('The shape {} is built-in!'.format(name))
+    del _shapes[name]
+    del _keys[shape.getKey()]
+    for signature in [signature for signature, found in _signatures.items() if found[0] is shape]:
+        del _signatures[signature]
+
+
+def getShape(name):
+    """
+    Getter for a registered shape.
+    :param name: str - the name of the shape
+    :return: Shape object
+    :raises: ValueError if there is no such shape
+    """
+    try:
+        return _shapes[name]
+    except KeyError:
+        raise ValueError('Invalid shape {}!'.format(name)) from None
+
+
+def getShapeByKey(key):
+    """
+    Getter for a registered shape by its key.
+    :param key: int - the key of the shape, see Shape.getKey
+    :return: Shape object
+    :raises: ValueError if no registered shape has this key
+    """
+    try:
+        return _keys[key]
+    except KeyError:
+        raise ValueError('Unknown shape {:016x}, register it first!'.format(key)) from None
+
+
+def getShapeNames():
+    """
+    Getter for the names of the registered shapes.
+    :return: tuple of str, in the order of registration
+    """
+    return tuple(_shapes)
+
+
+def recognize(cells):
+    """
+    Function that recognizes the plane made by a group of cells with one lookup of its cells moved to the origin.
+    :param cells: iterable of tuples (row, col)
+    :return: (Shape object, str - the orientation, tuple - the cabin position), None if the cells are not a plane
+    """
+    cells = tuple(cells)
+    if not cells:
+        return None
+    signature, rowMin, colMin = _normalize(cells)
+    found = _signatures.get(signature)
+    if found is None or len(signature) != len(cells):
+        return None
+    shape, orientation, cabin = found
+    return shape, orientation, (rowMin + cabin[0], colMin + cabin[1])
+
+
+BUILTIN_SHAPES = ('classic', 'jet')
+registerShape('classic',CLASSIC_CELLS)
+registerShape('jet',JET_CELLS)
@@ -1,21 +1,122 @@
-from UserInterface.ConsoleUI import Console
-from UserInterface.GUI import GUI
-from controllers.gameSrv import GameService
+from controllers.gameSrv import GameService, DIFFICULTIES
+from controllers.strategies import AI_MODES
+from controllers.profiler import Profiler
+from domain.plane import TABLE_LIMIT
+from domain.shapes import getShapeNames
+import argparse
+import importlib
+
+# the user interfaces: name -> (module, class, the redraw paths to profile), imported only when chosen
+INTERFACES = {
+    'gui': ('UserInterface.GUI', 'GUI', ('paintCell', 'redraw', 'onChange')),
+    'console': ('UserInterface.ConsoleUI', 'Console', ('printTable', 'printBoards2')),
+    'server': ('UserInterface.Server', 'Server', ()),
+}
+MENU_CHOICES = {'1': 'gui', '2': 'console', '3': 'server'}
+
+
+def loadInterface(name, profiler):
+    """
+    Function that imports the class of a user interface, and instruments its redraw paths when profiling.
+    :param name: str - gui/console/server
+    :param profiler: Profiler object
+    :return: the class of the user interface
+    """
+    module, className, paths = INTERFACES[name]
+    cls = getattr(importlib.import_module(module), className)
+    if profiler.isEnabled() and paths:
+        profiler.instrument(cls, paths)
+    return cls
+
+
+def chooseInterface():
+    """
+    Function that asks the user for an interface until the choice exists.
+    :return: str - gui/console/server
+    """
+    while True:
+        print("""Choose your user interface, enter: [1] for graphical
+                                   [2] for console based
+                                   [3] for a game server (port 5000)""")
+        choice = input('->').strip()
+        if choice in MENU_CHOICES:
+            return MENU_CHOICES[choice]
+        print("Non-existent choice!")
+
+
+def defaultMode(args, mode):
+    """
+    Function that picks the strategy used when none is given: the placement strategies need a placement table,
+    so the boards without one get the classic strategy.
+    :param args: argparse.Namespace - the command line arguments
+    :param mode: str - the strategy wanted on the boards with a placement table
+    :return: str - the strategy
+    """
+    return mode if args.width * args.height <= TABLE_LIMIT else 'classic'
+
+
+def runHeadless(args):
+    """
+    Function that plays games between two strategies without any user interface, only the domain and
+    the controllers are imported.
+    :param args: argparse.Namespace - the command line arguments
+    """
+    for game in range(args.games):
+        service = GameService(args.seed + game, args.ai, args.player, args.width, args.height, args.planes,
+                              args.difficulty, args.shape)
+        service.addRandomPlayerPlanes()
+        rounds = 0
+        while service.getWinner() is None:
+            rounds += 1
+            service.playerAutoHit()
+            if service.getWinner() is None:
+                service.computerHit()
+        print('game {}: {} won in {} rounds'.format(game + 1, service.getWinner(), rounds))
+
 
 if __name__ == '__main__':
-    service = GameService()
-    UI = None
-    while UI is None:
-        try:
-            print("""Choose your user interface, enter: [1] for graphical 
-                                   [2] for console based""")
-            choice = input('->').strip()
-            if choice == '1':
-                UI = GUI(service)
-            elif choice == '2':
-                UI = Console(service)
-            else:
-                raise Exception("Non-existent choice!")
-        except Exception as ex:
-            print(ex)
-    UI.run()
+    parser = argparse.ArgumentParser(description='The Planes game.')
+    parser.add_argument('--ui', choices=sorted(INTERFACES) + ['headless'], default=None,
+                        help='the user interface, asked for when missing; headless plays --player against --ai')
+    parser.add_argument('--width', type=int, default=8, help='the number of columns of the boards')
+    parser.add_argument('--height', type=int, default=8, help='the number of rows of the boards')
+    parser.add_argument('--planes', type=int, default=2, help='the number of planes of each player')
+    parser.add_argument('--shape', choices=getShapeNames(), default='classic', help='the shape of the planes')
+    parser.add_argument('--ai', choices=sorted(AI_MODES), default=None,
+                        help="the computer's strategy (default: montecarlo, classic on the boards over {} cells)"
+                        .format(TABLE_LIMIT))
+    parser.add_argument('--difficulty', choices=list(DIFFICULTIES), default='medium',
+                        help='the time the montecarlo strategy takes for a move: 1, 10 or 100 ms')
+    parser.add_argument('--player', choices=sorted(AI_MODES), default=None,
+                        help="the player's strategy in the headless games (default: density, classic on the boards "
+                             "over {} cells)".format(TABLE_LIMIT))
+    parser.add_argument('--games', type=int, default=1, help='the number of headless games')
+    parser.add_argument('--seed', type=int, default=0, help='the seed of the first headless game')
+    parser.add_argument('--profile', nargs='?', const='-', default=None, metavar='PATH',
+                        help='profile the hot paths and write the report to PATH (JSON for .json, default: stdout)')
+    args = parser.parse_args()
+    args.ai = args.ai or defaultMode(args, 'montecarlo')
+    args.player = args.player or defaultMode(args, 'density')
+    profiler = Profiler()
+    if args.profile is not None:
+        profiler.enable()
+    if args.ui == 'headless':
+        runHeadless(args)
+    else:
+        interface = None
+        while interface is None:
+            ui = args.ui or chooseInterface()
+            try:
+                interface = loadInterface(ui, profiler)
+            except ImportError as ex:
+                if args.ui:
+                    raise
+                print('This interface is not available: {}'.format(ex))
+        if ui == 'server':
+            interface().run()
+        else:
+            interface(GameService(aiMode=args.ai, width=args.width, height=args.height, planesCount=args.planes,
+                                  difficulty=args.difficulty, shape=args.shape)).run()
+    if profiler.isEnabled():
+        profiler.disable()
+        profiler.dump(args.profile)
@@ -1,24 +1,83 @@
-from unittest import TestCase
+from unittest import TestCase, IsolatedAsyncioTestCase
+import random
 from controllers.gameSrv import GameService
-from domain.board import Board
-from domain.plane import Plane,PlaneValidator,PlaneError
+from controllers.simulator import playGame,simulate
+from controllers.batchEngine import BatchEngine
+from controllers.journal import Journal,JournalReader
+from controllers.gameSrv import ORIENTATIONS,PLAYER_PLANE,SNAPSHOT_HEADER,CellHit,PlaneDestroyed,GameWon
+from controllers.strategies import AI_MODES,ClassicStrategy,MonteCarloStrategy
+from controllers.gameRandom import GameRandom
+from controllers.solver import Solver
+from controllers.profiler import Profiler
+from controllers.exporter import exportGames,readIndex,readShard,NPY_HEADER_SIZE,CABIN
+from controllers.openingBook import OpeningBook,getOpeningBook,writeBook,OUT_OF_BOOK
+from UserInterface.Server import Server
+from benchmarks.startup import TARGETS,importTimes,startupTime
+import asyncio
+import json
+import gc
+import tracemalloc
+import os
+import tempfile
+import threading
+import time
+from domain.board import Board,BoardView
+from domain.fleet import Fleet
+from domain.gameState import GameState
+from domain.plane import Plane,PlaneValidator,PlaneError,getPlacementTable
+from domain.shapes import getShape,getShapeByKey,getShapeNames,registerShape,unregisterShape,recognize
 
 class TestComputerController(TestCase):
     def setUp(self):
         self.srv = GameService()
 
     def testResetGame(self):
-        self.srv.getHitBoard()[0][0] = 0
+        self.srv.playerHit((0,0))
         self.srv.resetGame()
         self.assertEqual(self.srv.getHitBoard(),Board(8,8).getMatrix())
 
+    def testBoardView(self):
+        view = self.srv.getHitBoard()
+        version = view.getVersion()
+        with self.assertRaises(TypeError):
+            view[0][0] = 0
+        matrix = view.copyMatrix()
+        matrix[0][0] = 0
+        self.assertEqual(view[0][0],' ')
+        self.srv.playerHit((0,0))
+        self.assertEqual(view[0][0],0)
+        self.assertNotEqual(view.getVersion(),version)
+        self.assertEqual(view,matrix)
+
+    def testBoardViewThreads(self):
+        board = Board(8,8)
+        view = BoardView(board)
+        stop = threading.Event()
+
+        def read():
+            while not stop.is_set():
+                for row in view:
+                    pass
+
+        readers = [threading.Thread(target=read) for i in range(2)]
+        for reader in readers:
+            reader.start()
+        for cell in range(64):
+            board.shoot(*divmod(cell,8))
+            time.sleep(0)
+        stop.set()
+        for reader in readers:
+            reader.join()
+        # no reader left a row of an older version in the cache
+        self.assertEqual(view,board.getMatrix())
+
     def testGetPlayerBoard(self):
         self.srv.resetGame()
         self.assertEqual(self.srv.getPlayerBoard(),Board(8,8).getMatrix())
 
     def testGetComputerBoard(self):
         self.srv.resetGame()
-        self.assertEqual(type(self.srv.getComputerBoard()),type(Board(8,8).getMatrix()))
+        self.assertIsInstance(self.srv.getComputerBoard(),BoardView)
 
     def testGetHitBoard(self):
         self.srv.resetGame()
@@ -40,6 +99,137 @@ class TestComputerController(TestCase):
                 usedCells += 1 if b[i][j] == '#' else 0
         self.assertEqual(usedCells,20)
 
+    def testAddComputerPlanesSeed(self):
+        srv1 = GameService(seed=8)
+        srv2 = GameService(seed=8)
+        self.assertEqual(srv1.getComputerBoard(),srv2.getComputerBoard())
+        srv1.resetGame()
+        srv1.addComputerPlanes(1,seed=1)
+        usedCells = sum(row.count('#') for row in srv1.getComputerBoard())
+        self.assertEqual(usedCells,30)
+        with self.assertRaises(PlaneError):
+            srv1.addComputerPlanes(3)
+
+    def testAddRandomPlayerPlanes(self):
+        srv = GameService(seed=3)
+        srv.addPlayerPlane((2,0),'left')
+        with self.assertRaises(PlaneError):
+            srv.addRandomPlayerPlanes(2)
+        srv.addRandomPlayerPlanes()
+        self.assertEqual(sum(row.count('#') for row in srv.getPlayerBoard()),20)
+        with self.assertRaises(PlaneError):
+            srv.addRandomPlayerPlanes(1)
+        srv.addRandomPlayerPlanes()
+        self.assertEqual(sum(row.count('#') for row in srv.getPlayerBoard()),20)
+
+    def testGameSize(self):
+        srv = GameService(seed=1,width=12,height=10,planesCount=3)
+        b = srv.getComputerBoard()
+        self.assertEqual((len(b),len(b[0])),(10,12))
+        self.assertEqual(sum(row.count('#') for row in b),30)
+        srv.addPlayerPlane((9,5),'down')
+        self.assertEqual(srv.getPlayerBoard()[9][5],'#')
+        with self.assertRaises(ValueError):
+            srv.playerHit((10,0))
+        with self.assertRaises(ValueError):
+            GameService(width=0)
+
+    def testCrowdedBoard(self):
+        for seed in range(5):
+            b = GameService(seed=seed,width=10,height=10,planesCount=6).getComputerBoard()
+            self.assertEqual(sum(row.count('#') for row in b),60)
+        with self.assertRaises(PlaneError):
+            GameService(seed=0,width=10,height=10,planesCount=7)
+
+    def testHugeBoard(self):
+        srv = GameService(seed=1,playerAiMode='classic',width=10000,height=10000,planesCount=300)
+        srv.addRandomPlayerPlanes()
+        for i in range(1000):
+            srv.playerAutoHit()
+            self.assertIn(srv.computerHit(),('cabin','hit','miss'))
+        self.assertIsNone(srv.getWinner())
+        with self.assertRaises(PlaneError):
+            srv.addPlayerPlane((5000,5000),'up')
+        with self.assertRaises(PlaneError):
+            srv.addRandomPlayerPlanes(1)
+
+    def testSessionMemory(self):
+        for mode in ('classic','density'):
+            GameService(aiMode=mode)  # builds the shared placement table outside the measurement
+            gc.collect()
+            tracemalloc.start()
+            sessions = [GameService(seed=i,aiMode=mode) for i in range(200)]
+            for srv in sessions:
+                srv.addPlayerPlane((2,0),'left')
+                srv.addPlayerPlane((4,7),'right')
+                for i in range(5):
+                    srv.computerHit()
+            gc.collect()
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            self.assertLess(size / len(sessions),8000)
+
+    def testSnapshot(self):
+        for mode, size in (('classic',(8,8,2)),('density',(8,8,2)),('classic',(300,300,20))):
+            srv = GameService(3,mode,mode,*size)
+            srv.addRandomPlayerPlanes()
+            for i in range(15):
+                srv.playerAutoHit()
+                srv.computerHit()
+            twin = GameService.restore(srv.snapshot())
+            data = srv.snapshot()
+            self.assertEqual(data,twin.snapshot())  # taking a snapshot does not change the game
+            if size == (8,8,2):
+                self.assertLess(len(data),150)
+            restored = GameService.restore(data)
+            self.assertEqual(restored.getPlayerBoard(),srv.getPlayerBoard())
+            self.assertEqual(restored.getComputerBoard(),srv.getComputerBoard())
+            while srv.getWinner() is None:
+                self.assertEqual(restored.playerAutoHit(),srv.playerAutoHit())
+                self.assertEqual(restored.computerHit(),srv.computerHit())
+                self.assertEqual(restored.getWinner(),srv.getWinner())
+                if size != (8,8,2):
+                    break
+        with self.assertRaises(ValueError):
+            GameService.restore(b'\x01' + data[1:])
+        with self.assertRaises(ValueError):
+            GameService.restore(data[:-1])
+
+    def testNextComputerMove(self):
+        games = [GameService(7,'density'), GameService(7,'density')]
+        for srv in games:
+            srv.addRandomPlayerPlanes()
+        while games[0].getWinner() is None:
+            move = games[1].nextComputerMove()
+            self.assertEqual(games[1].computerHit(move),games[0].computerHit())
+        self.assertEqual(games[1].getPlayerBoard(),games[0].getPlayerBoard())
+
+    def testEvents(self):
+        srv = GameService(4,'density','classic')
+        srv.addRandomPlayerPlanes()
+        events = []
+        srv.subscribe(events.append)
+        boards = {'player': Board(8,8).getMatrix(), 'computer': Board(8,8).getMatrix()}
+        srv.playerHit((0,0))
+        while srv.getWinner() is None:
+            srv.playerHit((0,0))  # the second shot on a cell changes nothing
+            srv.playerAutoHit()
+            if srv.getWinner() is None:
+                srv.computerHit()
+        for event in events[:-1]:
+            if isinstance(event,PlaneDestroyed):
+                for i, j in event.cells:
+                    boards[event.board][i][j] = 'X'
+            else:
+                boards[event.board][event.cell[0]][event.cell[1]] = 'X' if isinstance(event,CellHit) else 0
+        self.assertEqual(events[-1],GameWon(srv.getWinner()))
+        self.assertEqual(boards['computer'],srv.getHitBoard())
+        self.assertEqual(boards['player'],[[' ' if c == '#' else c for c in row] for row in srv.getPlayerBoard()])
+        srv.unsubscribe(events.append)
+        srv.resetGame()
+        srv.playerHit((0,0))
+        self.assertIsInstance(events[-1],GameWon)
+
     def testGetWinner(self):
         self.srv.resetGame()
         winner = self.srv.getWinner()
@@ -48,8 +238,8 @@ class TestComputerController(TestCase):
     def testMarkDestroyedPlane(self):
         self.srv.resetGame()
         p = Plane((2,0),'left')
-        self.srv.markDestroyedPlane(p,self.srv.getPlayerBoard())
-        b = self.srv.getPlayerBoard()
+        b = self.srv.getPlayerBoard().copyMatrix()
+        self.srv.markDestroyedPlane(p,b)
         XCells = 0
         for i in range(8):
             for j in range(8):
@@ -78,6 +268,556 @@ class TestComputerController(TestCase):
         self.srv.addPlayerPlane((4,7),'right')
         result = self.srv.computerHit()
         self.assertTrue(result in ('miss','hit','cabin'))
+        self.assertEqual(self.srv.computerHit((2,1)),'hit')
+        for position in ((0,8),(8,0),(-1,0),(1,),[1,1],(1.0,1)):
+            with self.assertRaises(ValueError):
+                self.srv.computerHit(position)
+        with self.assertRaises(ValueError):
+            GameService(seed=1,playerAiMode='classic').playerAutoHit((0,8))
+
+
+class TestStrategies(TestCase):
+    @staticmethod
+    def shotsToWin(aiMode,games):
+        table = getPlacementTable(8,8)
+        shots = 0
+        for g in range(games):
+            srv = GameService(seed=g,aiMode=aiMode)
+            for p in table.sampleConfiguration(2,random.Random(1000+g)):
+                srv.addPlayerPlane(p.cabin,p.orientation)
+            while srv.getWinner() != 'computer':
+                srv.computerHit()
+                shots += 1
+        return shots / games
+
+    def testClassicVisitsEveryCellOnce(self):
+        rng = random.Random(2)
+        strategy = ClassicStrategy(20,30,rng)
+        moves = []
+        for i in range(20 * 30 - 4):
+            hitPos = strategy.nextMove()
+            moves.append(hitPos)
+            strategy.registerResult(hitPos,'hit' if rng.random() < 0.3 else 'miss')
+        self.assertEqual(len(set(moves)),len(moves))
+        self.assertNotIn((0,0),moves)
+        self.assertNotIn((29,19),moves)
+        self.assertTrue(all(0 <= m[0] < 30 and 0 <= m[1] < 20 for m in moves))
+
+    def testInvalidMode(self):
+        with self.assertRaises(ValueError):
+            GameService(aiMode='cheat')
+
+    def testDensityBeatsClassic(self):
+        self.assertLess(self.shotsToWin('density',100),self.shotsToWin('classic',100))
+
+    def testMonteCarloBudget(self):
+        # a clock that advances 1 ms per reading: the deadline is 7 ms after the first reading and the clock is
+        # read every 4 drawings, so the move stops at the 7th check; the wall clock p99 is in benchmarks/computerMoves.py
+        readings = []
+        def clock():
+            readings.append(len(readings) * 0.001)
+            return readings[-1]
+        strategy = MonteCarloStrategy(9,9,GameRandom(1),2,0.01,clock=clock)
+        move = strategy.nextMove()
+        self.assertEqual(len(readings),8)
+        self.assertTrue(0 <= move[0] < 9 and 0 <= move[1] < 9)
+        readings.clear()
+        strategy.nextMove()
+        self.assertEqual(len(readings),8)
+        srv = GameService(seed=1,aiMode='montecarlo',difficulty='easy')
+        srv.setDifficulty('hard')
+        self.assertEqual(srv.getDifficulty(),'hard')
+        self.assertEqual(GameService.restore(srv.snapshot()).getDifficulty(),'hard')
+        with self.assertRaises(ValueError):
+            srv.setDifficulty('impossible')
+        self.assertLess(self.shotsToWin('montecarlo',40),self.shotsToWin('classic',40))
+
+
+class TestOpeningBook(TestCase):
+    def testBookLines(self):
+        book = getOpeningBook()
+        root = book.getRoot(8,8,2)
+        self.assertNotEqual(root,OUT_OF_BOOK)
+        self.assertEqual(book.getRoot(9,9,2),OUT_OF_BOOK)
+        self.assertEqual(book.getNext(root,'cabin'),OUT_OF_BOOK)
+        for seed in range(3):
+            strategy = ClassicStrategy(8,8,random.Random(seed))
+            self.assertEqual(strategy.nextMove(),divmod(book.getMove(root),8))
+            strategy.registerResult(divmod(book.getMove(root),8),'miss')
+            self.assertEqual(strategy.nextMove(),divmod(book.getMove(book.getNext(root,'miss')),8))
+        srv = GameService(seed=5,aiMode='density')
+        srv.computerHit((0,1))  # a shot out of the book ends the line
+        self.assertNotEqual(srv.computerHit(),divmod(book.getMove(book.getNext(root,'miss')),8))
+
+    def testWriteBook(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,'openings.book')
+            self.assertEqual(OpeningBook(path).getRoot(8,8,2),OUT_OF_BOOK)
+            writeBook(path,[(8,8,1,3)])
+            book = OpeningBook(path)
+            root = book.getRoot(8,8,1)
+            self.assertEqual(root,0)
+            self.assertEqual(book.getRoot(8,8,2),OUT_OF_BOOK)
+            table = getPlacementTable(8,8)
+            cell = book.getMove(root)
+            self.assertTrue(any(divmod(cell,8) in p.cells for p in table.getPlacements()))
+            last = book.getNext(book.getNext(root,'miss'),'miss')
+            self.assertNotEqual(last,OUT_OF_BOOK)
+            self.assertEqual(book.getNext(last,'miss'),OUT_OF_BOOK)
+
+
+class TestSolver(TestCase):
+    def setUp(self):
+        self.solver = Solver(6,6,1)
+
+    def testPerfectPlayBaseline(self):
+        cell, expected = self.solver.solve()
+        self.assertAlmostEqual(expected,23 / 6)
+        self.assertTrue(0 <= cell[0] < 6 and 0 <= cell[1] < 6)
+        table = getPlacementTable(6,6)
+        shots = 0
+        for g in range(200):
+            srv = GameService(seed=g,aiMode='density',width=6,height=6,planesCount=1)
+            p = table.sampleConfiguration(1,random.Random(g))[0]
+            srv.addPlayerPlane(p.cabin,p.orientation)
+            while srv.getWinner() != 'computer':
+                srv.computerHit()
+                shots += 1
+        self.assertGreaterEqual(shots / 200,expected - 0.3)
+
+    def testSymmetries(self):
+        cell, expected = self.solver.solve(misses=[(0,0)],hits=[(2,1)])
+        mirrored, mirroredExpected = self.solver.solve(misses=[(0,5)],hits=[(2,4)])
+        self.assertAlmostEqual(expected,mirroredExpected)
+        self.assertEqual(mirrored,(cell[0],5 - cell[1]))
+        self.assertEqual(self.solver.solve(destroyed=[((1,2),'up')]),(None,0.0))
+        with self.assertRaises(ValueError):
+            self.solver.solve(destroyed=[((1,2),'down')])
+        with self.assertRaises(ValueError):
+            self.solver.solve(hits=[(0,0)])
+
+    def testPolicy(self):
+        small = Solver(6,6,1,cacheSize=3)
+        self.assertAlmostEqual(small.solve()[1],self.solver.solve()[1])
+        self.assertEqual(small.getCacheSize(),3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,'policy.bin')
+            self.solver.savePolicy(path)
+            loaded = Solver(6,6,1)
+            loaded.loadPolicy(path)
+            self.assertEqual(loaded.getCacheSize(),self.solver.getCacheSize())
+            self.assertEqual(loaded.solve(),self.solver.solve())
+            self.assertEqual(loaded.getCacheSize(),self.solver.getCacheSize())
+            with self.assertRaises(ValueError):
+                Solver(7,7,1).loadPolicy(path)
+
+
+class TestSimulator(TestCase):
+    def testPlayGame(self):
+        self.assertEqual(playGame('density','classic',5),playGame('density','classic',5))
+        winner, rounds = playGame('classic','density',5)
+        self.assertIn(winner,('human','computer'))
+        self.assertGreater(rounds,0)
+        self.assertEqual(playGame('density','classic',5,shape='jet'),playGame('density','classic',5,shape='jet'))
+        self.assertIn(playGame('density','montecarlo',5,difficulty='easy',shape='jet')[0],('human','computer'))
+
+    def testSimulate(self):
+        results = []
+        for i in range(2):
+            stats = None
+            for stats in simulate(40,'density','classic',workers=2,seed=1,batchSize=10):
+                pass
+            results.append(stats)
+        self.assertEqual(results[0].games,40)
+        self.assertEqual(sum(results[0].wins.values()),40)
+        self.assertEqual(sum(results[0].shots.values()),40)
+        self.assertEqual(results[0].shots,results[1].shots)
+
+
+class TestBatchEngine(TestCase):
+    @staticmethod
+    def computerPlacements(srv):
+        occupied = Board(8,8).cellsMask((i,j) for i in range(8) for j in range(8) if srv.getComputerBoard()[i][j] == '#')
+        for p1 in getPlacementTable(8,8).getPlacements():
+            for p2 in getPlacementTable(8,8).getPlacements():
+                if p1.index < p2.index and p1.mask & p2.mask == 0 and p1.mask | p2.mask == occupied:
+                    return [p1,p2]
+
+    def testEquivalence(self):
+        games = 30
+        rng = random.Random(11)
+        engine = BatchEngine(games)
+        services = []
+        for g in range(games):
+            srv = GameService(seed=g)
+            for p in self.computerPlacements(srv):
+                engine.addPlane('computer',g,p.cabin,p.orientation)
+            for p in getPlacementTable(8,8).sampleConfiguration(2,rng):
+                srv.addPlayerPlane(p.cabin,p.orientation)
+                engine.addPlane('player',g,p.cabin,p.orientation)
+            services.append(srv)
+        self.assertEqual(engine.getWinners(),[None] * games)
+        for step in range(70):
+            shots = [(rng.randrange(8),rng.randrange(8)) if rng.random() < 0.9 and w is None else None
+                     for w in engine.getWinners()]
+            results = engine.step('computer',shots)
+            for g, srv in enumerate(services):
+                expected = srv.playerHit(shots[g]) if shots[g] is not None else None
+                self.assertEqual(results[g],expected)
+                self.assertEqual(engine.getMatrix('computer',g),srv.getComputerBoard())
+        self.assertEqual(engine.getWinners(),[srv.getWinner() for srv in services])
+        self.assertIn('human',engine.getWinners())
+
+    def testPlayerSide(self):
+        engine = BatchEngine(2)
+        engine.addPlane('computer',0,(2,0),'left')
+        engine.addPlane('computer',1,(2,0),'left')
+        engine.addPlane('player',0,(4,7),'right')
+        with self.assertRaises(PlaneError):
+            engine.addPlane('player',0,(4,6),'right')
+        self.assertEqual(engine.getWinners(),[None,'computer'])
+        self.assertEqual(engine.step('player',[(4,6),None]),['hit',None])
+        self.assertEqual(engine.step('player',[(4,7),None]),['cabin',None])
+        self.assertEqual(engine.getWinners(),['computer','computer'])
+
+    def testShape(self):
+        engine = BatchEngine(1,shape='jet')
+        srv = GameService(seed=1,shape='jet')
+        for p in getPlacementTable(8,8,'jet').sampleConfiguration(2,random.Random(2)):
+            srv.addPlayerPlane(p.cabin,p.orientation)
+            engine.addPlane('player',0,p.cabin,p.orientation)
+        self.assertEqual(engine.getMatrix('player',0),srv.getPlayerBoard())
+        self.assertEqual(engine.step('player',[p.cabin]),['cabin'])
+
+
+class TestProfiler(TestCase):
+    def testProfile(self):
+        computerHit = GameService.computerHit
+        profiler = Profiler()
+        profiler.enable()
+        try:
+            self.assertIsNot(GameService.computerHit,computerHit)
+            srv = GameService(seed=1,aiMode='density')
+            srv.addRandomPlayerPlanes()
+            shots = 0
+            while srv.getWinner() is None:
+                srv.computerHit()
+                shots += 1
+        finally:
+            profiler.disable()
+        self.assertIs(GameService.computerHit,computerHit)
+        self.assertFalse(profiler.isEnabled())
+        stats = profiler.getStats()
+        self.assertEqual(stats['GameService.computerHit'][0],shots)
+        self.assertEqual(stats['DensityStrategy.registerResult'][0],shots)
+        self.assertEqual(sum(stats['GameService.computerHit'][4]),shots)
+        self.assertGreaterEqual(stats['DensityStrategy.__bestCells'][0],1)
+        self.assertEqual(stats['ClassicStrategy.nextMove'][0],0)
+        report = json.loads(profiler.toJson())
+        self.assertLessEqual(report['GameService.computerHit']['max_us'],report['GameService.computerHit']['total_us'])
+        profiler.merge(stats)
+        self.assertEqual(profiler.getStats()['GameService.computerHit'][0],2 * shots)
+        self.assertIn('GameService.computerHit',profiler.report())
+
+    def testProfiledSimulation(self):
+        stats = None
+        for stats in simulate(4,'density','classic',workers=1,seed=1,batchSize=2,profile=True):
+            pass
+        self.assertEqual(stats.profile.getStats()['GameService.playerAutoHit'][0],sum(r * c for r, c in stats.shots.items()))
+
+
+class TestStartup(TestCase):
+    def testColdStart(self):
+        # only which modules are imported, the import times are checked by python -m benchmarks.startup --max-ms
+        for target in ('headless','simulator'):
+            times = importTimes(TARGETS[target])
+            for module in times:
+                self.assertFalse(module.split('.')[0] in ('UserInterface','PySimpleGUI','tkinter','texttable','asyncio'),
+                                 '{} imports {}'.format(target,module))
+            self.assertIn('controllers.gameSrv',times)
+            self.assertGreater(startupTime(times),0)
+
+
+class TestGameState(TestCase):
+    def testShots(self):
+        rng = random.Random(5)
+        planes = [Plane((0,2),'up'),Plane((4,7),'right')]
+        fleet = Fleet(8,8)
+        for plane in planes:
+            fleet.addPlane(plane,plane.getPlaneMask(8))
+        root = state = GameState(8,8,planes,[Plane((3,3),'down')])
+        for i in range(40):
+            hitPos = (rng.randrange(8),rng.randrange(8))
+            parent = state
+            state, result = state.shoot('player',hitPos)
+            self.assertEqual(result,fleet.shoot(*hitPos)[0])
+            self.assertIs(state.getParent(),parent)
+            self.assertEqual(state.getMove(),('player',hitPos,result))
+            board = fleet.getBoard()
+            self.assertEqual(state.getShots('player')[:2],(board.getHitMask(),board.getMissMask()))
+            self.assertEqual(state.getAlivePlanesCount('player'),fleet.getAlivePlanesCount())
+        self.assertEqual(root.getShots('player'),(0,0,0))
+        self.assertEqual(root.getShots('computer'),state.getShots('computer'))
+        self.assertEqual(len(state.getMoves()),40)
+        self.assertEqual(state.getWinner(),'computer' if not fleet.getAlivePlanesCount() else None)
+        self.assertEqual(root.shoot('computer',(3,3))[0].getWinner(),'human')
+        # the states share the planes and keep no dict, python -m benchmarks.gameStates --max-bytes measures them
+        self.assertIs(state.getLayout(),root.getLayout())
+        self.assertFalse(hasattr(state,'__dict__'))
+
+    def testUndoRedo(self):
+        srv = GameService(4,'density','density')
+        self.assertFalse(srv.canUndo())
+        srv.setUndo(True)
+        srv.addRandomPlayerPlanes()
+        history = []
+        while srv.getWinner() is None:
+            history.append((srv.getPlayerBoard().copyMatrix(),srv.getComputerBoard().copyMatrix(),
+                            srv.snapshot()[SNAPSHOT_HEADER.size:]))
+            srv.playerAutoHit() if len(history) % 2 else srv.computerHit()
+        final = (srv.getPlayerBoard().copyMatrix(),srv.getComputerBoard().copyMatrix())
+        for boards in reversed(history):
+            srv.undo()
+            self.assertEqual((srv.getPlayerBoard(),srv.getComputerBoard()),boards[:2])
+            self.assertEqual(srv.snapshot()[SNAPSHOT_HEADER.size:],boards[2])  # the strategies forgot the shots
+        self.assertFalse(srv.canUndo())
+        with self.assertRaises(ValueError):
+            srv.undo()
+        while srv.canRedo():
+            srv.redo()
+        self.assertEqual((srv.getPlayerBoard(),srv.getComputerBoard()),final)
+        self.assertIsNotNone(srv.getWinner())
+        srv.undo()
+        self.assertIsNone(srv.getWinner())
+        srv.undo()
+        srv.playerAutoHit()
+        self.assertFalse(srv.canRedo())
+        with self.assertRaises(ValueError):
+            GameService(width=300,height=300,planesCount=20).setUndo(True)
+
+
+class TestJournal(TestCase):
+    def testReplay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,'games.journal')
+            journal = Journal(path,keyframeInterval=8)
+            games = [GameService(seed,'density','classic') for seed in range(2)]
+            boards = [[], []]
+            for g, srv in enumerate(games):
+                srv.setJournal(journal)
+                srv.addPlayerPlane((2,0),'left')
+                srv.addRandomPlayerPlanes(1)
+                boards[g] += [None] * 3
+            while any(srv.getWinner() is None for srv in games):
+                for g, srv in enumerate(games):  # the games are journaled at the same time
+                    if srv.getWinner() is None:
+                        srv.playerAutoHit()
+                        boards[g].append((srv.getPlayerBoard().copyMatrix(),srv.getComputerBoard().copyMatrix()))
+                        if srv.getWinner() is None:
+                            srv.computerHit()
+                            boards[g].append((srv.getPlayerBoard().copyMatrix(),srv.getComputerBoard().copyMatrix()))
+            journal.close()
+            reader = JournalReader(path)
+            self.assertEqual(reader.getRecordsCount(),sum(len(b) - 1 for b in boards))
+            self.assertEqual(reader.getRecord(0),(0,1,PLAYER_PLANE,16,ORIENTATIONS.index('left')))
+            for g in range(2):
+                for move in range(3,len(boards[g])):
+                    srv = reader.getState(g,move)
+                    self.assertEqual((srv.getPlayerBoard(),srv.getComputerBoard()),boards[g][move])
+            with self.assertRaises(ValueError):
+                reader.getState(2,0)
+            with self.assertRaises(ValueError):
+                reader.getState(0,len(boards[0]))
+            reader.close()
+            journal = Journal(path)
+            srv = GameService(seed=1)
+            srv.setJournal(journal)
+            self.assertEqual(srv.getJournalGame(),2)
+            journal.close()
+            reader = JournalReader(path)
+            self.assertEqual(reader.getState(2,0).getPlayerBoard(),Board(8,8).getMatrix())
+            reader.close()
+
+
+class TestExporter(TestCase):
+    def testShards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            samples = exportGames(directory,6,'density',width=8,height=8,planesCount=2,seed=3,shardSize=16)
+            (width, height, channels), shards = readIndex(directory)
+            self.assertEqual((width,height,channels),(8,8,3))
+            self.assertEqual(sum(s[1] for s in shards),samples)
+            self.assertEqual(sum(s[2] for s in shards),6)
+            self.assertTrue(all(s[1] == 16 for s in shards[:-1]))
+            cells = width * height
+            for name, count, games in shards:
+                path = os.path.join(directory,name)
+                self.assertEqual(os.path.getsize(path),NPY_HEADER_SIZE + count * 3 * cells)
+                with open(path,'rb') as file:
+                    self.assertTrue(file.read(NPY_HEADER_SIZE).endswith(b'\n'))
+                shape, data = readShard(path)
+                self.assertEqual(shape,(count,3,height,width))
+                for sample in range(count):
+                    observed, occupancy, shot = (bytes(data[(sample * 3 + c) * cells:(sample * 3 + c + 1) * cells])
+                                                 for c in range(3))
+                    self.assertEqual(shot.count(1),1)
+                    self.assertEqual(observed[shot.index(1)],0)
+                    self.assertEqual(occupancy.count(CABIN),2)
+                    self.assertEqual(cells - occupancy.count(0),20)
+                    for cell in range(cells):
+                        if observed[cell] > 1:
+                            self.assertTrue(occupancy[cell])
+                        elif observed[cell] == 1:
+                            self.assertFalse(occupancy[cell])
+                data.release()
+            self.assertEqual(exportGames(os.path.join(directory,'empty'),0),0)
+            self.assertEqual(readIndex(os.path.join(directory,'empty'))[1],[])
+
+
+class TestServer(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = Server(port=0)
+        self.port = await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    @staticmethod
+    async def request(reader,writer,**request):
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    async def testGame(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1',self.port)
+        self.assertFalse((await self.request(reader,writer,cmd='shoot',cell=[0,0]))['ok'])
+        response = await self.request(reader,writer,cmd='new',seed=3,ai='density')
+        self.assertEqual((response['ok'],response['width'],response['planes']),(True,8,2))
+        self.assertTrue((await self.request(reader,writer,cmd='place',cabin=[2,0],orientation='left'))['ok'])
+        self.assertFalse((await self.request(reader,writer,cmd='place',cabin=[2,0],orientation='right'))['ok'])
+        self.assertTrue((await self.request(reader,writer,cmd='place',cabin=[4,7],orientation='right'))['ok'])
+        response = await self.request(reader,writer,cmd='shoot',cell=[0,0])
+        self.assertEqual((response['player'],response['winner']),('miss',None))
+        self.assertIn(response['computer'],('cabin','hit','miss'))
+        response = await self.request(reader,writer,cmd='board',which='hits')
+        self.assertEqual(response['board'][0][0],0)
+        writer.close()
+
+    async def testConcurrentSessions(self):
+        connections = [await asyncio.open_connection('127.0.0.1',self.port) for i in range(50)]
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.server.getSessionsCount(),50)
+
+        async def botMatch(reader,writer,seed):
+            await self.request(reader,writer,cmd='new',seed=seed,player_ai='density')
+            await self.request(reader,writer,cmd='random_planes')
+            response = {'winner': None}
+            while response['winner'] is None:
+                response = await self.request(reader,writer,cmd='auto')
+            return response['winner']
+
+        winners = await asyncio.gather(*(botMatch(r,w,i) for i, (r,w) in enumerate(connections)))
+        self.assertTrue(all(w in ('human','computer') for w in winners))
+        for reader, writer in connections:
+            writer.close()
+
+    async def testSlowPlayerStrategy(self):
+        # a player's strategy that does not choose its move until it is released
+        started, released = threading.Event(), threading.Event()
+
+        class BlockedStrategy(ClassicStrategy):
+            def nextMove(self):
+                started.set()
+                released.wait(10)
+                return super().nextMove()
+
+        AI_MODES['blocked'] = BlockedStrategy
+        self.addCleanup(AI_MODES.pop,'blocked')
+        self.addCleanup(released.set)
+        (reader1, writer1), (reader2, writer2) = [await asyncio.open_connection('127.0.0.1',self.port) for i in range(2)]
+        await self.request(reader1,writer1,cmd='new',seed=1,player_ai='blocked')
+        await self.request(reader1,writer1,cmd='random_planes')
+        blocked = asyncio.ensure_future(self.request(reader1,writer1,cmd='auto'))
+        self.assertTrue(await asyncio.get_running_loop().run_in_executor(None,started.wait,10))
+        # the blocked move runs on the executor, the other sessions keep being served meanwhile
+        self.assertTrue((await self.request(reader2,writer2,cmd='new',seed=2))['ok'])
+        self.assertTrue((await self.request(reader2,writer2,cmd='random_planes'))['ok'])
+        self.assertTrue((await self.request(reader2,writer2,cmd='shoot',cell=[0,0]))['ok'])
+        self.assertFalse(blocked.done())
+        released.set()
+        response = await blocked
+        self.assertTrue(response['ok'])
+        self.assertIn(response['player'],('cabin','hit','miss'))
+        writer1.close()
+        writer2.close()
+
+
+class TestShapes(TestCase):
+    def testClassicShape(self):
+        upDown = ((0, 0), (1, -2), (1, -1), (1, 0), (1, 1), (1, 2), (2, 0), (3, -1), (3, 0), (3, 1))
+        leftRight = ((0, 0), (-2, 1), (-1, 1), (0, 1), (1, 1), (2, 1), (0, 2), (-1, 3), (0, 3), (1, 3))
+        classic = getShape('classic')
+        for orientation, cells, sign in (('up',upDown,1),('down',upDown,-1),('left',leftRight,1),
+                                         ('right',leftRight,-1)):
+            self.assertEqual(set(classic.getCells(orientation)),{(sign * r, sign * c) for r, c in cells})
+        self.assertFalse(classic.coversCorners())
+        self.assertTrue(getShape('jet').coversCorners())
+        # the key only depends on the cells, the snapshots of other processes find the shape by it
+        self.assertEqual(classic.getKey(),0x35aef6dc1466083b)
+        self.assertIs(getShapeByKey(classic.getKey()),classic)
+        with self.assertRaises(ValueError):
+            getShapeByKey(0)
+
+    def testRecognize(self):
+        rng = random.Random(1)
+        for shape in ('classic','jet'):
+            for placement in getPlacementTable(8,8,shape).getPlacements():
+                cells = list(placement.cells)
+                rng.shuffle(cells)
+                self.assertEqual(recognize(cells),(getShape(shape),placement.orientation,placement.cabin))
+                self.assertEqual(PlaneValidator.GUIValidate(cells,8,8,shape),(placement.cabin,placement.orientation))
+        cells = Plane((0,4),'down','jet').getPlaneCells()
+        self.assertEqual(recognize(cells)[1:],('down',(0,4)))
+        for selection, shape in ((cells,'jet'),(cells,'classic'),(cells + cells[:1],'jet'),([],'jet')):
+            with self.assertRaises(PlaneError):
+                PlaneValidator.GUIValidate(selection,8,8,shape)
+        with self.assertRaises(ValueError):
+            registerShape('jet',((0,0),))
+        with self.assertRaises(ValueError):
+            registerShape('upside down',getShape('classic').getCells('down'))
+
+    def testCustomShape(self):
+        registerShape('test tee',((0,0),(1,-1),(1,0),(1,1),(2,0),(3,0)))
+        self.addCleanup(unregisterShape,'test tee')
+        self.assertEqual(PlaneValidator.GUIValidate([(1,4),(4,4),(3,3),(3,4),(3,5),(2,4)],8,8,'test tee'),
+                         ((4,4),'down'))
+        srv = GameService(2,'density','classic',6,6,2,shape='test tee')
+        srv.addRandomPlayerPlanes()
+        self.assertEqual(len(srv.getPlayerBoard().copyMatrix()[0]),6)
+        while srv.getWinner() is None:
+            srv.playerAutoHit()
+            if srv.getWinner() is None:
+                srv.computerHit()
+        restored = GameService.restore(srv.snapshot())
+        self.assertEqual(restored.getShape(),'test tee')
+        self.assertEqual(restored.getComputerBoard(),srv.getComputerBoard())
+        with self.assertRaises(ValueError):
+            GameService(shape='nothing')
+
+    def testUnregisterShape(self):
+        names = getShapeNames()
+        registerShape('test bar',((0,0),(1,0),(2,0),(3,0),(3,1)))
+        data = GameService(1,shape='test bar').snapshot()
+        unregisterShape('test bar')
+        self.assertEqual(getShapeNames(),names)
+        self.assertIsNone(recognize(((0,0),(1,0),(2,0),(3,0),(3,1))))
+        with self.assertRaises(ValueError):
+            GameService.restore(data)
+        with self.assertRaises(ValueError):
+            unregisterShape('classic')
+        # the name can be taken again, by other cells
+        registerShape('test bar',((0,0),(1,0),(2,0),(2,1)))
+        self.addCleanup(unregisterShape,'test bar')
+        self.assertEqual(getPlacementTable(4,4,'test bar').getShape().getCellsCount(),4)
 
 
 class TestPlane(TestCase):
@@ -117,7 +857,82 @@ class TestPlane(TestCase):
         with self.assertRaises(PlaneError):
             PlaneValidator.validate(p,b)
 
+class TestFleet(TestCase):
+    def testShoot(self):
+        fleet = Fleet(8,8)
+        plane = Plane((2,0),'left')
+        fleet.addPlane(plane,plane.getPlaneMask(8))
+        self.assertEqual(fleet.getAlivePlanesCount(),1)
+        self.assertEqual(fleet.shoot(7,7),('miss',None))
+        self.assertEqual(fleet.shoot(2,1),('hit',None))
+        self.assertEqual(fleet.shoot(2,1),('miss',None))
+        self.assertEqual(fleet.getRemainingCells(0),9)
+        self.assertEqual(fleet.shoot(2,0),('cabin',plane))
+        self.assertEqual(fleet.shoot(2,0),('miss',None))
+        self.assertEqual((fleet.getAlivePlanesCount(),fleet.getRemainingCells(0)),(0,0))
+        self.assertTrue(fleet.getBoard().isDestroyed(plane.getPlaneMask(8)))
+
+
+class TestPlacementTable(TestCase):
+    def testPlacements(self):
+        table = getPlacementTable(8,8)
+        self.assertIs(table,getPlacementTable(8,8))
+        self.assertEqual(len(table.getPlacements()),80)
+        placement = table.find((2,0),'left')
+        self.assertEqual(sorted(placement.cells),sorted(Plane((2,0),'left').getPlaneCells()))
+        self.assertEqual(placement.mask,Plane((2,0),'left').getPlaneMask(8))
+        self.assertIsNone(table.find((2,0),'right'))
+        self.assertIs(table.findByCells(reversed(placement.cells)),placement)
+
+    def testSampleConfiguration(self):
+        table = getPlacementTable(8,8)
+        self.assertEqual(table.countConfigurations(2),548)
+        rng = random.Random(3)
+        seen = set()
+        for i in range(20000):
+            config = table.sampleConfiguration(2,rng)
+            self.assertEqual(config[0].mask & config[1].mask,0)
+            seen.add(frozenset(p.index for p in config))
+        self.assertEqual(len(seen),548)
+        with self.assertRaises(PlaneError):
+            table.sampleConfiguration(5,rng)
+
+    def testGUIValidate(self):
+        cells = Plane((4,7),'right').getPlaneCells()
+        self.assertEqual(PlaneValidator.GUIValidate(cells),((4,7),'right'))
+        with self.assertRaises(PlaneError):
+            PlaneValidator.GUIValidate(cells[:9] + [(0,0)])
+
+
 class TestBoardCreation(TestCase):
+    def testMasks(self):
+        b = Board(8,8)
+        mask = Plane((2,0),'left').getPlaneMask(8)
+        self.assertEqual(b.cellsMask(Plane((2,0),'left').getPlaneCells()),mask)
+        self.assertFalse(b.overlaps(mask))
+        b.addMask(mask)
+        self.assertTrue(b.overlaps(b.cellBit(2,1)))
+        self.assertTrue(b.shoot(2,1))
+        self.assertFalse(b.shoot(2,1))
+        self.assertFalse(b.shoot(7,7))
+        self.assertFalse(b.isDestroyed(mask))
+        b.markDestroyed(mask)
+        self.assertTrue(b.isDestroyed(mask))
+        m = b.getMatrix()
+        self.assertEqual((m[2][0],m[7][7],m[0][0]),('X',0,' '))
+
+
+    def testSparseBoard(self):
+        b = Board(1000,1000)
+        self.assertTrue(b.isSparse())
+        mask = b.cellsMask(Plane((500,500),'up').getPlaneCells())
+        b.addMask(mask)
+        self.assertTrue(b.overlaps(b.cellBit(501,498)))
+        self.assertTrue(b.shoot(501,498))
+        self.assertFalse(b.shoot(0,0))
+        b.markDestroyed(mask)
+        self.assertTrue(b.isDestroyed(b.getOccupiedMask()))
+
     def testGetMatrix(self):
         matrix = Board(1,2,'0').getMatrix()
         self.assertEqual(matrix,[['0'],['0']])